@@ -13,6 +13,7 @@ from config.settings import get_config
 from routes.api import api_bp
 from routes.views import views_bp
 from routes.admin import admin_bp
+from routes import admission, load
 
 # 配置日志
 logging.basicConfig(
@@ -36,8 +37,15 @@ def create_app(config_name=None):
     app.config.from_object(config)
     config.init_app(app)
     
-    # 中间件
-    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+    # 中间件（x_for: 只信任 TRUSTED_PROXIES 层前置代理传入的客户端地址，用于按客户端限速；
+    # 默认为 0，直接暴露的端口上客户端无法通过 X-Forwarded-For 伪造地址）
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config.get('TRUSTED_PROXIES', 0), x_proto=1, x_host=1)
+    
+    # 工作进程负载统计（在准入控制之前注册）
+    load.init_app(app)
+    
+    # 下载和上传的准入控制
+    admission.init_app(app)
     
     # 注册蓝图
     app.register_blueprint(api_bp)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+PyPI Repository Worker Autoscaler
+
+与 monitor.py 一样作为独立进程运行在 gunicorn 所在的主机上，按在途请求数、accept 队列长度、
+p95 延迟以及主机 CPU / 内存，通过 TTIN/TTOU 信号在 AUTOSCALE_MIN_WORKERS..AUTOSCALE_MAX_WORKERS
+之间调整工作进程数。决策记录在 packages/.repo/autoscale.log，也可以通过 /admin/autoscale 查看。
+
+配置（环境变量）见 config/settings.py 中的 AUTOSCALE_*；另外：
+- GUNICORN_PIDFILE: gunicorn 主进程的 pid 文件，默认 gunicorn.pid
+- GUNICORN_PORT: gunicorn 监听的端口（用于读取 accept 队列），默认 8385
+"""
+
+import os
+import sys
+import signal
+import logging
+
+from config.settings import get_config
+from models.autoscale import AutoscaleController, AutoscalePolicy
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('autoscaler.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def signal_handler(signum, frame):
+    """信号处理器"""
+    logger.info(f"Received signal {signum}, shutting down autoscaler...")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+    
+    config = get_config()
+    controller = AutoscaleController(
+        config.PACKAGES_DIR,
+        pidfile=os.environ.get('GUNICORN_PIDFILE') or 'gunicorn.pid',
+        port=int(os.environ.get('GUNICORN_PORT') or 8385),
+        policy=AutoscalePolicy.from_config(config),
+    )
+    controller.run(config.AUTOSCALE_INTERVAL)
@@ -21,6 +21,8 @@ class Config:
     # 包仓库配置
     PACKAGES_DIR = os.environ.get('PACKAGES_DIR') or 'packages'
     CACHE_TTL = int(os.environ.get('CACHE_TTL') or 300)  # 5分钟缓存
+    # 对外访问地址，用于 /pypi/<name>/json 文档中的下载链接（为空时使用站内路径）
+    PUBLIC_BASE_URL = os.environ.get('PUBLIC_BASE_URL', '')
     
     # 日志配置
     LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'INFO'
@@ -31,6 +33,91 @@ class Config:
     HEALTH_CHECK_INTERVAL = int(os.environ.get('HEALTH_CHECK_INTERVAL') or 60)  # 秒
     MAX_FAILURE_COUNT = int(os.environ.get('MAX_FAILURE_COUNT') or 3)
     
+    # 仪表板事件推送（SSE）配置
+    SSE_KEEPALIVE_INTERVAL = int(os.environ.get('SSE_KEEPALIVE_INTERVAL') or 15)  # 秒
+    SSE_MAX_DURATION = int(os.environ.get('SSE_MAX_DURATION') or 600)  # 单个连接最长时间，到期后浏览器自动重连
+    SSE_MAX_SUBSCRIBERS = int(os.environ.get('SSE_MAX_SUBSCRIBERS') or 32)  # 每个进程
+    
+    # 旧版本保留策略配置
+    RETENTION_CONFIG = os.environ.get('RETENTION_CONFIG') or 'retention.json'
+    RETENTION_MAX_DELETES_PER_SECOND = float(os.environ.get('RETENTION_MAX_DELETES_PER_SECOND') or 20)
+    
+    # 完整性巡检配置（每个工作进程启动巡检线程，只有一个进程实际执行）
+    SCRUB_ENABLED = os.environ.get('SCRUB_ENABLED', 'true').lower() in ['true', 'on', '1']
+    SCRUB_BYTES_PER_SECOND = int(os.environ.get('SCRUB_BYTES_PER_SECOND') or 8 * 1024 * 1024)
+    SCRUB_IDLE_PRIORITY = os.environ.get('SCRUB_IDLE_PRIORITY', 'true').lower() in ['true', 'on', '1']
+    SCRUB_INTERVAL = int(os.environ.get('SCRUB_INTERVAL') or 7 * 86400)  # 两轮巡检的间隔（秒）
+    
+    # 上传后处理任务配置
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 2)  # 每个进程的后台线程数
+    
+    # 准入控制：并发传输名额（所有进程合计）和按客户端限速，0 表示不限制
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() in ['true', 'on', '1']
+    ADMISSION_MAX_DOWNLOADS = int(os.environ.get('ADMISSION_MAX_DOWNLOADS') or 32)  # 同时进行的大文件下载
+    ADMISSION_MAX_UPLOADS = int(os.environ.get('ADMISSION_MAX_UPLOADS') or 4)  # 同时进行的上传
+    ADMISSION_LARGE_FILE_SIZE = int(os.environ.get('ADMISSION_LARGE_FILE_SIZE') or 10 * 1024 * 1024)
+    # 每个工作进程最多用于传输的线程数，其余线程留给索引页和健康检查
+    ADMISSION_WORKER_TRANSFER_SLOTS = int(os.environ.get('ADMISSION_WORKER_TRANSFER_SLOTS')
+                                          or max(1, int(os.environ.get('GUNICORN_THREADS') or 8) - 2))
+    ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER') or 5)  # 503 响应的 Retry-After（秒）
+    # 前置反向代理的层数，大于 0 时按 X-Forwarded-For 识别客户端地址（只在端口不直接对外时设置）
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES') or 0)
+    RATE_LIMIT_DOWNLOAD_RATE = float(os.environ.get('RATE_LIMIT_DOWNLOAD_RATE') or 50)  # 每个客户端每秒请求数
+    RATE_LIMIT_DOWNLOAD_BURST = float(os.environ.get('RATE_LIMIT_DOWNLOAD_BURST') or 200)
+    RATE_LIMIT_UPLOAD_RATE = float(os.environ.get('RATE_LIMIT_UPLOAD_RATE') or 2)
+    RATE_LIMIT_UPLOAD_BURST = float(os.environ.get('RATE_LIMIT_UPLOAD_BURST') or 20)
+    
+    # 下载热点小文件的进程内缓存
+    HOT_CACHE_MAX_BYTES = int(os.environ.get('HOT_CACHE_MAX_BYTES') or 64 * 1024 * 1024)  # 每个进程 64MB
+    HOT_CACHE_MAX_OBJECT_SIZE = int(os.environ.get('HOT_CACHE_MAX_OBJECT_SIZE') or 1024 * 1024)  # 只缓存 1MB 以下的文件
+    HOT_CACHE_REVALIDATE_INTERVAL = float(os.environ.get('HOT_CACHE_REVALIDATE_INTERVAL') or 1.0)  # 秒
+    
+    # 离线安装归档（/bundle）
+    BUNDLE_MAX_FILES = int(os.environ.get('BUNDLE_MAX_FILES') or 1000)  # 单个归档的文件数上限
+    BUNDLE_CACHE_MAX_BYTES = int(os.environ.get('BUNDLE_CACHE_MAX_BYTES') or 2 * 1024 * 1024 * 1024)  # 0 表示不缓存
+    
+    # wheel 内容查看：单个成员的大小上限
+    INSPECT_MAX_MEMBER_SIZE = int(os.environ.get('INSPECT_MAX_MEMBER_SIZE') or 64 * 1024 * 1024)
+    
+    # 包文件存储后端：local（包目录）或 s3（S3 兼容对象存储，多个节点共享）
+    # 后端由 models/storage.py 直接读取这些环境变量创建，命令行工具与服务使用同一配置
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND') or 'local'
+    S3_BUCKET = os.environ.get('S3_BUCKET', '')
+    S3_PREFIX = os.environ.get('S3_PREFIX', '')
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')  # MinIO 等兼容服务的地址
+    S3_REGION = os.environ.get('S3_REGION')
+    S3_PART_SIZE = int(os.environ.get('S3_PART_SIZE') or 64 * 1024 * 1024)  # 分块上传的分块大小
+    STORAGE_CACHE_MAX_BYTES = int(os.environ.get('STORAGE_CACHE_MAX_BYTES') or 10 * 1024 * 1024 * 1024)  # 本地读缓存
+    STORAGE_SYNC_INTERVAL = int(os.environ.get('STORAGE_SYNC_INTERVAL') or 30)  # 同步对象列表的间隔（秒）
+    
+    # 工作进程自动扩缩容（autoscaler.py，与 gunicorn 主进程在同一台主机上运行）
+    AUTOSCALE_MIN_WORKERS = int(os.environ.get('AUTOSCALE_MIN_WORKERS') or 2)
+    AUTOSCALE_MAX_WORKERS = int(os.environ.get('AUTOSCALE_MAX_WORKERS') or (os.cpu_count() or 1) * 2 + 1)
+    AUTOSCALE_INTERVAL = float(os.environ.get('AUTOSCALE_INTERVAL') or 5)  # 每轮采样间隔（秒）
+    AUTOSCALE_UP_UTILIZATION = float(os.environ.get('AUTOSCALE_UP_UTILIZATION') or 0.75)  # 在途请求 / 线程总数
+    AUTOSCALE_DOWN_UTILIZATION = float(os.environ.get('AUTOSCALE_DOWN_UTILIZATION') or 0.25)
+    AUTOSCALE_LATENCY_P95_MS = float(os.environ.get('AUTOSCALE_LATENCY_P95_MS') or 1000)
+    AUTOSCALE_UP_ROUNDS = int(os.environ.get('AUTOSCALE_UP_ROUNDS') or 2)  # 连续过载轮数
+    AUTOSCALE_DOWN_ROUNDS = int(os.environ.get('AUTOSCALE_DOWN_ROUNDS') or 24)  # 连续空闲轮数
+    AUTOSCALE_COOLDOWN = float(os.environ.get('AUTOSCALE_COOLDOWN') or 60)  # 两次调整的最小间隔（秒）
+    AUTOSCALE_MAX_CPU_PERCENT = float(os.environ.get('AUTOSCALE_MAX_CPU_PERCENT') or 90)  # 主机 CPU 饱和时不扩容
+    AUTOSCALE_MEMORY_RESERVE = int(os.environ.get('AUTOSCALE_MEMORY_RESERVE') or 512 * 1024 * 1024)
+    WORKER_REPORT_INTERVAL = float(os.environ.get('WORKER_REPORT_INTERVAL') or 2)  # 工作进程负载报告间隔（秒）
+    
+    # 按内存回收工作进程（代替 gunicorn 按请求数的定期重启，GUNICORN_MAX_REQUESTS 默认为 0）
+    WORKER_RECYCLE_ENABLED = os.environ.get('WORKER_RECYCLE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    WORKER_MAX_RSS = int(os.environ.get('WORKER_MAX_RSS') or 1024 * 1024 * 1024)  # RSS 超过后回收
+    WORKER_MAX_GROWTH_PER_HOUR = int(os.environ.get('WORKER_MAX_GROWTH_PER_HOUR') or 256 * 1024 * 1024)  # 持续增长速率
+    WORKER_MEMORY_WINDOW = float(os.environ.get('WORKER_MEMORY_WINDOW') or 1800)  # 判断持续增长的观察窗口（秒）
+    WORKER_MEMORY_WARMUP = float(os.environ.get('WORKER_MEMORY_WARMUP') or 600)  # 启动后不计入增长的预热期（秒）
+    # 用 tracemalloc 跟踪 Python 堆（区分泄漏与内存碎片，有额外开销，默认关闭）
+    WORKER_TRACEMALLOC = os.environ.get('WORKER_TRACEMALLOC', 'false').lower() in ['true', 'on', '1']
+    
+    # 分块上传配置（单个分块仍受 MAX_CONTENT_LENGTH 限制）
+    UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE') or 20 * 1024 * 1024 * 1024)  # 20GB
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE') or 32 * 1024 * 1024)  # 建议分块大小
+    UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL') or 24 * 3600)  # 未完成会话保留时间
+    
     # 文件上传配置
     MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB
     ALLOWED_EXTENSIONS = {'.whl', '.tar.gz', '.zip'}
@@ -8,10 +8,15 @@ import os
 
 # 服务器配置
 bind = "0.0.0.0:8385"
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+# 初始工作进程数；运行 autoscaler.py 时按负载在 AUTOSCALE_MIN_WORKERS..AUTOSCALE_MAX_WORKERS 之间调整
+workers = int(os.environ.get("GUNICORN_WORKERS") or multiprocessing.cpu_count() * 2 + 1)
+# 使用线程工作进程：仪表板的 /events 长连接只占用线程而不是整个工作进程
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS") or 8)
 worker_connections = 1000
-max_requests = 1000
+# 工作进程按内存回收（WORKER_RECYCLE_ENABLED / WORKER_MAX_RSS 等），默认不再按请求数重启；
+# 需要时可以通过 GUNICORN_MAX_REQUESTS 恢复
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS") or 0)
 max_requests_jitter = 50
 
 # 超时配置
@@ -62,6 +67,66 @@ def post_fork(server, worker):
 def post_worker_init(worker):
     """工作进程初始化后的回调"""
     worker.log.info("Worker initialized (pid: %s)", worker.pid)
+    
+    from config.settings import get_config
+    from models.repository import RepositoryManager
+    config = get_config()
+    if config.WORKER_TRACEMALLOC:
+        import tracemalloc
+        tracemalloc.start(1)
+    # 与请求处理使用同一个包目录（app.config['PACKAGES_DIR']）
+    packages_dir = config.PACKAGES_DIR
+    
+    # 恢复重启前未完成的上传后处理任务（任务锁保证只由一个进程执行）
+    from models.jobs import get_job_queue
+    get_job_queue(packages_dir, config.JOB_WORKERS)
+    
+    # 清除回收站中因进程退出而遗留的目录（跳过刚移入的，可能正在被其他进程清除）
+    from models.locks import purge_trash
+    purge_trash(packages_dir, min_age=300)
+    
+    repo_manager = RepositoryManager(packages_dir)
+    
+    # 接受请求前预热：包名查找表、根索引页，以及被回收的进程留下的热点文件
+    from models.hot_cache import get_hot_cache
+    from models.workers import read_hot_keys
+    try:
+        repo_manager._name_table()
+        repo_manager.page_cache.get_root_page(repo_manager, 'html')
+        hot_cache = get_hot_cache(config.HOT_CACHE_MAX_BYTES, config.HOT_CACHE_MAX_OBJECT_SIZE,
+                                  config.HOT_CACHE_REVALIDATE_INTERVAL)
+        loaded = hot_cache.prewarm(repo_manager.storage, read_hot_keys(repo_manager.packages_dir))
+        worker.log.info("Worker prewarmed (pid: %s, %s hot files)", worker.pid, loaded)
+    except Exception as e:
+        worker.log.warning("Worker prewarm failed (pid: %s): %s", worker.pid, e)
+    
+    # 负载报告线程（在途请求数和延迟，供 autoscaler.py 读取），同时按内存回收本进程：
+    # 把 worker.alive 置为 False 后 gunicorn 停止接受新连接，处理完在途请求后退出并启动替代进程
+    from models.workers import MemoryWatch, worker_reporter
+    memory = MemoryWatch(config.WORKER_MAX_RSS, config.WORKER_MAX_GROWTH_PER_HOUR,
+                         window=config.WORKER_MEMORY_WINDOW, warmup=config.WORKER_MEMORY_WARMUP)
+    on_recycle = (lambda cause: setattr(worker, 'alive', False)) if config.WORKER_RECYCLE_ENABLED else None
+    worker_reporter.start(repo_manager.packages_dir, threads, interval=config.WORKER_REPORT_INTERVAL,
+                          memory=memory, on_recycle=on_recycle)
+    
+    # 对象存储的文件列表同步线程（每个节点只有一个进程实际执行，本地存储不启动）
+    from models.storage import storage_sync_runner
+    storage_sync_runner.start(repo_manager, interval=config.STORAGE_SYNC_INTERVAL)
+    
+    # 完整性巡检线程（所有进程中只有一个实际执行；对象存储由服务端保证完整性，不巡检）
+    if config.SCRUB_ENABLED and repo_manager.storage.is_local:
+        from models.scrubber import scrubber_runner
+        scrubber_runner.start(
+            repo_manager,
+            config.SCRUB_BYTES_PER_SECOND,
+            idle_priority=config.SCRUB_IDLE_PRIORITY,
+            interval=config.SCRUB_INTERVAL,
+        )
+
+def worker_exit(server, worker):
+    """工作进程退出时的回调"""
+    from models.workers import worker_reporter
+    worker_reporter.stop()
 
 def worker_abort(worker):
     """工作进程异常退出时的回调"""
@@ -6,7 +6,6 @@ Simple Package Manager - 简单的包管理脚本
 
 import os
 import sys
-import shutil
 import argparse
 from pathlib import Path
 
@@ -37,28 +36,23 @@ def upload_package(file_path, package_name=None):
         parts = name.split('-')
         package_name = parts[0] if len(parts) >= 2 else name
     
-    # 创建包目录
-    packages_dir = Path("packages")
-    packages_dir.mkdir(exist_ok=True)
-    package_dir = packages_dir / package_name
-    package_dir.mkdir(exist_ok=True)
-    
-    # 复制文件
-    dest_path = package_dir / file_path.name
-    shutil.copy2(file_path, dest_path)
+    # 通过仓库管理器写入（与上传接口相同的任务：校验、包级写锁内发布并失效缓存）
+    from models.repository import RepositoryManager
+    if not RepositoryManager("packages").add_package(package_name, str(file_path)):
+        print(f"❌ 包上传失败: {package_name}/{file_path.name}")
+        return False
     
     print(f"✅ 包上传成功: {package_name}/{file_path.name}")
     return True
 
 def remove_package(package_name):
     """删除包"""
-    package_dir = Path("packages") / package_name
-    if not package_dir.exists():
+    # 移入回收站后在后台清除，不会影响其他进程中正在进行的下载
+    from models.repository import RepositoryManager
+    if not RepositoryManager("packages").remove_package(package_name):
         print(f"❌ 包不存在: {package_name}")
         return False
     
-    # 删除包目录
-    shutil.rmtree(package_dir)
     print(f"✅ 包删除成功: {package_name}")
     return True
 
@@ -0,0 +1,202 @@
+"""
+Admission - 准入控制与按客户端限速
+
+两种在所有 gunicorn 进程之间共享的状态，都保存在 <packages_dir>/.repo/ 中：
+
+- TransferSlots: 并发传输名额。每个名额是一个锁文件（slots/<类别>-<序号>.lock），
+  持有 flock 即占用名额；进程退出时锁自动释放，不会泄漏名额
+- TokenBuckets: 按客户端的令牌桶。桶保存在一个固定大小的 mmap 文件中，
+  客户端地址哈希到桶，每个桶只锁定自己的 16 字节（fcntl 记录锁），不同客户端之间互不阻塞
+"""
+
+import os
+import mmap
+import time
+import fcntl
+import random
+import struct
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from models.events import get_state_dir
+
+logger = logging.getLogger(__name__)
+
+# 令牌桶表的桶数量（客户端地址哈希冲突时共用一个桶）
+BUCKET_COUNT = 4096
+BUCKET_STRUCT = struct.Struct('dd')  # (tokens, updated_at)
+
+
+class Slot:
+    """已占用的传输名额，release() 可以重复调用"""
+    
+    def __init__(self, lock_file, semaphore: threading.BoundedSemaphore):
+        self._lock_file = lock_file
+        self._semaphore = semaphore
+        self._released = False
+        self._release_lock = threading.Lock()
+    
+    def release(self) -> None:
+        with self._release_lock:
+            if self._released:
+                return
+            self._released = True
+        fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        self._lock_file.close()
+        self._semaphore.release()
+
+
+class TransferSlots:
+    """跨进程的并发传输名额
+
+    limit 为所有进程合计的名额数；per_process_semaphore 限制单个进程内同时进行的
+    传输数量，保证每个工作进程总留有处理索引和健康检查请求的线程。
+    """
+    
+    def __init__(self, packages_dir, name: str, limit: int, per_process_semaphore: threading.BoundedSemaphore):
+        self.slots_dir = get_state_dir(packages_dir) / 'slots'
+        self.slots_dir.mkdir(exist_ok=True)
+        self.name = name
+        self.limit = limit
+        self.semaphore = per_process_semaphore
+    
+    def try_acquire(self) -> Optional[Slot]:
+        """立即尝试占用一个名额，没有空闲名额时返回None"""
+        if not self.semaphore.acquire(blocking=False):
+            return None
+        
+        # 随机顺序尝试，避免所有进程都争抢前几个名额
+        for index in random.sample(range(self.limit), self.limit):
+            lock_file = open(self.slots_dir / f"{self.name}-{index}.lock", 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                continue
+            return Slot(lock_file, self.semaphore)
+        
+        self.semaphore.release()
+        return None
+    
+    def in_use(self) -> int:
+        """当前所有进程合计占用的名额数"""
+        count = 0
+        for index in range(self.limit):
+            with open(self.slots_dir / f"{self.name}-{index}.lock", 'a') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                except BlockingIOError:
+                    count += 1
+        return count
+
+
+class TokenBuckets:
+    """跨进程共享的按客户端令牌桶"""
+    
+    def __init__(self, packages_dir, name: str, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        path = get_state_dir(packages_dir) / f"ratelimit-{name}.bin"
+        size = BUCKET_COUNT * BUCKET_STRUCT.size
+        
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        # 记录锁属于进程，同一进程内的线程之间另外用线程锁互斥
+        self._thread_lock = threading.Lock()
+    
+    def _bucket_offset(self, client: str) -> int:
+        digest = hashlib.blake2b(client.encode('utf-8'), digest_size=8).digest()
+        return (int.from_bytes(digest, 'big') % BUCKET_COUNT) * BUCKET_STRUCT.size
+    
+    def consume(self, client: str, tokens: float = 1.0) -> float:
+        """消耗令牌，成功返回0，否则返回需要等待的秒数"""
+        offset = self._bucket_offset(client)
+        with self._thread_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, BUCKET_STRUCT.size, offset)
+            try:
+                available, updated_at = BUCKET_STRUCT.unpack_from(self._map, offset)
+                now = time.time()
+                if updated_at == 0:
+                    available = self.burst
+                else:
+                    available = min(self.burst, available + (now - updated_at) * self.rate)
+                
+                if available >= tokens:
+                    BUCKET_STRUCT.pack_into(self._map, offset, available - tokens, now)
+                    return 0.0
+                
+                BUCKET_STRUCT.pack_into(self._map, offset, available, now)
+                return (tokens - available) / self.rate
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, BUCKET_STRUCT.size, offset)
+
+
+class AdmissionController:
+    """下载和上传的准入控制
+
+    每类请求先经过按客户端的令牌桶（超出时 429），再占用并发传输名额（没有名额时 503）。
+    rate 或 limit 为 0 时不做对应限制。
+    """
+    
+    def __init__(self, packages_dir, config: Dict):
+        self.packages_dir = Path(packages_dir)
+        self.large_file_size = config.get('ADMISSION_LARGE_FILE_SIZE', 10 * 1024 * 1024)
+        self.retry_after = config.get('ADMISSION_RETRY_AFTER', 5)
+        
+        per_process = threading.BoundedSemaphore(config.get('ADMISSION_WORKER_TRANSFER_SLOTS', 6))
+        self.slots: Dict[str, TransferSlots] = {}
+        self.buckets: Dict[str, TokenBuckets] = {}
+        for kind in ('download', 'upload'):
+            limit = config.get(f'ADMISSION_MAX_{kind.upper()}S', 0)
+            if limit:
+                self.slots[kind] = TransferSlots(self.packages_dir, kind, limit, per_process)
+            rate = config.get(f'RATE_LIMIT_{kind.upper()}_RATE', 0)
+            if rate:
+                burst = config.get(f'RATE_LIMIT_{kind.upper()}_BURST', rate)
+                self.buckets[kind] = TokenBuckets(self.packages_dir, kind, rate, burst)
+    
+    def check_rate(self, kind: str, client: str) -> float:
+        """返回需要等待的秒数，0 表示放行"""
+        buckets = self.buckets.get(kind)
+        if buckets is None:
+            return 0.0
+        return buckets.consume(client)
+    
+    def acquire(self, kind: str) -> Optional[Slot]:
+        """占用传输名额；不限制并发时返回一个空名额"""
+        slots = self.slots.get(kind)
+        if slots is None:
+            return _NO_SLOT
+        return slots.try_acquire()
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            kind: {'limit': slots.limit, 'in_use': slots.in_use()}
+            for kind, slots in self.slots.items()
+        }
+
+
+class _NoSlot:
+    def release(self) -> None:
+        pass
+
+
+_NO_SLOT = _NoSlot()
+
+_controllers: Dict[str, AdmissionController] = {}
+_controllers_lock = threading.Lock()
+
+
+def get_admission_controller(packages_dir, config: Dict) -> AdmissionController:
+    """获取进程内共享的准入控制器，配置只在首次创建时读取"""
+    key = str(Path(packages_dir).resolve())
+    with _controllers_lock:
+        if key not in _controllers:
+            _controllers[key] = AdmissionController(packages_dir, config)
+        return _controllers[key]
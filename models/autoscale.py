@@ -0,0 +1,249 @@
+"""
+Autoscale - 按负载调整 gunicorn 工作进程数
+
+在 gunicorn 主进程之外运行（autoscaler.py），每轮采集：
+
+- 工作进程报告（models/workers.py）中的在途请求数和 p95 延迟
+- 监听端口的 accept 队列长度（/proc/net/tcp 中 LISTEN 套接字的 rx_queue，只在 Linux 上可用）
+- 主机 CPU 使用率、可用内存和工作进程的平均 RSS（psutil）
+
+连续 up_rounds 轮过载时向主进程发送 SIGTTIN 增加一个工作进程，连续 down_rounds 轮空闲时
+发送 SIGTTOU 减少一个；两次调整之间至少间隔 cooldown 秒，进程数始终在 [min_workers, max_workers] 内。
+主机 CPU 已经饱和或内存不足以再启动一个工作进程时不扩容（增加进程只会让情况更糟）。
+每次决策（包括因 CPU、内存或上限而放弃的扩容）都追加到 .repo/autoscale.log。
+"""
+
+import os
+import json
+import time
+import signal
+import logging
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import psutil
+
+from models.events import get_state_dir
+from models.workers import read_worker_reports
+
+logger = logging.getLogger(__name__)
+
+# 审计日志保留的最大字节数，超过后保留后一半
+AUDIT_LOG_MAX_BYTES = 4 * 1024 * 1024
+
+
+def listen_backlog(port: int) -> Optional[int]:
+    """监听端口 accept 队列中等待的连接数，无法读取时返回None"""
+    total = None
+    for table in ('/proc/net/tcp', '/proc/net/tcp6'):
+        try:
+            with open(table, 'r') as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    # local_address 为 <地址>:<端口>（十六进制），状态 0A 为 LISTEN
+                    if fields[3] != '0A' or int(fields[1].rsplit(':', 1)[1], 16) != port:
+                        continue
+                    total = (total or 0) + int(fields[4].split(':')[1], 16)
+        except (OSError, StopIteration, IndexError, ValueError):
+            continue
+    return total
+
+
+class AutoscalePolicy:
+    """扩缩容阈值"""
+    
+    def __init__(self, min_workers: int, max_workers: int, up_utilization: float = 0.75,
+                 down_utilization: float = 0.25, latency_p95_ms: float = 1000, up_rounds: int = 2,
+                 down_rounds: int = 10, cooldown: float = 60, max_cpu_percent: float = 90,
+                 memory_reserve: int = 512 * 1024 * 1024):
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.up_utilization = up_utilization
+        self.down_utilization = down_utilization
+        self.latency_p95_ms = latency_p95_ms
+        self.up_rounds = up_rounds
+        self.down_rounds = down_rounds
+        self.cooldown = cooldown
+        self.max_cpu_percent = max_cpu_percent
+        self.memory_reserve = memory_reserve
+    
+    @classmethod
+    def from_config(cls, config) -> 'AutoscalePolicy':
+        return cls(
+            config.AUTOSCALE_MIN_WORKERS, config.AUTOSCALE_MAX_WORKERS,
+            up_utilization=config.AUTOSCALE_UP_UTILIZATION,
+            down_utilization=config.AUTOSCALE_DOWN_UTILIZATION,
+            latency_p95_ms=config.AUTOSCALE_LATENCY_P95_MS,
+            up_rounds=config.AUTOSCALE_UP_ROUNDS,
+            down_rounds=config.AUTOSCALE_DOWN_ROUNDS,
+            cooldown=config.AUTOSCALE_COOLDOWN,
+            max_cpu_percent=config.AUTOSCALE_MAX_CPU_PERCENT,
+            memory_reserve=config.AUTOSCALE_MEMORY_RESERVE,
+        )
+
+
+class AutoscaleController:
+    """读取负载信号，通过 TTIN/TTOU 信号调整 gunicorn 主进程的工作进程数"""
+    
+    def __init__(self, packages_dir, pidfile: str, port: int, policy: AutoscalePolicy):
+        self.packages_dir = Path(packages_dir)
+        self.pidfile = Path(pidfile)
+        self.port = port
+        self.policy = policy
+        self.audit_path = get_state_dir(packages_dir) / 'autoscale.log'
+        
+        self.pressure_rounds = 0
+        self.idle_rounds = 0
+        self.last_action_at = 0.0
+        # 发出信号后主进程调整需要时间，期间按目标进程数计算
+        self.target: Optional[int] = None
+        # 扩容持续受阻时只在原因变化时记录一次
+        self.last_blocked: Optional[str] = None
+    
+    def _master(self) -> Optional[psutil.Process]:
+        try:
+            return psutil.Process(int(self.pidfile.read_text().strip()))
+        except (OSError, ValueError, psutil.Error):
+            return None
+    
+    def sample(self, master: psutil.Process) -> Dict[str, Any]:
+        """采集一轮负载信号"""
+        children = master.children()
+        rss = []
+        for child in children:
+            try:
+                rss.append(child.memory_info().rss)
+            except psutil.Error:
+                continue
+        
+        pids = {child.pid for child in children}
+        reports = [report for report in read_worker_reports(self.packages_dir) if report['pid'] in pids]
+        capacity = sum(report['threads'] for report in reports)
+        in_flight = sum(report['in_flight'] for report in reports)
+        latencies = [report['p95_ms'] for report in reports if report.get('p95_ms') is not None]
+        
+        return {
+            'workers': len(children),
+            'reporting': len(reports),
+            'in_flight': in_flight,
+            'utilization': round(in_flight / capacity, 3) if capacity else None,
+            # 各进程 p95 的最大值：任何一个进程排队都会体现在客户端延迟上
+            'p95_ms': round(max(latencies), 1) if latencies else None,
+            'backlog': listen_backlog(self.port),
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'memory_available': psutil.virtual_memory().available,
+            'worker_rss': int(sum(rss) / len(rss)) if rss else 0,
+        }
+    
+    def decide(self, signals: Dict[str, Any], now: float) -> Dict[str, Any]:
+        """根据信号决定扩容（up）、缩容（down）或保持（hold），返回决策及原因"""
+        policy = self.policy
+        workers = self.target if self.target is not None else signals['workers']
+        utilization = signals['utilization']
+        
+        pressure = []
+        if utilization is not None and utilization >= policy.up_utilization:
+            pressure.append(f"utilization {utilization:.0%} >= {policy.up_utilization:.0%}")
+        if signals['backlog']:
+            pressure.append(f"accept backlog {signals['backlog']}")
+        if signals['p95_ms'] is not None and signals['p95_ms'] >= policy.latency_p95_ms:
+            pressure.append(f"p95 {signals['p95_ms']}ms >= {policy.latency_p95_ms:g}ms")
+        
+        idle = (not pressure and utilization is not None and utilization <= policy.down_utilization)
+        
+        self.pressure_rounds = self.pressure_rounds + 1 if pressure else 0
+        self.idle_rounds = self.idle_rounds + 1 if idle else 0
+        
+        decision = {'action': 'hold', 'workers': workers, 'reasons': pressure}
+        cooling = now - self.last_action_at < policy.cooldown
+        
+        if workers < policy.min_workers:
+            return {**decision, 'action': 'up', 'reasons': [f"below minimum {policy.min_workers}"]}
+        if workers > policy.max_workers:
+            return {**decision, 'action': 'down', 'reasons': [f"above maximum {policy.max_workers}"]}
+        
+        if self.pressure_rounds >= policy.up_rounds and not cooling:
+            if workers >= policy.max_workers:
+                return {**decision, 'blocked': f"at maximum {policy.max_workers}"}
+            if signals['cpu_percent'] >= policy.max_cpu_percent:
+                return {**decision, 'blocked': f"host CPU above {policy.max_cpu_percent:g}%"}
+            if signals['memory_available'] < signals['worker_rss'] + policy.memory_reserve:
+                return {**decision, 'blocked': 'not enough memory for another worker'}
+            return {**decision, 'action': 'up'}
+        
+        if self.idle_rounds >= policy.down_rounds and not cooling and workers > policy.min_workers:
+            return {**decision, 'action': 'down',
+                    'reasons': [f"utilization {utilization:.0%} <= {policy.down_utilization:.0%} "
+                                f"for {self.idle_rounds} rounds"]}
+        return decision
+    
+    def step(self) -> Optional[Dict[str, Any]]:
+        """执行一轮：采集、决策，需要时发送信号；主进程不存在时返回None"""
+        master = self._master()
+        if master is None:
+            self.target = None
+            return None
+        
+        signals = self.sample(master)
+        if self.target is not None and signals['workers'] == self.target:
+            self.target = None
+        
+        now = time.time()
+        decision = self.decide(signals, now)
+        if decision['action'] != 'hold':
+            workers = decision['workers']
+            os.kill(master.pid, signal.SIGTTIN if decision['action'] == 'up' else signal.SIGTTOU)
+            self.target = workers + 1 if decision['action'] == 'up' else workers - 1
+            self.last_action_at = now
+            self.pressure_rounds = self.idle_rounds = 0
+            logger.info(f"Autoscale {decision['action']}: {workers} -> {self.target} workers "
+                        f"({'; '.join(decision['reasons'])})")
+            self.audit({**decision, 'to': self.target, 'signals': signals}, now)
+        elif 'blocked' in decision and decision['blocked'] != self.last_blocked:
+            logger.warning(f"Autoscale up blocked: {decision['blocked']}")
+            self.audit({**decision, 'signals': signals}, now)
+        self.last_blocked = decision.get('blocked')
+        return {**decision, 'signals': signals}
+    
+    def audit(self, entry: Dict[str, Any], now: float) -> None:
+        """追加一条审计记录（JSON Lines）"""
+        line = json.dumps({'time': now, **entry}, ensure_ascii=False) + '\n'
+        with open(self.audit_path, 'a', encoding='utf-8') as f:
+            f.write(line)
+        if self.audit_path.stat().st_size > AUDIT_LOG_MAX_BYTES:
+            with open(self.audit_path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+            with open(self.audit_path, 'w', encoding='utf-8') as f:
+                f.writelines(lines[len(lines) // 2:])
+    
+    def run(self, interval: float = 5) -> None:
+        logger.info(f"Autoscaler started: {self.policy.min_workers}-{self.policy.max_workers} workers, "
+                    f"master pidfile {self.pidfile}")
+        # cpu_percent 第一次调用没有参考值
+        psutil.cpu_percent(interval=None)
+        while True:
+            started = time.monotonic()
+            try:
+                self.step()
+            except Exception as e:
+                logger.error(f"Autoscale round failed: {e}")
+            time.sleep(max(0, interval - (time.monotonic() - started)))
+
+
+def read_audit_log(packages_dir, limit: int = 50) -> List[Dict[str, Any]]:
+    """最近的扩缩容决策，最新的在前"""
+    path = get_state_dir(packages_dir) / 'autoscale.log'
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = deque(f, maxlen=limit)
+    except FileNotFoundError:
+        return []
+    entries = []
+    for line in reversed(lines):
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries
@@ -0,0 +1,400 @@
+"""
+Bundle - 离线安装用的 wheelhouse 归档
+
+把一组包文件（通常是 /resolve 得到的依赖闭包）打成一个 tar 或 zip，直接写入响应或本地文件：
+
+- 不生成临时文件，也不在内存中拼装整个归档：文件逐个边读边发送，内存占用与归档大小无关
+- tar 不压缩（wheel 和 sdist 本身已经压缩），文件内容原样写入，长度可以提前算出；
+  命令行写入本地文件时用 os.sendfile 在内核中直接复制
+- zip 使用 STORED 和 data descriptor，CRC32 在发送过程中计算
+- 归档内容由清单（文件名和 sha256）唯一确定。同一个归档在本进程中第二次被请求时，
+  发送的同时写入 .repo/bundles/ 缓存，之后直接作为普通文件发送（gunicorn 使用 sendfile）
+
+归档中的文件位于 wheelhouse/ 目录下，附带 manifest.json；按需求解析得到的归档还带有
+requirements.txt，可以直接用 pip install --no-index --find-links wheelhouse -r wheelhouse/requirements.txt 安装。
+"""
+
+import os
+import json
+import time
+import errno
+import hashlib
+import logging
+import tarfile
+import zipfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from models.events import get_state_dir
+from models.locks import package_lock
+from models.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'tar': 'application/x-tar', 'zip': 'application/zip'}
+
+# 归档内的目录名
+ARCHIVE_ROOT = 'wheelhouse'
+
+# 每次读取/发送的字节数
+CHUNK_SIZE = 256 * 1024
+
+# 记录最近请求过的归档数量上限（用于第二次请求时写入缓存）
+MAX_TRACKED_REQUESTS = 1024
+
+
+class BundleError(Exception):
+    """请求的文件不存在（404）、数量超过限制（413）或在打包前发生了变化（409）"""
+    
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class BundlePlan:
+    """归档清单：只读取文件记录，不打开文件，用于计算缓存键"""
+    
+    def __init__(self, packages_dir: Path, fmt: str, manifest: Dict[str, Any]):
+        self.packages_dir = Path(packages_dir)
+        self.format = fmt
+        self.manifest = manifest
+        self.manifest_bytes = json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8') + b'\n'
+        self.key = hashlib.sha256(fmt.encode('ascii') + b'\0' + self.manifest_bytes).hexdigest()
+    
+    @property
+    def filename(self) -> str:
+        return f"{ARCHIVE_ROOT}-{self.key[:16]}.{self.format}"
+    
+    def requirements_txt(self) -> Optional[bytes]:
+        if self.manifest.get('requirements') is None:
+            return None
+        pins = sorted({f"{entry['name']}=={entry['version']}" for entry in self.manifest['files']})
+        return ''.join(pin + '\n' for pin in pins).encode('utf-8')
+    
+    def open(self) -> 'Bundle':
+        """在各个包的读锁内打开所有文件；之后的删除或替换不影响正在发送的归档"""
+        storage = get_storage(self.packages_dir)
+        handles = []
+        try:
+            for entry in self.manifest['files']:
+                with package_lock(self.packages_dir, entry['name']):
+                    try:
+                        # 对象存储中的文件先下载到本地缓存，归档仍然可以用 sendfile 发送
+                        handle = open(storage.local_path(entry['name'], entry['filename']), 'rb')
+                    except FileNotFoundError:
+                        raise BundleError(f"{entry['name']}/{entry['filename']} was removed, retry the request", 409)
+                handles.append(handle)
+                stat = os.fstat(handle.fileno())
+                if stat.st_size != entry['size']:
+                    raise BundleError(f"{entry['name']}/{entry['filename']} changed, retry the request", 409)
+        except Exception:
+            for handle in handles:
+                handle.close()
+            raise
+        return Bundle(self, handles)
+
+
+class Bundle:
+    """已打开的归档，发送完成后必须调用 close()"""
+    
+    def __init__(self, plan: BundlePlan, handles):
+        self.plan = plan
+        self.members = []
+        for entry, handle in zip(plan.manifest['files'], handles):
+            stat = os.fstat(handle.fileno())
+            self.members.append((f"{ARCHIVE_ROOT}/{entry['filename']}", handle, entry['size'], int(stat.st_mtime)))
+        self.mtime = max((member[3] for member in self.members), default=int(time.time()))
+        
+        self.extras = [(f"{ARCHIVE_ROOT}/manifest.json", plan.manifest_bytes)]
+        requirements = plan.requirements_txt()
+        if requirements is not None:
+            self.extras.append((f"{ARCHIVE_ROOT}/requirements.txt", requirements))
+    
+    def close(self) -> None:
+        for _, handle, _, _ in self.members:
+            handle.close()
+    
+    def _tar_header(self, arcname: str, size: int, mtime: int) -> bytes:
+        info = tarfile.TarInfo(arcname)
+        info.size = size
+        info.mtime = mtime
+        info.mode = 0o644
+        return info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+    
+    def _tar_parts(self):
+        """tar 的组成部分：bytes，或 (文件, 长度) 表示原样复制的文件内容"""
+        for arcname, data in self.extras:
+            yield self._tar_header(arcname, len(data), self.mtime)
+            yield data + b'\0' * (-len(data) % tarfile.BLOCKSIZE)
+        for arcname, handle, size, mtime in self.members:
+            yield self._tar_header(arcname, size, mtime)
+            yield (handle, size)
+            yield b'\0' * (-size % tarfile.BLOCKSIZE)
+        yield b'\0' * (2 * tarfile.BLOCKSIZE)
+    
+    def content_length(self) -> Optional[int]:
+        """归档的总字节数（只有 tar 可以提前算出）"""
+        if self.plan.format != 'tar':
+            return None
+        return sum(part[1] if isinstance(part, tuple) else len(part) for part in self._tar_parts())
+    
+    def iter_chunks(self) -> Iterator[bytes]:
+        """按块生成归档内容（用于 HTTP 响应）"""
+        if self.plan.format == 'zip':
+            yield from self._iter_zip()
+            return
+        for part in self._tar_parts():
+            if isinstance(part, tuple):
+                yield from _read_exactly(*part)
+            elif part:
+                yield part
+    
+    def _iter_zip(self) -> Iterator[bytes]:
+        sink = _ChunkSink()
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for arcname, data in self.extras:
+                archive.writestr(_zip_info(arcname, len(data), self.mtime), data)
+                yield from sink.drain()
+            for arcname, handle, size, mtime in self.members:
+                with archive.open(_zip_info(arcname, size, mtime), 'w') as dst:
+                    for chunk in _read_exactly(handle, size):
+                        dst.write(chunk)
+                        yield from sink.drain()
+                yield from sink.drain()
+        yield from sink.drain()
+    
+    def write_to(self, fd: int) -> int:
+        """写入文件描述符，返回写入的字节数；tar 的文件内容使用 os.sendfile 复制"""
+        written = 0
+        if self.plan.format == 'zip':
+            for chunk in self._iter_zip():
+                written += _write_all(fd, chunk)
+            return written
+        for part in self._tar_parts():
+            if isinstance(part, tuple):
+                written += _copy_to_fd(part[0], fd, part[1])
+            elif part:
+                written += _write_all(fd, part)
+        return written
+
+
+class _ChunkSink:
+    """zipfile 的输出目标：不可 seek，写入的数据由生成器取走"""
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self) -> None:
+        pass
+    
+    def drain(self) -> List[bytes]:
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+
+def _zip_info(arcname: str, size: int, mtime: int) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(arcname, date_time=time.localtime(max(mtime, 315532800))[:6])
+    info.file_size = size
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def _read_exactly(handle, size: int) -> Iterator[bytes]:
+    handle.seek(0)
+    remaining = size
+    while remaining > 0:
+        chunk = handle.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            # 文件被截断：中断发送，不能生成长度与头部不一致的归档
+            raise BundleError(f"{handle.name} was truncated while bundling", 409)
+        remaining -= len(chunk)
+        yield chunk
+
+
+def _write_all(fd: int, data: bytes) -> int:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+    return len(data)
+
+
+def _copy_to_fd(handle, fd: int, size: int) -> int:
+    """用 os.sendfile 复制文件内容，不支持时退回到读写"""
+    offset = 0
+    try:
+        while offset < size:
+            sent = os.sendfile(fd, handle.fileno(), offset, min(size - offset, 1 << 30))
+            if sent == 0:
+                raise BundleError(f"{handle.name} was truncated while bundling", 409)
+            offset += sent
+        return size
+    except OSError as e:
+        if offset or e.errno not in (errno.EINVAL, errno.ENOSYS, errno.ENOTSUP, errno.EBADF):
+            raise
+    for chunk in _read_exactly(handle, size):
+        _write_all(fd, chunk)
+    return size
+
+
+def plan_bundle(repo_manager, files: List[Dict[str, str]], fmt: str = 'tar',
+                requirements: Optional[List[str]] = None, missing: Optional[List[str]] = None,
+                max_files: int = 1000) -> BundlePlan:
+    """根据 [{'name', 'filename'}] 生成归档清单，文件必须在仓库中存在且没有被隔离"""
+    if fmt not in FORMATS:
+        raise BundleError(f"Unsupported format: {fmt}, expected one of {', '.join(FORMATS)}")
+    if len(files) > max_files:
+        raise BundleError(f"Too many files in bundle: {len(files)} > {max_files}", 413)
+    
+    by_package: Dict[str, List[str]] = {}
+    for entry in files:
+        package_name = repo_manager.resolve_package_name(entry['name'])
+        if package_name is None:
+            raise BundleError(f"Package not found: {entry['name']}", 404)
+        by_package.setdefault(package_name, []).append(entry['filename'])
+    
+    manifest_files = []
+    for package_name, filenames in sorted(by_package.items()):
+        available = repo_manager.list_package_dir(package_name)
+        for filename in filenames:
+            if filename not in available:
+                raise BundleError(f"File not found: {package_name}/{filename}", 404)
+        with package_lock(repo_manager.packages_dir, package_name):
+            records = repo_manager.catalog.ensure_records(package_name, available)
+        for filename in sorted(set(filenames)):
+            record = records[filename]
+            manifest_files.append({
+                'name': package_name,
+                'version': record.get('version'),
+                'filename': filename,
+                'sha256': record['sha256'],
+                'size': record['size'],
+            })
+    
+    manifest = {'files': manifest_files}
+    if requirements is not None:
+        manifest['requirements'] = sorted(requirements)
+        manifest['missing'] = sorted(missing or [])
+    return BundlePlan(repo_manager.packages_dir, fmt, manifest)
+
+
+class BundleCache:
+    """按清单哈希缓存生成过的归档，总大小超过 max_bytes 时删除最久未使用的归档"""
+    
+    def __init__(self, packages_dir: Path, max_bytes: int):
+        self.cache_dir = get_state_dir(packages_dir).resolve() / 'bundles'
+        self.cache_dir.mkdir(exist_ok=True)
+        self.max_bytes = max_bytes
+        self._requests: 'OrderedDict[str, None]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'stored': 0, 'evictions': 0}
+    
+    def _path(self, plan: BundlePlan) -> Path:
+        return self.cache_dir / f"{plan.key}.{plan.format}"
+    
+    def lookup(self, plan: BundlePlan) -> Optional[Path]:
+        """命中时返回缓存文件路径（并更新其修改时间用于 LRU）"""
+        path = self._path(plan)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._counters['misses'] += 1
+            return None
+        with self._lock:
+            self._counters['hits'] += 1
+        return path
+    
+    def should_store(self, plan: BundlePlan, size: Optional[int]) -> bool:
+        """第二次请求同一个归档时写入缓存；只被请求一次的归档不占用缓存空间"""
+        if self.max_bytes <= 0 or (size is not None and size > self.max_bytes // 4):
+            return False
+        with self._lock:
+            if plan.key in self._requests:
+                del self._requests[plan.key]
+                return True
+            self._requests[plan.key] = None
+            if len(self._requests) > MAX_TRACKED_REQUESTS:
+                self._requests.popitem(last=False)
+            return False
+    
+    def tee(self, plan: BundlePlan, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """发送的同时写入缓存；发送中断或归档过大时丢弃未完成的缓存文件"""
+        path = self._path(plan)
+        partial = self.cache_dir / f".{plan.key}.{os.getpid()}.{threading.get_ident()}.partial"
+        limit = self.max_bytes // 4
+        written = 0
+        out = open(partial, 'wb')
+        try:
+            for chunk in chunks:
+                if out is not None:
+                    written += len(chunk)
+                    if written > limit:
+                        out.close()
+                        out = None
+                        partial.unlink()
+                    else:
+                        out.write(chunk)
+                yield chunk
+            if out is not None:
+                out.close()
+                out = None
+                os.replace(partial, path)
+                with self._lock:
+                    self._counters['stored'] += 1
+                self.evict()
+        finally:
+            if out is not None:
+                out.close()
+                partial.unlink(missing_ok=True)
+    
+    def evict(self) -> None:
+        entries = []
+        for path in self.cache_dir.iterdir():
+            if path.name.startswith('.'):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            with self._lock:
+                self._counters['evictions'] += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """缓存命中等指标（命中次数为当前进程，大小为所有进程共享的缓存目录）"""
+        bundles, total = 0, 0
+        for path in self.cache_dir.iterdir():
+            if not path.name.startswith('.'):
+                try:
+                    total += path.stat().st_size
+                    bundles += 1
+                except FileNotFoundError:
+                    pass
+        with self._lock:
+            return {**self._counters, 'bundles': bundles, 'bytes': total, 'max_bytes': self.max_bytes}
+
+
+_caches: Dict[str, BundleCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_bundle_cache(packages_dir, max_bytes: int = 2 * 1024 * 1024 * 1024) -> BundleCache:
+    """获取进程内共享的归档缓存，参数只在首次创建时生效"""
+    key = str(Path(packages_dir).resolve())
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = BundleCache(Path(packages_dir), max_bytes)
+        return _caches[key]
@@ -0,0 +1,336 @@
+"""
+Catalog - 包文件记录
+
+每个包一个 JSON 文档（<packages_dir>/.repo/catalog/<package>.json），
+记录文件大小、修改时间、sha256、Requires-Python 以及解析出的版本、构建号和 wheel 标签。
+哈希、元数据读取和文件名解析只在文件首次入库（或大小/修改时间变化）时进行一次，
+之后的页面生成和查询都直接读取记录。
+
+每次写入包文档时同时写出一个很小的最新版本摘要（<package>.latest.json），
+查询最新版本时只读取这个文件，与包中的版本数量无关。
+
+文档变化时同步维护按 sha256 的反向索引（<packages_dir>/.repo/hashes/<前两位>/<sha256>.json），
+"仓库中是否已有这个文件"只需要读取一个很小的文件，与仓库大小无关。索引不存在时（升级后首次查询）
+由包文档一次性重建。
+"""
+
+import json
+import time
+import fcntl
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from models.compression import atomic_write
+from models.events import get_state_dir
+from models.metadata import read_core_metadata
+from models.versions import file_sort_key, latest_version, normalize_name, parse_filename
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# 索引完整建立后写入的标记文件
+HASH_INDEX_MARKER = '.complete'
+
+
+def hash_file(path: Path) -> str:
+    """流式计算文件 sha256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_package_type(filename: str) -> str:
+    """根据文件名判断分发类型"""
+    if filename.endswith('.whl'):
+        return 'bdist_wheel'
+    elif filename.endswith('.tar.gz') or filename.endswith('.zip'):
+        return 'sdist'
+    return 'unknown'
+
+
+def build_record(path: Path, sha256: Optional[str] = None, info=None) -> Dict[str, Any]:
+    """为文件生成记录，sha256 未提供时计算
+
+    info 为存储后端中文件的元数据（ObjectInfo），提供时大小和修改时间以存储中的对象为准。
+    """
+    if info is None:
+        stat = path.stat()
+        size, mtime_ns, mtime = stat.st_size, stat.st_mtime_ns, stat.st_mtime
+    else:
+        size, mtime_ns, mtime = info.size, info.mtime_ns, info.mtime
+    record = {
+        'filename': path.name,
+        'size': size,
+        'mtime_ns': mtime_ns,
+        'sha256': sha256 or hash_file(path),
+        'packagetype': get_package_type(path.name),
+        'upload_time': mtime,
+    }
+    record.update(read_core_metadata(path))
+    record.update(_version_fields(path.name))
+    return record
+
+
+def _version_fields(filename: str) -> Dict[str, Any]:
+    """记录中的版本字段，无法解析的文件名对应的字段为None"""
+    return parse_filename(filename) or {'version': None, 'build': None, 'tags': None}
+
+
+def summarize_latest(package_name: str, records: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """由文件记录生成最新版本摘要，没有可识别的版本时返回None"""
+    versions = {r['version'] for r in records.values() if r.get('version')}
+    version = latest_version(list(versions))
+    if version is None:
+        return None
+    
+    files = sorted(
+        (r for r in records.values() if r.get('version') == version),
+        key=lambda r: file_sort_key(r['filename'], r)
+    )
+    return {
+        'name': package_name,
+        'version': version,
+        'versions_count': len(versions),
+        'files': files,
+    }
+
+
+class PackageCatalog:
+    """包文件记录存储
+
+    文档通过原子替换写入，多个进程并发读取是安全的；写入方对同一个包
+    的更新以最后一次为准，记录总能通过 ensure_records() 从磁盘重建。
+    """
+    
+    def __init__(self, packages_dir, storage):
+        self.packages_dir = Path(packages_dir)
+        self.storage = storage
+        self.catalog_dir = get_state_dir(packages_dir) / 'catalog'
+        self.catalog_dir.mkdir(parents=True, exist_ok=True)
+        self.hash_dir = get_state_dir(packages_dir) / 'hashes'
+        self.hash_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+    
+    def _doc_path(self, package_name: str) -> Path:
+        return self.catalog_dir / f"{package_name}.json"
+    
+    def _latest_path(self, package_name: str) -> Path:
+        return self.catalog_dir / f"{package_name}.latest.json"
+    
+    def get(self, package_name: str) -> Dict[str, Any]:
+        """读取包文档，不存在时返回空文档"""
+        try:
+            with open(self._doc_path(package_name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {'name': package_name, 'files': {}}
+    
+    def get_latest(self, package_name: str) -> Optional[Dict[str, Any]]:
+        """读取最新版本摘要，没有记录时返回None"""
+        try:
+            with open(self._latest_path(package_name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    def save(self, package_name: str, doc: Dict[str, Any]) -> None:
+        previous = self.get(package_name)['files']
+        doc['updated_at'] = time.time()
+        atomic_write(self._doc_path(package_name),
+                     json.dumps(doc, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+        self._update_hash_index(package_name, previous, doc['files'])
+        
+        latest = summarize_latest(package_name, doc['files'])
+        if latest is None:
+            self._unlink(self._latest_path(package_name))
+        else:
+            atomic_write(self._latest_path(package_name),
+                         json.dumps(latest, ensure_ascii=False).encode('utf-8'))
+    
+    def put_file(self, package_name: str, record: Dict[str, Any]) -> None:
+        """添加或替换单个文件记录"""
+        with self._lock:
+            doc = self.get(package_name)
+            doc['files'][record['filename']] = record
+            self.save(package_name, doc)
+    
+    def remove_file(self, package_name: str, filename: str) -> None:
+        with self._lock:
+            doc = self.get(package_name)
+            if doc['files'].pop(filename, None) is not None:
+                self.save(package_name, doc)
+    
+    def update_records(self, package_name: str, updates: Dict[str, Dict[str, Any]]) -> int:
+        """合并字段到已有记录（{文件名: 字段}），返回更新的记录数"""
+        with self._lock:
+            doc = self.get(package_name)
+            count = 0
+            for filename, fields in updates.items():
+                record = doc['files'].get(filename)
+                if record is not None:
+                    record.update(fields)
+                    count += 1
+            if count:
+                self.save(package_name, doc)
+            return count
+    
+    def set_yanked(self, package_name: str, filename: str, reason: Optional[str]) -> bool:
+        """标记（reason 为字符串，可以为空）或取消标记（reason 为None）文件为 yanked"""
+        return self.update_records(package_name, {filename: {'yanked': reason}}) > 0
+    
+    def remove_package(self, package_name: str) -> None:
+        previous = self.get(package_name)['files']
+        self._unlink(self._doc_path(package_name))
+        self._unlink(self._latest_path(package_name))
+        self._update_hash_index(package_name, previous, {})
+    
+    def _hash_path(self, sha256: str) -> Path:
+        return self.hash_dir / sha256[:2] / f"{sha256}.json"
+    
+    @contextmanager
+    def _hash_index_lock(self):
+        """索引文件的读-改-写在所有进程之间串行（只在文件增删时持有）"""
+        with open(self.hash_dir / '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _read_hash_entries(self, sha256: str) -> List[Dict[str, Any]]:
+        try:
+            with open(self._hash_path(sha256), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return []
+    
+    def _write_hash_entries(self, sha256: str, entries: List[Dict[str, Any]]) -> None:
+        path = self._hash_path(sha256)
+        if not entries:
+            self._unlink(path)
+            return
+        path.parent.mkdir(exist_ok=True)
+        atomic_write(path, json.dumps(entries, ensure_ascii=False).encode('utf-8'))
+    
+    def _update_hash_index(self, package_name: str, previous: Dict[str, Dict[str, Any]],
+                           current: Dict[str, Dict[str, Any]]) -> None:
+        """按文档变化前后的记录增删索引项（重复执行结果不变）"""
+        def entries(records):
+            return {(r['sha256'], filename): r['size'] for filename, r in records.items() if r.get('sha256')}
+        
+        before, after = entries(previous), entries(current)
+        changed: Dict[str, List] = {}
+        for key in before.keys() - after.keys():
+            changed.setdefault(key[0], []).append(('remove', key[1], None))
+        for key in after.keys() - before.keys():
+            changed.setdefault(key[0], []).append(('add', key[1], after[key]))
+        if not changed:
+            return
+        
+        with self._hash_index_lock():
+            for sha256, updates in changed.items():
+                items = self._read_hash_entries(sha256)
+                for action, filename, size in updates:
+                    items = [e for e in items if (e['package'], e['filename']) != (package_name, filename)]
+                    if action == 'add':
+                        items.append({'package': package_name, 'filename': filename, 'size': size})
+                self._write_hash_entries(sha256, items)
+    
+    def ensure_hash_index(self) -> None:
+        """索引尚未建立时由所有包文档重建"""
+        marker = self.hash_dir / HASH_INDEX_MARKER
+        if marker.exists():
+            return
+        with self._hash_index_lock():
+            if marker.exists():
+                return
+            index: Dict[str, List[Dict[str, Any]]] = {}
+            for path in self.catalog_dir.glob('*.json'):
+                if path.name.endswith('.latest.json'):
+                    continue
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        doc = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                for filename, record in doc.get('files', {}).items():
+                    if record.get('sha256'):
+                        index.setdefault(record['sha256'], []).append(
+                            {'package': path.stem, 'filename': filename, 'size': record['size']})
+            for sha256, items in index.items():
+                self._write_hash_entries(sha256, items)
+            marker.touch()
+            logger.info(f"Built sha256 index for {len(index)} files")
+    
+    def find_by_hash(self, sha256: str, package_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """仓库中内容为 sha256 的文件（[{package, filename, size}]），可按包名（规范化比较）过滤
+
+        索引项以存储中的文件为准核对，已经不存在或大小不符的文件不返回。
+        """
+        sha256 = sha256.lower()
+        if len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256):
+            return []
+        self.ensure_hash_index()
+        
+        wanted = normalize_name(package_name) if package_name else None
+        found = []
+        for entry in self._read_hash_entries(sha256):
+            if wanted is not None and normalize_name(entry['package']) != wanted:
+                continue
+            info = self.storage.stat(entry['package'], entry['filename'])
+            if info is not None and info.size == entry['size']:
+                found.append(entry)
+        return found
+    
+    @staticmethod
+    def _unlink(path: Path) -> None:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+    
+    def ensure_records(self, package_name: str, files: List[str]) -> Dict[str, Dict[str, Any]]:
+        """让记录与存储中的文件列表一致，返回 {文件名: 记录}
+
+        大小和修改时间都未变化的记录直接复用，只对新文件或变化的文件计算哈希
+        （对象存储中的文件先下载到本地缓存）。
+        """
+        with self._lock:
+            doc = self.get(package_name)
+            records = doc['files']
+            changed = False
+            
+            for filename in files:
+                info = self.storage.stat(package_name, filename)
+                if info is None:
+                    continue
+                record = records.get(filename)
+                if record and record['size'] == info.size and record['mtime_ns'] == info.mtime_ns:
+                    if 'version' not in record:
+                        # 旧记录没有版本字段，补充解析结果即可，不需要重新计算哈希
+                        record.update(_version_fields(filename))
+                        changed = True
+                    continue
+                try:
+                    path = self.storage.local_path(package_name, filename)
+                except FileNotFoundError:
+                    continue
+                records[filename] = build_record(path, info=info)
+                changed = True
+            
+            for filename in list(records):
+                if filename not in files:
+                    del records[filename]
+                    changed = True
+            
+            if changed:
+                self.save(package_name, doc)
+            
+            return records
@@ -0,0 +1,138 @@
+"""
+Compression - 预压缩变体的生成与内容协商
+
+索引页面和元数据文件在生成时一次性写出 gzip / brotli 变体，
+请求时只根据 Accept-Encoding 选择已有文件，不在请求路径上压缩。
+"""
+
+import gzip
+import os
+import tempfile
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import brotli  # 可选依赖
+except ImportError:  # pragma: no cover - 取决于部署环境
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 编码名称到文件后缀的映射，按服务端偏好排序
+ENCODING_SUFFIXES = {
+    'br': '.br',
+    'gzip': '.gz',
+}
+
+# 小于该大小的内容不值得压缩
+MIN_COMPRESS_SIZE = 256
+
+
+def available_encodings() -> List[str]:
+    """当前环境可以生成的压缩编码"""
+    encodings = []
+    if brotli is not None:
+        encodings.append('br')
+    encodings.append('gzip')
+    return encodings
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """按指定编码压缩数据"""
+    if encoding == 'gzip':
+        # mtime=0 保证相同内容得到相同输出（便于ETag和静态导出）
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == 'br':
+        if brotli is None:
+            raise ValueError('brotli is not installed')
+        return brotli.compress(data, quality=11)
+    raise ValueError(f'Unsupported encoding: {encoding}')
+
+
+def atomic_write(path: Path, data: bytes):
+    """原子写文件：先写临时文件再替换"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def write_with_variants(path: Path, data: bytes) -> Dict[str, Path]:
+    """写出原始文件及其压缩变体，返回编码到路径的映射（identity 对应原始文件）"""
+    path = Path(path)
+    atomic_write(path, data)
+    written = {'identity': path}
+    
+    for encoding in available_encodings():
+        variant = path.with_name(path.name + ENCODING_SUFFIXES[encoding])
+        if len(data) < MIN_COMPRESS_SIZE:
+            # 内容太小时删除可能残留的旧变体
+            if variant.exists():
+                variant.unlink()
+            continue
+        atomic_write(variant, compress(data, encoding))
+        written[encoding] = variant
+    
+    return written
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """解析 Accept-Encoding 头，返回编码到q值的映射"""
+    accepted = {}
+    if not header:
+        return accepted
+    
+    for part in header.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, params = part.partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name.strip().lower()] = q
+    
+    return accepted
+
+
+def choose_encoding(header: Optional[str], candidates: Iterable[str]) -> str:
+    """从候选编码中选出客户端接受且服务端偏好的编码，否则返回 identity"""
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*')
+    
+    best, best_q = 'identity', 0.0
+    for encoding in candidates:
+        q = accepted.get(encoding, wildcard if wildcard is not None else 0.0)
+        # 相同q值时保留先出现的（服务端偏好顺序）
+        if q > best_q:
+            best, best_q = encoding, q
+    
+    return best
+
+
+def find_variant(path: Path, header: Optional[str]) -> Tuple[str, Path]:
+    """为已存在的文件选择最合适的预压缩变体，返回 (编码, 路径)"""
+    path = Path(path)
+    candidates = [
+        encoding for encoding in ENCODING_SUFFIXES
+        if path.with_name(path.name + ENCODING_SUFFIXES[encoding]).exists()
+    ]
+    encoding = choose_encoding(header, candidates)
+    if encoding == 'identity':
+        return encoding, path
+    return encoding, path.with_name(path.name + ENCODING_SUFFIXES[encoding])
@@ -0,0 +1,354 @@
+"""
+Events - 仓库变更日志与 SSE 事件分发
+
+上传、删除等写路径通过 ChangeJournal 记录变更并递增仓库序列号；
+每个进程只有一个 EventBroker 监听变更日志，计算一次统计信息后
+分发给所有订阅者（仪表板的 /events 连接）。没有订阅者时不运行任何线程。
+"""
+
+import os
+import json
+import time
+import queue
+import fcntl
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # pragma: no cover - watchdog 为可选加速
+    Observer = None
+    FileSystemEventHandler = object
+
+logger = logging.getLogger(__name__)
+
+# 变更日志超过该大小时轮转
+JOURNAL_MAX_BYTES = 1024 * 1024
+
+
+def get_state_dir(packages_dir) -> Path:
+    """仓库状态目录（隐藏目录，不会被当作包扫描）"""
+    state_dir = Path(packages_dir) / '.repo'
+    state_dir.mkdir(parents=True, exist_ok=True)
+    return state_dir
+
+
+class ChangeJournal:
+    """仓库变更日志
+
+    serial 文件保存单调递增的仓库序列号，events.log 每行记录一个变更事件。
+    写入时使用 flock 保证多个 gunicorn 进程和命令行工具之间的顺序一致。
+    """
+    
+    def __init__(self, packages_dir):
+        self.state_dir = get_state_dir(packages_dir)
+        self.serial_path = self.state_dir / 'serial'
+        self.path = self.state_dir / 'events.log'
+        self.lock_path = self.state_dir / 'events.lock'
+    
+    def record(self, action: str, package_name: Optional[str],
+               delta: Optional[Dict[str, int]] = None) -> int:
+        """记录一次变更，返回新的仓库序列号"""
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                serial = self.current_serial() + 1
+                
+                event = {
+                    'serial': serial,
+                    'action': action,
+                    'package': package_name,
+                    'timestamp': time.time(),
+                }
+                if delta:
+                    event['delta'] = delta
+                
+                # 轮转过大的日志，读取方发现文件变小后会从头读取
+                if self.path.exists() and self.path.stat().st_size > JOURNAL_MAX_BYTES:
+                    os.replace(self.path, self.path.with_suffix('.log.1'))
+                
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(event, ensure_ascii=False) + '\n')
+                
+                tmp_path = self.serial_path.with_suffix('.tmp')
+                tmp_path.write_text(str(serial))
+                os.replace(tmp_path, self.serial_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        
+        return serial
+    
+    def current_serial(self) -> int:
+        """当前仓库序列号，没有任何变更时为0"""
+        try:
+            return int(self.serial_path.read_text().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+    
+    def changed_since(self, serial: int) -> Optional[List[str]]:
+        """serial 之后有变更的包名
+
+        日志轮转后已经没有所需的全部事件，或其中有不针对单个包的变更时返回None，调用方应全量同步。
+        """
+        current = self.current_serial()
+        if serial >= current:
+            return []
+        
+        events = []
+        for path in (self.path.with_suffix('.log.1'), self.path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            event = json.loads(line)
+                        except ValueError:
+                            continue
+                        if event.get('serial', 0) > serial:
+                            events.append(event)
+            except FileNotFoundError:
+                continue
+        
+        # 序列号逐个递增，读取期间发生轮转等原因导致的缺口都视为历史不完整
+        serials = [event['serial'] for event in events]
+        if serials[:current - serial] != list(range(serial + 1, current + 1)):
+            return None
+        if any(not event.get('package') for event in events):
+            return None
+        return sorted({event['package'] for event in events})
+    
+    def size(self) -> int:
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+    
+    def read_from(self, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+        """读取 offset 之后的事件，返回 (事件列表, 新的offset)"""
+        size = self.size()
+        if size < offset:
+            # 日志已轮转
+            offset = 0
+        if size == offset:
+            return [], offset
+        
+        events = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith('\n'):
+                    # 写入尚未完成的行留到下次读取
+                    break
+                offset += len(line.encode('utf-8'))
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+        
+        return events, offset
+
+
+class _WakeHandler(FileSystemEventHandler):
+    """watchdog 回调：状态目录有变化时唤醒分发线程"""
+    
+    def __init__(self, wake_event: threading.Event):
+        self.wake_event = wake_event
+    
+    def on_any_event(self, event):
+        self.wake_event.set()
+
+
+class Subscription:
+    """单个 SSE 连接的事件队列"""
+    
+    def __init__(self, max_pending: int = 100):
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.closed = False
+    
+    def put(self, event_type: str, data: Dict[str, Any], event_id: Optional[int] = None) -> bool:
+        try:
+            self.queue.put_nowait((event_type, data, event_id))
+            return True
+        except queue.Full:
+            # 消费太慢的连接直接断开，由浏览器重连
+            self.closed = True
+            return False
+    
+    def get(self, timeout: float):
+        """等待下一个事件，超时返回None"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBroker:
+    """进程内唯一的事件分发源
+
+    订阅者存在时启动一个后台线程：优先由 watchdog 通知变更，
+    否则按 poll_interval 检查变更日志大小。每批变更只计算一次统计信息。
+    """
+    
+    def __init__(self, packages_dir, poll_interval: float = 1.0):
+        self.packages_dir = Path(packages_dir)
+        self.journal = ChangeJournal(packages_dir)
+        self.poll_interval = poll_interval
+        
+        self._lock = threading.Lock()
+        self._subscribers: List[Subscription] = []
+        self._thread = None
+        self._wake = threading.Event()
+        self._offset = self.journal.size()
+        self._stats = None
+        self._serial = self.journal.current_serial()
+    
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+    
+    def subscribe(self) -> Subscription:
+        """注册订阅者，并立即推送当前统计信息"""
+        subscription = Subscription()
+        
+        with self._lock:
+            if self._thread is None:
+                # 没有分发线程期间的变更不再补发，以当前状态为准
+                self._offset = self.journal.size()
+                self._serial = self.journal.current_serial()
+                self._stats = None
+        
+        subscription.put('stats', self.latest_stats(), self._serial)
+        
+        with self._lock:
+            self._subscribers.append(subscription)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='event-broker', daemon=True)
+                self._thread.start()
+        
+        return subscription
+    
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+    
+    def notify(self):
+        """同进程内的写操作完成后立即唤醒分发线程"""
+        self._wake.set()
+    
+    def latest_stats(self) -> Dict[str, Any]:
+        """最近一次计算的统计信息，只在有变更时重新计算"""
+        if self._stats is None:
+            self._stats = self._compute_stats()
+        return self._stats
+    
+    def _compute_stats(self) -> Dict[str, Any]:
+        from models.repository import RepositoryManager
+        stats = RepositoryManager(str(self.packages_dir)).get_stats()
+        stats['serial'] = self.journal.current_serial()
+        return stats
+    
+    def _apply_deltas(self, stats: Dict[str, Any], events: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """按事件携带的增量更新统计信息，避免全量扫描"""
+        stats = dict(stats)
+        for event in events:
+            for key, value in event['delta'].items():
+                stats[key] = stats.get(key, 0) + value
+        stats['total_size_mb'] = round(stats.get('total_size', 0) / (1024 * 1024), 2)
+        stats['serial'] = events[-1]['serial']
+        return stats
+    
+    def _broadcast(self, event_type: str, data: Dict[str, Any], event_id: Optional[int]):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        
+        for subscription in subscribers:
+            if not subscription.put(event_type, data, event_id):
+                self.unsubscribe(subscription)
+    
+    def _start_observer(self):
+        if Observer is None:
+            return None
+        try:
+            observer = Observer()
+            observer.schedule(_WakeHandler(self._wake), str(self.journal.state_dir), recursive=False)
+            observer.daemon = True
+            observer.start()
+            return observer
+        except Exception as e:
+            logger.warning(f"File watcher unavailable, falling back to polling: {e}")
+            return None
+    
+    def _run(self):
+        observer = self._start_observer()
+        # 有文件通知时轮询只作为兜底
+        interval = self.poll_interval * 5 if observer else self.poll_interval
+        
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+                
+                self._wake.wait(interval)
+                self._wake.clear()
+                
+                events, self._offset = self.journal.read_from(self._offset)
+                if not events:
+                    continue
+                
+                for event in events:
+                    self._broadcast('package', event, event['serial'])
+                
+                self._serial = events[-1]['serial']
+                if self._stats is not None and all('delta' in event for event in events):
+                    self._stats = self._apply_deltas(self._stats, events)
+                else:
+                    self._stats = self._compute_stats()
+                self._broadcast('stats', self._stats, self._serial)
+        except Exception as e:
+            logger.error(f"Event broker stopped: {e}")
+            with self._lock:
+                self._thread = None
+        finally:
+            if observer is not None:
+                observer.stop()
+
+
+_brokers: Dict[str, EventBroker] = {}
+_brokers_lock = threading.Lock()
+
+
+def get_broker(packages_dir) -> EventBroker:
+    """获取进程内共享的事件分发源"""
+    key = str(Path(packages_dir).resolve())
+    with _brokers_lock:
+        if key not in _brokers:
+            _brokers[key] = EventBroker(packages_dir)
+        return _brokers[key]
+
+
+def record_change(packages_dir, action: str, package_name: Optional[str],
+                  delta: Optional[Dict[str, int]] = None) -> int:
+    """记录仓库变更并唤醒本进程的分发线程，返回新的仓库序列号"""
+    serial = ChangeJournal(packages_dir).record(action, package_name, delta)
+    
+    key = str(Path(packages_dir).resolve())
+    broker = _brokers.get(key)
+    if broker is not None:
+        broker.notify()
+    
+    return serial
+
+
+def format_sse(event_type: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    """格式化一条 Server-Sent Events 消息"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,202 @@
+"""
+Hot Cache - 小文件的进程内字节缓存
+
+下载请求集中在少数小文件上（内部 SDK wheel、小 sdist 等），这些文件的内容保存在
+每个工作进程的内存中，命中时不需要打开、读取文件，也不需要扫描包目录。
+
+- 只缓存不超过 max_object_size 的文件，总字节数不超过 max_bytes，按 LRU 淘汰
+- 文件在第二次未命中时才放入缓存，只被下载一次的文件不会挤掉热点文件
+- 工作进程回收时热点文件列表留给替代进程，替代进程在接受请求前直接读入（prewarm）
+- 缓存项记录文件的 generation（本地文件为 (inode, mtime_ns, size)）；距上次确认超过
+  revalidate_interval 秒时通过存储后端 stat 一次确认文件没有变化。本进程内的包变更由 RepositoryManager.invalidate()
+  直接失效，其他进程中的变更最多延迟 revalidate_interval 秒生效
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 记录最近未命中的文件数量上限（用于第二次未命中时准入）
+MAX_TRACKED_MISSES = 4096
+
+
+class HotObject:
+    """缓存中的一个文件"""
+    
+    __slots__ = ('data', 'generation', 'mtime', 'checked_at', 'hits')
+    
+    def __init__(self, data: bytes, generation: tuple, mtime: float):
+        self.data = data
+        self.generation = generation
+        self.mtime = mtime
+        self.checked_at = time.monotonic()
+        self.hits = 0
+
+
+class HotObjectCache:
+    """按总字节数限制的 LRU 字节缓存（线程安全）"""
+    
+    def __init__(self, max_bytes: int, max_object_size: int, revalidate_interval: float = 1.0):
+        self.max_bytes = max_bytes
+        self.max_object_size = max_object_size
+        self.revalidate_interval = revalidate_interval
+        
+        self._objects: 'OrderedDict[Tuple[str, str], HotObject]' = OrderedDict()
+        self._misses: 'OrderedDict[Tuple[str, str], None]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'admissions': 0, 'evictions': 0, 'invalidations': 0}
+    
+    def get(self, storage, package_name: str, filename: str) -> Optional[HotObject]:
+        """查找缓存，未命中或文件已变化时返回None"""
+        key = (package_name, filename)
+        with self._lock:
+            obj = self._objects.get(key)
+            if obj is not None:
+                self._objects.move_to_end(key)
+        
+        if obj is not None and time.monotonic() - obj.checked_at > self.revalidate_interval:
+            info = storage.stat(package_name, filename)
+            current = info.generation if info is not None else None
+            if current != obj.generation:
+                self._discard(key, obj)
+                obj = None
+            else:
+                obj.checked_at = time.monotonic()
+        
+        with self._lock:
+            if obj is None:
+                self._counters['misses'] += 1
+                return None
+            self._counters['hits'] += 1
+            obj.hits += 1
+            return obj
+    
+    def admit(self, storage, package_name: str, filename: str) -> Optional[HotObject]:
+        """未命中后调用：第二次未命中的小文件读入缓存，返回缓存项（未放入时返回None）"""
+        key = (package_name, filename)
+        with self._lock:
+            if key not in self._misses:
+                self._misses[key] = None
+                if len(self._misses) > MAX_TRACKED_MISSES:
+                    self._misses.popitem(last=False)
+                return None
+        return self._load(storage, key)
+    
+    def prewarm(self, storage, keys: List[List[str]]) -> int:
+        """直接读入给定的文件（不经过第二次未命中的准入），返回读入的文件数"""
+        loaded = 0
+        for package_name, filename in keys:
+            if self.contains(package_name, filename):
+                continue
+            if self._load(storage, (package_name, filename)) is not None:
+                loaded += 1
+        return loaded
+    
+    def _load(self, storage, key: Tuple[str, str]) -> Optional[HotObject]:
+        package_name, filename = key
+        info = storage.stat(package_name, filename)
+        if info is None or info.size > self.max_object_size or info.size > self.max_bytes:
+            return None
+        try:
+            with storage.open(package_name, filename) as f:
+                data = f.read()
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+        if len(data) != info.size:
+            return None
+        
+        obj = HotObject(data, info.generation, info.mtime)
+        with self._lock:
+            self._misses.pop(key, None)
+            previous = self._objects.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous.data)
+            self._objects[key] = obj
+            self._bytes += len(data)
+            self._counters['admissions'] += 1
+            while self._bytes > self.max_bytes:
+                _, evicted = self._objects.popitem(last=False)
+                self._bytes -= len(evicted.data)
+                self._counters['evictions'] += 1
+        return obj
+    
+    def contains(self, package_name: str, filename: str) -> bool:
+        return (package_name, filename) in self._objects
+    
+    def _discard(self, key: Tuple[str, str], obj: HotObject) -> None:
+        with self._lock:
+            if self._objects.get(key) is obj:
+                del self._objects[key]
+                self._bytes -= len(obj.data)
+                self._counters['invalidations'] += 1
+    
+    def invalidate(self, package_name: Optional[str] = None) -> None:
+        """失效一个包（或全部）的缓存项"""
+        with self._lock:
+            for key in [k for k in self._objects if package_name is None or k[0] == package_name]:
+                self._bytes -= len(self._objects.pop(key).data)
+                self._counters['invalidations'] += 1
+    
+    def hot_keys(self, limit: int = 64) -> List[List[str]]:
+        """命中次数最多的文件（[包名, 文件名]）"""
+        with self._lock:
+            hottest = sorted(self._objects.items(), key=lambda item: item[1].hits, reverse=True)[:limit]
+        return [list(key) for key, obj in hottest if obj.hits]
+    
+    def stats(self) -> Dict[str, Any]:
+        """命中率等指标（当前进程）"""
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            hottest = sorted(self._objects.items(), key=lambda item: item[1].hits, reverse=True)[:10]
+            return {
+                **self._counters,
+                'hit_rate': round(self._counters['hits'] / lookups, 4) if lookups else 0.0,
+                'objects': len(self._objects),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hottest': [
+                    {'package': key[0], 'filename': key[1], 'hits': obj.hits, 'size': len(obj.data)}
+                    for key, obj in hottest
+                ],
+            }
+
+
+_cache: Optional[HotObjectCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_hot_cache(max_bytes: int = 64 * 1024 * 1024, max_object_size: int = 1024 * 1024,
+                  revalidate_interval: float = 1.0) -> HotObjectCache:
+    """获取进程内共享的缓存，参数只在首次创建时生效"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = HotObjectCache(max_bytes, max_object_size, revalidate_interval)
+        return _cache
+
+
+def get_configured_hot_cache(config: Dict) -> HotObjectCache:
+    """按应用配置获取进程内共享的缓存（所有使用方都应通过这里获取，保证首次创建时读取配置）"""
+    return get_hot_cache(
+        max_bytes=config.get('HOT_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+        max_object_size=config.get('HOT_CACHE_MAX_OBJECT_SIZE', 1024 * 1024),
+        revalidate_interval=config.get('HOT_CACHE_REVALIDATE_INTERVAL', 1.0)
+    )
+
+
+def invalidate_hot_objects(package_name: Optional[str] = None) -> None:
+    """包内容变化时失效缓存（缓存尚未创建时不做任何事）"""
+    if _cache is not None:
+        _cache.invalidate(package_name)
+
+
+def hot_object_keys(limit: int = 64) -> List[List[str]]:
+    """当前进程的热点文件（缓存尚未创建时为空）"""
+    if _cache is None:
+        return []
+    return _cache.hot_keys(limit)
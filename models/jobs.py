@@ -0,0 +1,329 @@
+"""
+Jobs - 上传后处理任务队列
+
+上传请求只负责把文件完整写入暂存目录（<packages_dir>/.incoming/）并登记任务，
+校验、哈希、入库和索引页生成都由进程内线程池在后台完成。
+任务状态以 JSON 文件保存在 .repo/jobs/ 中，服务重启后未完成的任务会重新执行；
+处理中的任务持有文件锁，多个 gunicorn 进程不会重复执行同一个任务。
+"""
+
+import os
+import json
+import time
+import uuid
+import fcntl
+import shutil
+import logging
+import tarfile
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from models.compression import atomic_write
+from models.events import get_state_dir
+from models.locks import package_lock
+from models.versions import normalize_name
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# 已完成任务的状态文件保留时间
+FINISHED_JOB_TTL = 24 * 3600
+
+
+class JobError(Exception):
+    """任务步骤失败（不可重试）"""
+    pass
+
+
+def get_incoming_dir(packages_dir) -> Path:
+    """上传暂存目录（隐藏目录，不会出现在索引中）"""
+    incoming_dir = Path(packages_dir) / '.incoming'
+    incoming_dir.mkdir(parents=True, exist_ok=True)
+    return incoming_dir
+
+
+def stage_upload(packages_dir, filename: str, stream) -> Path:
+    """把上传内容写入暂存目录并落盘（fsync），返回暂存文件路径"""
+    staging_dir = get_incoming_dir(packages_dir) / uuid.uuid4().hex
+    staging_dir.mkdir()
+    staged_path = staging_dir / filename
+    
+    with open(staged_path, 'wb') as f:
+        shutil.copyfileobj(stream, f, 1024 * 1024)
+        f.flush()
+        os.fsync(f.fileno())
+    
+    return staged_path
+
+
+def validate_archive(path: Path, fileobj=None) -> None:
+    """检查 wheel / sdist 是否是完整可读的归档
+
+    fileobj 为已打开的文件对象时从中读取（例如限速读取），path 只用于判断类型。
+    """
+    name = path.name
+    try:
+        if name.endswith('.whl') or name.endswith('.zip'):
+            with zipfile.ZipFile(fileobj or path) as archive:
+                bad_member = archive.testzip()
+                if bad_member is not None:
+                    raise JobError(f"Corrupted archive member: {bad_member}")
+        elif name.endswith('.tar.gz'):
+            with tarfile.open(path, 'r:gz', fileobj=fileobj) as archive:
+                for _ in archive:
+                    pass
+        else:
+            raise JobError(f"Unsupported file type: {name}")
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError) as e:
+        raise JobError(f"Invalid archive {name}: {e}")
+
+
+def process_upload(job: Dict[str, Any], step: Callable) -> Dict[str, Any]:
+    """上传后处理：校验 → 哈希 → 入库 → 生成索引页
+
+    文件只有在校验和哈希都完成后才移动到包目录，因此在此之前不会出现在 /simple/ 中。
+    """
+    from models.catalog import build_record
+    from models.repository import RepositoryManager
+    
+    params = job['params']
+    repo_manager = RepositoryManager(params['packages_dir'])
+    staged_path = Path(params['staged_path'])
+    # 已有包沿用现有目录，新包使用 PEP 503 规范化名称
+    package_name = (repo_manager.resolve_package_name(params['package_name'])
+                    or normalize_name(params['package_name']))
+    
+    if not staged_path.exists():
+        raise JobError(f"Staged file is missing: {staged_path}")
+    
+    with step('validate'):
+        try:
+            validate_archive(staged_path)
+        except JobError:
+            # 校验失败的文件不会入库，直接清理暂存目录
+            shutil.rmtree(staged_path.parent, ignore_errors=True)
+            raise
+    
+    with step('hash'):
+        # 分块上传在接收时已经增量计算过 sha256 的，不再重复读取文件
+        record = build_record(staged_path, params.get('sha256'))
+        expected = params.get('expected_sha256')
+        if expected and record['sha256'] != expected:
+            shutil.rmtree(staged_path.parent, ignore_errors=True)
+            raise JobError(f"sha256 mismatch: expected {expected}, got {record['sha256']}")
+    
+    with step('publish'):
+        # 包的写锁只覆盖发布和记录更新，同一个包的并发上传按顺序发布，其他包不受影响
+        with package_lock(repo_manager.packages_dir, package_name, exclusive=True):
+            # 重试上传的相同文件不再覆盖，也不触发缓存失效
+            unchanged = any(entry['filename'] == staged_path.name
+                            for entry in repo_manager.catalog.find_by_hash(record['sha256'], package_name))
+            if not unchanged:
+                # 本地存储为原子移动，对象存储为分块上传；大小和修改时间以发布后的文件为准
+                info = repo_manager.storage.publish(package_name, staged_path)
+                record.update(size=info.size, mtime_ns=info.mtime_ns, upload_time=info.mtime)
+                repo_manager.catalog.put_file(package_name, record)
+        shutil.rmtree(staged_path.parent, ignore_errors=True)
+    
+    result = {'package': package_name, 'filename': staged_path.name, 'sha256': record['sha256']}
+    if unchanged:
+        logger.info(f"Skipped identical upload: {package_name}/{staged_path.name}")
+        return {**result, 'skipped': True}
+    
+    with step('index'):
+        repo_manager.invalidate(package_name, action=params.get('action', 'uploaded'))
+        # 预先生成页面和压缩变体，第一个请求不需要等待
+        repo_manager.page_cache.get_project_page(repo_manager, package_name, 'html')
+        repo_manager.page_cache.get_root_page(repo_manager, 'html')
+        repo_manager.pypi_json.get_project_doc(repo_manager, package_name)
+    
+    return result
+
+
+JOB_HANDLERS: Dict[str, Callable] = {
+    'process_upload': process_upload,
+}
+
+
+class _StepTimer:
+    """记录任务中单个步骤的耗时"""
+    
+    def __init__(self, queue, job: Dict[str, Any], name: str):
+        self.queue = queue
+        self.job = job
+        self.name = name
+    
+    def __enter__(self):
+        self.start = time.time()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.job['steps'][self.name] = round(time.time() - self.start, 4)
+        self.queue._save(self.job)
+        return False
+
+
+class JobQueue:
+    """持久化的进程内任务队列"""
+    
+    def __init__(self, packages_dir, max_workers: int = 2):
+        self.packages_dir = Path(packages_dir)
+        self.jobs_dir = get_state_dir(packages_dir) / 'jobs'
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+    
+    def _job_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+    
+    def _save(self, job: Dict[str, Any]) -> None:
+        atomic_write(self._job_path(job['id']), json.dumps(job, ensure_ascii=False).encode('utf-8'))
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._job_path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        jobs = []
+        for path in self.jobs_dir.glob('*.json'):
+            job = self.get(path.stem)
+            if job is not None:
+                jobs.append(job)
+        return sorted(jobs, key=lambda job: job['created_at'], reverse=True)
+    
+    def create(self, job_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """登记任务（持久化），但不执行"""
+        if job_type not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job type: {job_type}")
+        
+        job = {
+            'id': uuid.uuid4().hex,
+            'type': job_type,
+            'status': QUEUED,
+            'params': params,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'steps': {},
+            'result': None,
+            'error': None,
+        }
+        self._save(job)
+        return job
+    
+    def submit(self, job_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """登记任务并交给后台线程池执行"""
+        job = self.create(job_type, params)
+        self._get_executor().submit(self.run, job['id'])
+        return job
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='job')
+            return self._executor
+    
+    def run(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """执行任务（可以在后台线程中，也可以同步调用），被其他进程占用时跳过"""
+        lock_path = self.jobs_dir / f"{job_id}.lock"
+        with open(lock_path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            
+            try:
+                job = self.get(job_id)
+                if job is None or job['status'] in (DONE, FAILED):
+                    return job
+                return self._execute(job)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                try:
+                    lock_path.unlink()
+                except FileNotFoundError:
+                    pass
+    
+    def _execute(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        job['status'] = RUNNING
+        job['started_at'] = time.time()
+        self._save(job)
+        
+        try:
+            job['result'] = JOB_HANDLERS[job['type']](job, lambda name: _StepTimer(self, job, name))
+            job['status'] = DONE
+        except Exception as e:
+            logger.error(f"Job {job['id']} ({job['type']}) failed: {e}")
+            job['status'] = FAILED
+            job['error'] = str(e)
+        finally:
+            job['finished_at'] = time.time()
+            self._save(job)
+        
+        return job
+    
+    def recover(self) -> int:
+        """重新提交重启前未完成的任务，返回提交数量"""
+        count = 0
+        for job in self.list_jobs():
+            if job['status'] in (QUEUED, RUNNING):
+                self._get_executor().submit(self.run, job['id'])
+                count += 1
+        if count:
+            logger.info(f"Recovered {count} unfinished jobs")
+        return count
+    
+    def cleanup(self, ttl: float = FINISHED_JOB_TTL) -> int:
+        """删除过期的已完成任务状态"""
+        cutoff = time.time() - ttl
+        removed = 0
+        for job in self.list_jobs():
+            if job['status'] in (DONE, FAILED) and (job['finished_at'] or 0) < cutoff:
+                try:
+                    self._job_path(job['id']).unlink()
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+    
+    def summary(self) -> Dict[str, Any]:
+        """队列深度和最近任务"""
+        jobs = self.list_jobs()
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for job in jobs:
+            counts[job['status']] = counts.get(job['status'], 0) + 1
+        
+        return {
+            'queue_depth': counts[QUEUED] + counts[RUNNING],
+            'counts': counts,
+            'jobs': jobs[:100],
+        }
+
+
+_queues: Dict[str, JobQueue] = {}
+_queues_lock = threading.Lock()
+
+
+def get_job_queue(packages_dir, max_workers: int = 2) -> JobQueue:
+    """获取进程内共享的任务队列，首次创建时恢复未完成的任务"""
+    key = str(Path(packages_dir).resolve())
+    with _queues_lock:
+        if key not in _queues:
+            queue = JobQueue(packages_dir, max_workers=max_workers)
+            queue.cleanup()
+            queue.recover()
+            _queues[key] = queue
+        return _queues[key]
@@ -0,0 +1,98 @@
+"""
+Locks - 包级读写锁与回收站
+
+每个包一个锁文件（<packages_dir>/.repo/locks/<规范化包名>.lock），通过 flock 在
+所有 gunicorn 进程、后台线程和命令行工具之间协调：
+- 共享锁（读）：下载、生成索引页，多个读者可以同时持有
+- 排他锁（写）：发布文件、删除文件或整个包
+
+不同包的锁互不影响，上传一个包不会阻塞其他包的下载。每次加锁都打开新的文件描述符，
+因此同一进程内的多个线程之间同样互斥。
+
+删除整个包时先把目录原子地移动到回收站（<packages_dir>/.trash/），
+排他锁只需持有一次 rename 的时间，目录内容由后台线程清除。
+已经打开的文件描述符在移动后依然有效，正在进行的下载不受影响。
+"""
+
+import os
+import time
+import uuid
+import fcntl
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from models.events import get_state_dir
+from models.versions import normalize_name
+
+logger = logging.getLogger(__name__)
+
+TRASH_DIR = '.trash'
+
+
+def _lock_path(packages_dir, package_name: str) -> Path:
+    lock_dir = get_state_dir(packages_dir) / 'locks'
+    lock_dir.mkdir(exist_ok=True)
+    # 按规范化名称加锁，Foo_Bar 和 foo-bar 共用一把锁
+    return lock_dir / f"{normalize_name(package_name)}.lock"
+
+
+@contextmanager
+def package_lock(packages_dir, package_name: str, exclusive: bool = False):
+    """包级读写锁（跨进程）"""
+    with open(_lock_path(packages_dir, package_name), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def get_trash_dir(packages_dir) -> Path:
+    """回收站目录（隐藏目录，与包目录在同一文件系统，rename 是原子的）"""
+    trash_dir = Path(packages_dir) / TRASH_DIR
+    trash_dir.mkdir(exist_ok=True)
+    return trash_dir
+
+
+def move_to_trash(packages_dir, path: Path) -> Path:
+    """把目录移动到回收站并在后台清除，返回回收站中的路径"""
+    target = get_trash_dir(packages_dir) / f"{path.name}-{uuid.uuid4().hex[:12]}"
+    os.rename(path, target)
+    # 以移入回收站的时间作为修改时间，purge_trash() 据此判断遗留目录
+    os.utime(target)
+    # 非守护线程：命令行工具退出前会等待清除完成
+    threading.Thread(target=_purge, args=(target,), name='trash-purge').start()
+    return target
+
+
+def _purge(path: Path) -> None:
+    try:
+        shutil.rmtree(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.error(f"Failed to purge {path}: {e}")
+
+
+def purge_trash(packages_dir, min_age: float = 0) -> int:
+    """清除回收站中遗留的目录（例如进程在后台清除完成前退出），返回清除数量"""
+    trash_dir = Path(packages_dir) / TRASH_DIR
+    if not trash_dir.exists():
+        return 0
+    
+    cutoff = time.time() - min_age
+    purged = 0
+    for entry in trash_dir.iterdir():
+        try:
+            if entry.stat().st_mtime > cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        _purge(entry)
+        purged += 1
+    if purged:
+        logger.info(f"Purged {purged} entries from trash")
+    return purged
@@ -0,0 +1,101 @@
+"""
+Metadata - 从分发文件中读取核心元数据
+
+wheel 读取 <name>.dist-info/METADATA，sdist 读取顶层目录下的 PKG-INFO。
+tar.gz 以流的方式逐个读取成员，找到 PKG-INFO 后立即停止，不解压整个归档。
+"""
+
+import tarfile
+import zipfile
+import logging
+from email.parser import HeaderParser
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 元数据文件大小上限，防止异常归档占用过多内存
+MAX_METADATA_SIZE = 4 * 1024 * 1024
+
+
+def _is_top_level_pkg_info(member_name: str) -> bool:
+    """sdist 的 PKG-INFO 位于 <name>-<version>/PKG-INFO"""
+    parts = member_name.strip('/').split('/')
+    return len(parts) == 2 and parts[1] == 'PKG-INFO'
+
+
+def _read_wheel_metadata(path: Path) -> Optional[bytes]:
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            parts = info.filename.split('/')
+            if (len(parts) == 2 and parts[0].endswith('.dist-info') and parts[1] == 'METADATA'
+                    and info.file_size <= MAX_METADATA_SIZE):
+                return archive.read(info)
+    return None
+
+
+def _read_zip_sdist_metadata(path: Path) -> Optional[bytes]:
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if _is_top_level_pkg_info(info.filename) and info.file_size <= MAX_METADATA_SIZE:
+                return archive.read(info)
+    return None
+
+
+def _read_tar_sdist_metadata(path: Path) -> Optional[bytes]:
+    # 'r|gz' 为流模式：只能顺序读取，不会预先建立成员列表
+    with tarfile.open(path, 'r|gz') as archive:
+        for member in archive:
+            if member.isfile() and _is_top_level_pkg_info(member.name) and member.size <= MAX_METADATA_SIZE:
+                f = archive.extractfile(member)
+                return f.read() if f is not None else None
+    return None
+
+
+def read_metadata(path: Path) -> Optional[bytes]:
+    """读取分发文件中的元数据原文，找不到或归档损坏时返回None"""
+    path = Path(path)
+    name = path.name
+    try:
+        if name.endswith('.whl'):
+            return _read_wheel_metadata(path)
+        if name.endswith('.zip'):
+            return _read_zip_sdist_metadata(path)
+        if name.endswith('.tar.gz'):
+            return _read_tar_sdist_metadata(path)
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError) as e:
+        logger.warning(f"Failed to read metadata from {name}: {e}")
+    return None
+
+
+def _parse_headers(metadata: bytes):
+    return HeaderParser().parsestr(metadata.decode('utf-8', errors='replace'))
+
+
+def parse_requires_python(metadata: bytes) -> Optional[str]:
+    """从元数据中取出 Requires-Python，未声明时返回None"""
+    value = _parse_headers(metadata).get('Requires-Python')
+    if value is None:
+        return None
+    value = ' '.join(value.split())
+    return value or None
+
+
+def parse_requires_dist(metadata: bytes) -> List[str]:
+    """从元数据中取出 Requires-Dist（PEP 508 依赖声明）列表"""
+    return [' '.join(value.split()) for value in _parse_headers(metadata).get_all('Requires-Dist') or []]
+
+
+def read_core_metadata(path) -> Dict[str, Any]:
+    """读取分发文件中写入包文件记录的元数据字段
+
+    作为进程池任务使用（回填命令），因此是模块级函数且只接收可序列化参数。
+    sdist 的 PKG-INFO（Metadata-Version 2.2 之前）中的依赖声明可能不完整，解析依赖时优先使用 wheel。
+    """
+    metadata = read_metadata(Path(path))
+    if metadata is None:
+        return {'requires_python': None, 'requires_dist': []}
+    return {
+        'requires_python': parse_requires_python(metadata),
+        'requires_dist': parse_requires_dist(metadata),
+    }
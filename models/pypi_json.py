@@ -0,0 +1,150 @@
+"""
+PyPI JSON - 预计算的 /pypi/<name>/json 与 /pypi/<name>/<version>/json 文档
+
+文档由包文件记录（catalog）生成，在上传后处理任务中预先写出，
+之后的请求直接读取缓存文件（含预压缩变体），不需要扫描目录或 stat 每个文件。
+包内容变化时由 RepositoryManager.invalidate() 删除旧文档。
+"""
+
+import json
+import shutil
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from models.compression import write_with_variants
+from models.events import ChangeJournal, get_state_dir
+from models.locks import package_lock
+from models.versions import file_sort_key, latest_version, version_key
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DOC = 'project.json'
+
+# 单个版本的文档位于子目录中，版本号不会与项目文档的文件名冲突
+VERSION_DOCS_DIR = 'versions'
+
+
+def _iso_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def group_releases(records: Dict[str, Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """按版本分组文件记录，无法解析版本号的文件被忽略"""
+    releases: Dict[str, List[Dict[str, Any]]] = {}
+    for filename in sorted(records, key=lambda name: file_sort_key(name, records[name])):
+        version = records[filename].get('version')
+        if version is None:
+            continue
+        releases.setdefault(version, []).append(records[filename])
+    return releases
+
+
+class PyPIJsonStore:
+    """JSON API 文档缓存
+
+    文档位于 <packages_dir>/.repo/pypi/<package>/project.json 和 <version>.json。
+    下载链接使用 base_url（未配置时为以 / 开头的站内路径），因此文档与请求无关。
+    """
+    
+    def __init__(self, packages_dir, base_url: str = ''):
+        self.packages_dir = Path(packages_dir)
+        self.docs_dir = get_state_dir(packages_dir) / 'pypi'
+        self.base_url = base_url.rstrip('/')
+    
+    def _file_entry(self, package_name: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        tags = record.get('tags')
+        return {
+            'filename': record['filename'],
+            'url': f"{self.base_url}/{package_name}/{record['filename']}",
+            'digests': {'sha256': record.get('sha256')},
+            'size': record.get('size'),
+            'packagetype': record.get('packagetype'),
+            'python_version': tags['python'] if tags else 'source',
+            'requires_python': record.get('requires_python'),
+            'upload_time_iso_8601': _iso_time(record.get('upload_time', 0)) + 'Z',
+            'yanked': record.get('yanked') is not None,
+            'yanked_reason': record.get('yanked') or None,
+        }
+    
+    def _info(self, package_name: str, version: str, files: List[Dict[str, Any]]) -> Dict[str, Any]:
+        requires_python = next((f['requires_python'] for f in files if f.get('requires_python')), None)
+        return {
+            'name': package_name,
+            'version': version,
+            'requires_python': requires_python,
+            'package_url': f"{self.base_url}/{package_name}/",
+            'release_url': f"{self.base_url}/{package_name}/{version}/",
+            'project_url': f"{self.base_url}/{package_name}/",
+            'yanked': bool(files) and all(f['yanked'] for f in files),
+        }
+    
+    def build(self, package_name: str, records: Dict[str, Dict[str, Any]]) -> Optional[Path]:
+        """由文件记录生成项目文档，包中没有可识别的版本时返回None"""
+        releases = group_releases(records)
+        version = latest_version(list(releases))
+        if version is None:
+            return None
+        
+        serial = ChangeJournal(self.packages_dir).current_serial()
+        release_entries = {
+            v: [self._file_entry(package_name, r) for r in releases[v]]
+            for v in sorted(releases, key=version_key)
+        }
+        doc = {
+            'info': self._info(package_name, version, release_entries[version]),
+            'last_serial': serial,
+            'releases': release_entries,
+            'urls': release_entries[version],
+            'vulnerabilities': [],
+        }
+        
+        path = self.docs_dir / package_name / PROJECT_DOC
+        write_with_variants(path, json.dumps(doc, ensure_ascii=False).encode('utf-8'))
+        logger.info(f"Built JSON API document for {package_name} ({len(releases)} versions)")
+        return path
+    
+    def get_project_doc(self, repo_manager, package_name: str) -> Optional[Path]:
+        """返回项目文档路径，缺失时从记录生成"""
+        if package_name.startswith('.'):
+            return None
+        
+        path = self.docs_dir / package_name / PROJECT_DOC
+        if path.exists():
+            return path
+        
+        with package_lock(self.packages_dir, package_name):
+            files = repo_manager.list_package_dir(package_name)
+            if not files:
+                return None
+            return self.build(package_name, repo_manager.catalog.ensure_records(package_name, files))
+    
+    def get_version_doc(self, repo_manager, package_name: str, version: str) -> Optional[Path]:
+        """返回单个版本的文档路径，首次请求时由项目文档切分生成"""
+        project_path = self.get_project_doc(repo_manager, package_name)
+        if project_path is None or '/' in version or version.startswith('.'):
+            return None
+        
+        path = self.docs_dir / package_name / VERSION_DOCS_DIR / f"{version}.json"
+        if path.exists():
+            return path
+        
+        with open(project_path, 'r', encoding='utf-8') as f:
+            project = json.load(f)
+        
+        files = project['releases'].get(version)
+        if files is None:
+            return None
+        
+        doc = {
+            'info': self._info(package_name, version, files),
+            'last_serial': project['last_serial'],
+            'urls': files,
+            'vulnerabilities': [],
+        }
+        write_with_variants(path, json.dumps(doc, ensure_ascii=False).encode('utf-8'))
+        return path
+    
+    def invalidate(self, package_name: str) -> None:
+        shutil.rmtree(self.docs_dir / package_name, ignore_errors=True)
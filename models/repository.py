@@ -4,12 +4,29 @@ Repository Manager - 负责包管理和统计功能
 
 import os
 import time
+import bisect
 import logging
+import threading
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterator, Optional
+
+from models.catalog import PackageCatalog
+from models.events import record_change
+from models.hot_cache import invalidate_hot_objects
+from models.jobs import DONE, get_job_queue, stage_upload
+from models.locks import package_lock
+from models.pypi_json import PyPIJsonStore
+from models.simple_pages import SimplePageCache
+from models.storage import get_storage
+from models.versions import normalize_name, sort_filenames
 
 logger = logging.getLogger(__name__)
 
+# 规范化包名 → 目录名的查找表，按仓库目录路径缓存在进程内；
+# 存储后端的签名（如仓库目录的 mtime）在包增删时变化，作为查找表的签名
+_name_tables: Dict[str, tuple] = {}
+_name_tables_lock = threading.Lock()
+
 
 class RepositoryManager:
     """仓库管理器 - 负责包扫描、缓存和统计"""
@@ -18,6 +35,18 @@ class RepositoryManager:
         self.packages_dir = Path(packages_dir)
         self.packages_dir.mkdir(exist_ok=True)
         
+        # 包文件的存储后端（本地目录或对象存储）
+        self.storage = get_storage(self.packages_dir)
+        
+        # 包文件记录（大小、哈希等）
+        self.catalog = PackageCatalog(self.packages_dir, self.storage)
+        
+        # /pypi/<name>/json 文档缓存
+        self.pypi_json = PyPIJsonStore(self.packages_dir, os.environ.get('PUBLIC_BASE_URL', ''))
+        
+        # Simple 页面磁盘缓存（含预压缩变体）
+        self.page_cache = SimplePageCache(self.packages_dir, self.storage)
+        
         # 缓存配置
         self.cache = {}
         self.cache_ttl = 300  # 5分钟缓存
@@ -33,22 +62,10 @@ class RepositoryManager:
         try:
             packages = {}
             
-            if not self.packages_dir.exists():
-                logger.warning(f"Packages directory does not exist: {self.packages_dir}")
-                return packages
-            
-            for package_dir in self.packages_dir.iterdir():
-                if package_dir.is_dir():
-                    package_name = package_dir.name
-                    files = []
-                    
-                    # 扫描包目录中的文件
-                    for file_path in package_dir.iterdir():
-                        if file_path.is_file():
-                            files.append(file_path.name)
-                    
-                    if files:  # 只包含有文件的包
-                        packages[package_name] = sorted(files)
+            for package_name in self.storage.list_packages():
+                files = self.storage.list_files(package_name)
+                if files:  # 只包含有文件的包
+                    packages[package_name] = sort_filenames(files)
             
             logger.info(f"Scanned {len(packages)} packages")
             return packages
@@ -72,11 +89,97 @@ class RepositoryManager:
         
         return packages
     
+    def iter_package_names(self, after: Optional[str] = None) -> Iterator[str]:
+        """按名称顺序逐个返回包名，after 为游标（不包含该包名）"""
+        # 只读取包名，不展开文件列表
+        names = self.storage.list_packages()
+        
+        start = bisect.bisect_right(names, after) if after else 0
+        for name in names[start:]:
+            yield name
+    
+    def list_package_dir(self, package_name: str) -> List[str]:
+        """直接读取单个包的文件列表（不经过全量缓存），按版本排序"""
+        return sort_filenames(self.storage.list_files(package_name))
+    
+    def get_file_records(self, package_name: str) -> List[Dict[str, Any]]:
+        """包的文件记录（按版本排序）
+        
+        目录中的记录与文件列表一致时直接使用，不逐个 stat 文件；有新文件或文件已删除时先补全记录。
+        """
+        files = self.list_package_dir(package_name)
+        if not files:
+            return []
+        records = self.catalog.get(package_name)['files']
+        if set(records) != set(files):
+            with package_lock(self.packages_dir, package_name):
+                records = self.catalog.ensure_records(package_name, files)
+        return [records[name] for name in files if name in records]
+    
+    def _name_table(self) -> Dict[str, str]:
+        key = str(self.packages_dir.resolve())
+        signature = self.storage.signature()
+        cached = _name_tables.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        
+        table = {}
+        for name in self.iter_package_names():
+            # 存在仅规范化后相同的多个目录时，优先使用已经规范化的目录
+            normalized = normalize_name(name)
+            if normalized not in table or name == normalized:
+                table[normalized] = name
+        
+        with _name_tables_lock:
+            _name_tables[key] = (signature, table)
+        return table
+    
+    def resolve_package_name(self, package_name: str) -> Optional[str]:
+        """把请求中的包名解析为仓库中的目录名（PEP 503 规范化匹配），不存在时返回None"""
+        if not package_name or package_name.startswith('.') or '/' in package_name:
+            return None
+        if self.storage.exists(package_name):
+            return package_name
+        return self._name_table().get(normalize_name(package_name))
+    
+    def get_latest(self, package_name: str) -> Optional[Dict[str, Any]]:
+        """最新版本摘要，优先读取目录中的记录；还没有记录的包会先补全记录"""
+        if package_name.startswith('.'):
+            return None
+        
+        latest = self.catalog.get_latest(package_name)
+        if latest is not None:
+            return latest
+        
+        with package_lock(self.packages_dir, package_name):
+            files = self.list_package_dir(package_name)
+            if not files:
+                return None
+            self.catalog.ensure_records(package_name, files)
+        return self.catalog.get_latest(package_name)
+    
     def get_package_files(self, package_name: str) -> List[str]:
         """获取指定包的文件列表"""
         packages = self.get_packages()
         return packages.get(package_name, [])
     
+    def invalidate(self, package_name: Optional[str] = None, action: str = 'updated',
+                   delta: Optional[Dict[str, int]] = None):
+        """包内容变化后清除内存缓存和对应的页面缓存，并记录变更事件
+        
+        delta 为统计信息的增量（packages_count / files_count / total_size），
+        提供时事件订阅方直接累加，不需要重新扫描整个仓库。
+        """
+        self.cache.clear()
+        self.last_scan = 0
+        self.page_cache.invalidate(package_name)
+        invalidate_hot_objects(package_name)
+        if package_name:
+            self.pypi_json.invalidate(package_name)
+        if package_name and not self.storage.exists(package_name):
+            self.catalog.remove_package(package_name)
+        record_change(self.packages_dir, action, package_name, delta)
+    
     def get_stats(self) -> Dict[str, Any]:
         """获取仓库统计信息"""
         try:
@@ -87,11 +190,10 @@ class RepositoryManager:
             # 计算总大小
             total_size = 0
             for package_name, files in packages.items():
-                package_dir = self.packages_dir / package_name
                 for file_name in files:
-                    file_path = package_dir / file_name
-                    if file_path.exists():
-                        total_size += file_path.stat().st_size
+                    info = self.storage.stat(package_name, file_name)
+                    if info is not None:
+                        total_size += info.size
             
             total_size_mb = round(total_size / (1024 * 1024), 2)
             
@@ -101,6 +203,7 @@ class RepositoryManager:
             stats = {
                 'packages_count': packages_count,
                 'files_count': files_count,
+                'total_size': total_size,
                 'total_size_mb': total_size_mb,
                 'uptime': uptime,
                 'last_health_check': time.time(),
@@ -114,6 +217,7 @@ class RepositoryManager:
             return {
                 'packages_count': 0,
                 'files_count': 0,
+                'total_size': 0,
                 'total_size_mb': 0,
                 'uptime': time.time() - self.start_time,
                 'last_health_check': time.time(),
@@ -121,19 +225,23 @@ class RepositoryManager:
             }
     
     def add_package(self, package_name: str, file_path: str) -> bool:
-        """添加包文件到仓库"""
+        """添加包文件到仓库，与上传接口一样经由任务队列校验并发布"""
         try:
-            package_dir = self.packages_dir / package_name
-            package_dir.mkdir(exist_ok=True)
+            # 先完整复制到暂存目录，再由 process_upload 任务校验、在包的写锁内发布并清除缓存
+            with open(file_path, 'rb') as f:
+                staged_path = stage_upload(self.packages_dir, os.path.basename(file_path), f)
             
-            # 复制文件到包目录
-            import shutil
-            dest_path = package_dir / os.path.basename(file_path)
-            shutil.copy2(file_path, dest_path)
-            
-            # 清除缓存
-            self.cache.clear()
-            self.last_scan = 0
+            job_queue = get_job_queue(self.packages_dir)
+            job = job_queue.create('process_upload', {
+                'packages_dir': str(self.packages_dir),
+                'package_name': package_name,
+                'staged_path': str(staged_path),
+                'action': 'uploaded',
+            })
+            job = job_queue.run(job['id'])
+            if job is None or job['status'] != DONE:
+                logger.error(f"Error adding package {package_name}: {job['error'] if job else 'job is busy'}")
+                return False
             
             logger.info(f"Added package file: {package_name}/{os.path.basename(file_path)}")
             return True
@@ -142,23 +250,53 @@ class RepositoryManager:
             logger.error(f"Error adding package {package_name}: {e}")
             return False
     
+    def remove_file(self, package_name: str, filename: str, invalidate: bool = True) -> bool:
+        """删除包中的单个文件
+        
+        批量删除时传入 invalidate=False，由调用方在最后统一失效缓存。
+        """
+        try:
+            package_dir = self.packages_dir / package_name
+            file_path = package_dir / filename
+            if package_name.startswith('.') or file_path.parent != package_dir:
+                logger.warning(f"Package file does not exist: {package_name}/{filename}")
+                return False
+            
+            with package_lock(self.packages_dir, package_name, exclusive=True):
+                if not self.storage.delete(package_name, filename):
+                    logger.warning(f"Package file does not exist: {package_name}/{filename}")
+                    return False
+                self.catalog.remove_file(package_name, filename)
+            
+            if invalidate:
+                self.invalidate(package_name, action='deleted')
+            
+            logger.info(f"Removed package file: {package_name}/{filename}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error removing package file {package_name}/{filename}: {e}")
+            return False
+    
     def remove_package(self, package_name: str) -> bool:
         """从仓库中删除包"""
         try:
             package_dir = self.packages_dir / package_name
-            if package_dir.exists():
-                import shutil
-                shutil.rmtree(package_dir)
-                
-                # 清除缓存
-                self.cache.clear()
-                self.last_scan = 0
-                
-                logger.info(f"Removed package: {package_name}")
-                return True
-            else:
+            if package_name.startswith('.') or package_dir.parent != self.packages_dir:
                 logger.warning(f"Package directory does not exist: {package_name}")
                 return False
+            
+            # 本地存储的写锁只持有一次 rename 的时间，目录内容在后台清除
+            with package_lock(self.packages_dir, package_name, exclusive=True):
+                if not self.storage.delete_package(package_name):
+                    logger.warning(f"Package directory does not exist: {package_name}")
+                    return False
+            
+            # 清除缓存
+            self.invalidate(package_name, action='deleted')
+            
+            logger.info(f"Removed package: {package_name}")
+            return True
                 
         except Exception as e:
             logger.error(f"Error removing package {package_name}: {e}")
@@ -0,0 +1,423 @@
+"""
+Resolver - 服务端依赖解析
+
+根据包文件记录中的 Requires-Dist / Requires-Python 和 wheel 标签，为给定的目标环境
+（Python 版本、平台标签）计算一组需求的完整依赖闭包，客户端一次请求即可得到所有
+要下载的文件、URL 和 sha256，不需要 pip 逐个请求索引页和元数据。
+
+- DependencyGraph: 进程内的依赖图，按包从记录中按需加载；通过变更日志只重新加载
+  发生变化的包，结果按 (需求, 目标环境, 仓库序列号) 缓存
+- 解析为深度优先回溯：每个包优先选择满足所有约束的最高版本，冲突时回退到上一个选择
+
+本仓库中不存在的包不参与解析，在结果的 missing 中列出，由客户端从其他索引安装。
+"""
+
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from packaging import tags as packaging_tags
+from packaging.markers import InvalidMarker, UndefinedComparison, UndefinedEnvironmentName
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.specifiers import SpecifierSet
+from packaging.utils import canonicalize_name
+from packaging.version import Version
+
+from models.events import ChangeJournal
+from models.locks import package_lock
+from models.metadata import read_core_metadata
+from models.versions import normalize_name, parse_version
+
+logger = logging.getLogger(__name__)
+
+# 解析结果缓存条目数（每个进程）
+RESULT_CACHE_SIZE = 256
+
+# 单次解析最多尝试的候选版本数，超过时认为无法解析
+MAX_RESOLUTION_ROUNDS = 20000
+
+# 各平台对应的环境标记
+PLATFORM_MARKERS = {
+    'linux': {'sys_platform': 'linux', 'platform_system': 'Linux', 'os_name': 'posix'},
+    'macosx': {'sys_platform': 'darwin', 'platform_system': 'Darwin', 'os_name': 'posix'},
+    'win': {'sys_platform': 'win32', 'platform_system': 'Windows', 'os_name': 'nt'},
+}
+
+# manylinux 旧名称对应的 glibc 版本
+LEGACY_MANYLINUX = {'manylinux1': (2, 5), 'manylinux2010': (2, 12), 'manylinux2014': (2, 17)}
+
+WINDOWS_MACHINES = {'win_amd64': 'AMD64', 'win32': 'x86', 'win_arm64': 'ARM64'}
+
+
+class ResolutionError(Exception):
+    """需求无效（400）或无法解析（409）"""
+    
+    def __init__(self, message: str, status_code: int = 409):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _expand_platform(platform: str) -> List[str]:
+    """展开平台标签：manylinux_2_28 同时兼容更早的 manylinux 版本，macOS 同时兼容更早的系统版本"""
+    for legacy, (major, minor) in LEGACY_MANYLINUX.items():
+        if platform.startswith(legacy + '_'):
+            platform = f"manylinux_{major}_{minor}_{platform[len(legacy) + 1:]}"
+    
+    parts = platform.split('_')
+    if parts[0] == 'manylinux' and len(parts) >= 4 and parts[1].isdigit() and parts[2].isdigit():
+        major, minor, arch = int(parts[1]), int(parts[2]), '_'.join(parts[3:])
+        expanded = []
+        for glibc_minor in range(minor, 4, -1):
+            expanded.append(f"manylinux_{major}_{glibc_minor}_{arch}")
+            for legacy, version in LEGACY_MANYLINUX.items():
+                if version == (major, glibc_minor):
+                    expanded.append(f"{legacy}_{arch}")
+        return expanded + [f"linux_{arch}"]
+    
+    if parts[0] == 'macosx' and len(parts) >= 4 and parts[1].isdigit() and parts[2].isdigit():
+        arch = '_'.join(parts[3:])
+        return list(packaging_tags.mac_platforms((int(parts[1]), int(parts[2])), arch))
+    
+    return [platform]
+
+
+class Target:
+    """目标环境：Python 版本、支持的 wheel 标签和环境标记"""
+    
+    def __init__(self, python_version: str, platforms: List[str], implementation: str = 'cp',
+                 abis: Optional[List[str]] = None, environment: Optional[Dict[str, str]] = None):
+        try:
+            version_parts = tuple(int(part) for part in python_version.split('.'))
+        except ValueError:
+            raise ResolutionError(f'Invalid python_version: {python_version}', 400)
+        if len(version_parts) < 2:
+            raise ResolutionError(f'Invalid python_version: {python_version}', 400)
+        if not platforms:
+            raise ResolutionError('At least one platform is required', 400)
+        
+        self.python_version = '.'.join(str(part) for part in version_parts[:2])
+        self.python_full_version = '.'.join(str(part) for part in (version_parts + (0,))[:3])
+        self.platforms = list(platforms)
+        self.implementation = implementation
+        self.abis = list(abis) if abis else None
+        
+        expanded = [tag for platform in platforms for tag in _expand_platform(platform)]
+        short_version = version_parts[:2]
+        interpreter = f"{implementation}{short_version[0]}{short_version[1]}"
+        if implementation == 'cp':
+            supported = list(packaging_tags.cpython_tags(short_version, self.abis, expanded))
+        else:
+            supported = list(packaging_tags.generic_tags(interpreter, self.abis or ['none'], expanded))
+        supported += list(packaging_tags.compatible_tags(short_version, interpreter, expanded))
+        # 标签优先级：越靠前越匹配目标环境
+        self.tag_priority = {str(tag): index for index, tag in enumerate(OrderedDict.fromkeys(supported))}
+        
+        self.environment = self._default_environment(platforms[0])
+        self.environment.update(environment or {})
+    
+    def _default_environment(self, platform: str) -> Dict[str, str]:
+        family = next((prefix for prefix in PLATFORM_MARKERS if platform.startswith(prefix)), 'linux')
+        if platform in WINDOWS_MACHINES:
+            machine = WINDOWS_MACHINES[platform]
+        else:
+            machine = platform.split('_', 3)[-1] if platform.startswith(('manylinux_', 'macosx_')) \
+                else platform.split('_', 1)[-1]
+        environment = {
+            'python_version': self.python_version,
+            'python_full_version': self.python_full_version,
+            'implementation_name': 'cpython' if self.implementation == 'cp' else self.implementation,
+            'implementation_version': self.python_full_version,
+            'platform_python_implementation': 'CPython' if self.implementation == 'cp' else self.implementation,
+            'platform_machine': machine,
+            'platform_release': '',
+            'platform_version': '',
+        }
+        environment.update(PLATFORM_MARKERS[family])
+        return environment
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'python_version': self.python_full_version,
+            'platforms': self.platforms,
+            'implementation': self.implementation,
+            'abis': self.abis,
+            'environment': self.environment,
+        }
+    
+    def wheel_priority(self, tags: Optional[Dict[str, str]]) -> Optional[int]:
+        """wheel 与目标环境匹配的优先级（越小越好），不兼容时返回None"""
+        if not tags:
+            return None
+        priorities = [
+            self.tag_priority[f"{python}-{abi}-{platform}"]
+            for python in tags['python'].split('.')
+            for abi in tags['abi'].split('.')
+            for platform in tags['platform'].split('.')
+            if f"{python}-{abi}-{platform}" in self.tag_priority
+        ]
+        return min(priorities) if priorities else None
+
+
+class Project:
+    """依赖图中的一个包：版本从高到低排列的文件记录"""
+    
+    def __init__(self, name: str, records: List[Dict[str, Any]]):
+        self.name = name
+        versions: Dict[Version, List[Dict[str, Any]]] = {}
+        for record in records:
+            version = parse_version(record.get('version') or '')
+            if version is not None:
+                versions.setdefault(version, []).append(record)
+        self.versions = sorted(versions.items(), key=lambda item: item[0], reverse=True)
+
+
+class DependencyGraph:
+    """进程内的依赖图与解析结果缓存"""
+    
+    def __init__(self, repo_manager):
+        self.repo_manager = repo_manager
+        self.journal = ChangeJournal(repo_manager.packages_dir)
+        self._lock = threading.Lock()
+        self._projects: Dict[str, Optional[Project]] = {}
+        self._serial = self.journal.current_serial()
+        self._offset = self.journal.size()
+        self._results: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+    
+    def refresh(self) -> int:
+        """按变更日志丢弃发生变化的包，返回当前仓库序列号"""
+        with self._lock:
+            serial = self.journal.current_serial()
+            if serial == self._serial:
+                return serial
+            
+            events, self._offset = self.journal.read_from(self._offset)
+            changed = {event.get('package') for event in events}
+            # 日志轮转后丢失了部分事件，或有全量变更时重新加载所有包
+            if None in changed or not events or events[0].get('serial') != self._serial + 1:
+                self._projects.clear()
+            else:
+                for name in changed:
+                    self._projects.pop(normalize_name(name), None)
+            self._serial = serial
+            return serial
+    
+    def get_project(self, name: str) -> Optional[Project]:
+        """按规范化名称获取包，仓库中不存在时返回None"""
+        with self._lock:
+            if name in self._projects:
+                return self._projects[name]
+        
+        project = self._load(name)
+        with self._lock:
+            self._projects[name] = project
+        return project
+    
+    def _load(self, name: str) -> Optional[Project]:
+        package_name = self.repo_manager.resolve_package_name(name)
+        if package_name is None:
+            return None
+        files = self.repo_manager.list_package_dir(package_name)
+        if not files:
+            return None
+        
+        with package_lock(self.repo_manager.packages_dir, package_name):
+            records = self.repo_manager.catalog.ensure_records(package_name, files)
+        
+        for filename, record in records.items():
+            if 'requires_dist' not in record:
+                # 回填之前的旧记录：从文件中读取（只保存在内存中，backfill-metadata 会写入记录）
+                record.update(read_core_metadata(self.repo_manager.storage.local_path(package_name, filename)))
+        return Project(package_name, list(records.values()))
+    
+    def resolve(self, requirements: List[str], target: Target, prereleases: bool = False,
+                allow_sdist: bool = True) -> Dict[str, Any]:
+        """解析需求的依赖闭包（结果按仓库序列号缓存）"""
+        serial = self.refresh()
+        key = hashlib.sha256(json.dumps({
+            'requirements': sorted(requirements),
+            'target': target.to_dict(),
+            'prereleases': prereleases,
+            'allow_sdist': allow_sdist,
+            'serial': serial,
+        }, sort_keys=True).encode('utf-8')).hexdigest()
+        
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                self._results.move_to_end(key)
+                return cached
+        
+        result = _Resolution(self, target, prereleases, allow_sdist).run(requirements)
+        result['serial'] = serial
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > RESULT_CACHE_SIZE:
+                self._results.popitem(last=False)
+        return result
+
+
+class _Resolution:
+    """一次解析的状态"""
+    
+    def __init__(self, graph: DependencyGraph, target: Target, prereleases: bool, allow_sdist: bool):
+        self.graph = graph
+        self.target = target
+        self.prereleases = prereleases
+        self.allow_sdist = allow_sdist
+        self.rounds = 0
+        self.missing: Dict[str, str] = {}
+        self.failure: Optional[str] = None
+    
+    def run(self, requirement_strings: List[str]) -> Dict[str, Any]:
+        requirements = []
+        for value in requirement_strings:
+            try:
+                requirements.append((Requirement(value), None))
+            except InvalidRequirement as e:
+                raise ResolutionError(f'Invalid requirement {value!r}: {e}', 400)
+        
+        pins = self._solve({}, {}, requirements)
+        if pins is None:
+            raise ResolutionError(self.failure or 'No solution found')
+        
+        files = []
+        for name, (version, record, extras, project_name) in sorted(pins.items()):
+            files.append({
+                'name': project_name,
+                'version': str(version),
+                'extras': sorted(extras),
+                'filename': record['filename'],
+                'sha256': record['sha256'],
+                'size': record['size'],
+                'packagetype': record['packagetype'],
+                'requires_python': record.get('requires_python'),
+            })
+        return {
+            'target': self.target.to_dict(),
+            'files': files,
+            'missing': sorted(self.missing.values()),
+        }
+    
+    def _marker_matches(self, requirement: Requirement, extras: Set[str]) -> bool:
+        if requirement.marker is None:
+            return True
+        try:
+            return any(
+                requirement.marker.evaluate(dict(self.target.environment, extra=extra))
+                for extra in (extras or {''})
+            )
+        except (InvalidMarker, UndefinedComparison, UndefinedEnvironmentName):
+            return False
+    
+    def _dependencies(self, record: Dict[str, Any], extras: Set[str], parent: str) -> List[Tuple[Requirement, str]]:
+        dependencies = []
+        for value in record.get('requires_dist') or []:
+            try:
+                requirement = Requirement(value)
+            except InvalidRequirement:
+                logger.warning(f"Ignoring invalid requirement {value!r} of {record['filename']}")
+                continue
+            if self._marker_matches(requirement, {canonicalize_name(e) for e in extras}):
+                dependencies.append((requirement, parent))
+        return dependencies
+    
+    def _select_file(self, records: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """选择一个版本中与目标环境最匹配的文件（wheel 优先于 sdist）"""
+        best, best_priority = None, None
+        for record in records:
+            requires_python = record.get('requires_python')
+            if requires_python:
+                try:
+                    if not SpecifierSet(requires_python).contains(self.target.python_full_version, prereleases=True):
+                        continue
+                except ValueError:
+                    pass
+            if record['packagetype'] == 'bdist_wheel':
+                priority = self.target.wheel_priority(record.get('tags'))
+            elif record['packagetype'] == 'sdist' and self.allow_sdist:
+                priority = len(self.target.tag_priority)
+            else:
+                priority = None
+            if priority is not None and (best_priority is None or priority < best_priority):
+                best, best_priority = record, priority
+        return best
+    
+    def _candidates(self, project: Project, specifier: SpecifierSet):
+        """满足约束的 (版本, 文件)，从高到低"""
+        versions = [version for version, _ in project.versions]
+        allowed = set(specifier.filter(versions, prereleases=self.prereleases or None))
+        pinned = any(spec.operator in ('==', '===') for spec in specifier)
+        for version, records in project.versions:
+            if version not in allowed:
+                continue
+            # yanked 的版本只在被 == 精确指定时使用（PEP 592）
+            record = self._select_file(records if pinned else [r for r in records if r.get('yanked') is None])
+            if record is not None:
+                yield version, record
+    
+    def _solve(self, pins: Dict[str, tuple], specifiers: Dict[str, SpecifierSet],
+               pending: List[Tuple[Requirement, Optional[str]]]) -> Optional[Dict[str, tuple]]:
+        pending = list(pending)
+        while pending:
+            requirement, parent = pending.pop(0)
+            if parent is None and not self._marker_matches(requirement, set()):
+                continue
+            
+            name = normalize_name(requirement.name)
+            project = self.graph.get_project(name)
+            if project is None:
+                self.missing.setdefault(name, str(requirement))
+                continue
+            
+            combined = specifiers.get(name, SpecifierSet()) & requirement.specifier
+            extras = {canonicalize_name(extra) for extra in requirement.extras}
+            
+            if name in pins:
+                version, record, pinned_extras, project_name = pins[name]
+                if not combined.contains(version, prereleases=True):
+                    self.failure = (f"{project_name} {version} was selected, but {requirement}"
+                                    f"{' (required by ' + parent + ')' if parent else ''} conflicts with it")
+                    return None
+                specifiers = dict(specifiers, **{name: combined})
+                new_extras = extras - pinned_extras
+                if new_extras:
+                    pins = dict(pins, **{name: (version, record, pinned_extras | new_extras, project_name)})
+                    pending += [dep for dep in self._dependencies(record, new_extras, f"{project_name} {version}")
+                                if dep[0].marker is not None]
+                continue
+            
+            specifiers = dict(specifiers, **{name: combined})
+            for version, record in self._candidates(project, combined):
+                self.rounds += 1
+                if self.rounds > MAX_RESOLUTION_ROUNDS:
+                    raise ResolutionError('Resolution is too complex, add tighter constraints')
+                
+                candidate_pins = dict(pins, **{name: (version, record, extras, project.name)})
+                dependencies = self._dependencies(record, extras, f"{project.name} {version}")
+                solution = self._solve(candidate_pins, specifiers, pending + dependencies)
+                if solution is not None:
+                    return solution
+            
+            if self.failure is None:
+                self.failure = (f"No version of {project.name} satisfies {requirement}"
+                                f"{' (required by ' + parent + ')' if parent else ''} for Python "
+                                f"{self.target.python_full_version} on {', '.join(self.target.platforms)}")
+            return None
+        return pins
+
+
+_graphs: Dict[str, DependencyGraph] = {}
+_graphs_lock = threading.Lock()
+
+
+def get_dependency_graph(repo_manager) -> DependencyGraph:
+    """获取进程内共享的依赖图"""
+    key = str(Path(repo_manager.packages_dir).resolve())
+    with _graphs_lock:
+        if key not in _graphs:
+            _graphs[key] = DependencyGraph(repo_manager)
+        return _graphs[key]
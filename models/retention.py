@@ -0,0 +1,280 @@
+"""
+Retention - 旧版本保留策略与垃圾回收
+
+策略按包配置（retention.json），一个版本满足任一条件即保留：
+- keep_latest: 保留最新的 N 个版本
+- keep_days: 保留最近 X 天内上传的版本
+- pinned: 永不删除的版本列表
+
+版本按 PEP 440 比较（1.0 与 1.0.0 是同一个版本），pinned 中无法解析的版本号使配置无效。
+没有配置任何规则的包不会被清理；无法解析版本号的文件也不会被删除。
+"""
+
+import json
+import time
+import fcntl
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from packaging.version import Version
+
+from models.compression import atomic_write
+from models.events import get_state_dir
+from models.versions import parse_version, split_filename
+
+logger = logging.getLogger(__name__)
+
+POLICY_KEYS = ('keep_latest', 'keep_days', 'pinned')
+
+
+class RetentionPolicy:
+    """单个包的保留策略"""
+    
+    def __init__(self, keep_latest: Optional[int] = None, keep_days: Optional[float] = None,
+                 pinned: Optional[List[str]] = None):
+        self.keep_latest = keep_latest
+        self.keep_days = keep_days
+        self.pinned = set()
+        for value in pinned or []:
+            version = parse_version(str(value))
+            if version is None:
+                raise ValueError(f"Invalid pinned version: {value!r}")
+            self.pinned.add(version)
+    
+    @property
+    def is_active(self) -> bool:
+        """没有 keep_latest / keep_days 规则时不删除任何版本"""
+        return self.keep_latest is not None or self.keep_days is not None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'keep_latest': self.keep_latest,
+            'keep_days': self.keep_days,
+            'pinned': [str(version) for version in sorted(self.pinned)],
+        }
+    
+    def select_expired(self, versions: Dict[Version, float], now: float) -> List[Version]:
+        """从 {版本: 最新上传时间} 中选出应删除的版本"""
+        if not self.is_active:
+            return []
+        
+        ordered = sorted(versions, reverse=True)
+        kept = set(self.pinned)
+        if self.keep_latest is not None:
+            kept.update(ordered[:self.keep_latest])
+        if self.keep_days is not None:
+            cutoff = now - self.keep_days * 86400
+            kept.update(v for v, mtime in versions.items() if mtime >= cutoff)
+        
+        return [v for v in ordered if v not in kept]
+
+
+def load_policies(config_path: Optional[str]) -> Dict[str, Any]:
+    """读取保留策略配置，文件不存在时返回空配置
+
+    格式::
+
+        {
+            "default": {"keep_latest": 20},
+            "packages": {
+                "payo-cli": {"keep_latest": 5, "keep_days": 30, "pinned": ["1.0.0"]}
+            }
+        }
+    """
+    if not config_path or not Path(config_path).exists():
+        return {'default': {}, 'packages': {}}
+    
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    
+    for section in [config.get('default', {})] + list(config.get('packages', {}).values()):
+        unknown = set(section) - set(POLICY_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown retention options: {', '.join(sorted(unknown))}")
+        # 校验 pinned 中的版本号
+        RetentionPolicy(**section)
+    
+    return {
+        'default': config.get('default', {}),
+        'packages': config.get('packages', {}),
+    }
+
+
+class RetentionEngine:
+    """按策略清理旧版本
+
+    plan() 只生成报告（dry-run），apply() 按报告删除文件；删除时按
+    max_deletes_per_second 限速，避免和正常下载争抢磁盘 I/O。
+    每个包清理完成后只失效该包的缓存，并以增量方式更新统计信息。
+    """
+    
+    def __init__(self, repo_manager, config: Dict[str, Any], max_deletes_per_second: float = 20.0):
+        self.repo_manager = repo_manager
+        self.config = config
+        self.max_deletes_per_second = max_deletes_per_second
+    
+    def policy_for(self, package_name: str) -> RetentionPolicy:
+        """包策略 = 默认策略 + 包级覆盖"""
+        options = dict(self.config.get('default', {}))
+        options.update(self.config.get('packages', {}).get(package_name, {}))
+        return RetentionPolicy(**options)
+    
+    def plan(self, package_name: Optional[str] = None) -> Dict[str, Any]:
+        """生成清理报告，不修改任何文件"""
+        now = time.time()
+        names = [package_name] if package_name else list(self.repo_manager.iter_package_names())
+        report = {'generated_at': now, 'packages': {}, 'files_count': 0, 'total_bytes': 0}
+        
+        for name in names:
+            policy = self.policy_for(name)
+            if not policy.is_active:
+                continue
+            
+            files_by_version: Dict[Version, List[Dict[str, Any]]] = {}
+            newest: Dict[Version, float] = {}
+            
+            for file_name in self.repo_manager.list_package_dir(name):
+                parsed = split_filename(file_name)
+                version = parse_version(parsed[1]) if parsed else None
+                if version is None:
+                    continue
+                info = self.repo_manager.storage.stat(name, file_name)
+                if info is None:
+                    continue
+                files_by_version.setdefault(version, []).append({
+                    'filename': file_name,
+                    'size': info.size,
+                })
+                newest[version] = max(newest.get(version, 0), info.mtime)
+            
+            expired = policy.select_expired(newest, now)
+            if not expired:
+                continue
+            
+            entries = [
+                {'version': str(version), 'files': files_by_version[version]}
+                for version in expired
+            ]
+            files = [f for entry in entries for f in entry['files']]
+            report['packages'][name] = {
+                'policy': policy.to_dict(),
+                'versions': entries,
+                'files_count': len(files),
+                'total_bytes': sum(f['size'] for f in files),
+            }
+            report['files_count'] += len(files)
+            report['total_bytes'] += sum(f['size'] for f in files)
+        
+        return report
+    
+    def apply(self, report: Dict[str, Any], stop_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """按报告删除文件，返回实际删除的结果"""
+        delay = 1.0 / self.max_deletes_per_second if self.max_deletes_per_second else 0
+        result = {'packages': {}, 'files_count': 0, 'total_bytes': 0}
+        
+        for name, entry in report['packages'].items():
+            removed = []
+            for version_entry in entry['versions']:
+                for file_info in version_entry['files']:
+                    if stop_event is not None and stop_event.is_set():
+                        break
+                    if self.repo_manager.remove_file(name, file_info['filename'], invalidate=False):
+                        removed.append(file_info)
+                    if delay:
+                        time.sleep(delay)
+            
+            if removed:
+                removed_bytes = sum(f['size'] for f in removed)
+                emptied = not self.repo_manager.list_package_dir(name)
+                self.repo_manager.invalidate(name, action='pruned', delta={
+                    'packages_count': -1 if emptied else 0,
+                    'files_count': -len(removed),
+                    'total_size': -removed_bytes,
+                })
+                result['packages'][name] = [f['filename'] for f in removed]
+                result['files_count'] += len(removed)
+                result['total_bytes'] += removed_bytes
+                logger.info(f"Pruned {len(removed)} files from {name}")
+        
+        return result
+
+
+class RetentionRunner:
+    """在后台线程中运行保留策略
+    
+    通过状态目录中的文件锁保证所有 gunicorn 进程和命令行工具中同一时间只有一个任务，
+    最近一次运行结果写入 .repo/retention.json，任一进程都可以查询。
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._running: Optional[Dict[str, Any]] = None
+    
+    def start(self, engine: RetentionEngine, dry_run: bool = True,
+              package_name: Optional[str] = None) -> bool:
+        """启动后台任务，已有任务在运行时返回False"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            
+            state_dir = get_state_dir(engine.repo_manager.packages_dir)
+            lock_file = open(state_dir / 'retention.lock', 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                return False
+            
+            self._stop.clear()
+            self._running = {
+                'dry_run': dry_run,
+                'package': package_name,
+                'started_at': time.time(),
+            }
+            self._thread = threading.Thread(
+                target=self._run, args=(engine, lock_file, state_dir),
+                name='retention', daemon=True
+            )
+            self._thread.start()
+            return True
+    
+    def stop(self):
+        self._stop.set()
+    
+    def wait(self, timeout: Optional[float] = None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+    
+    def get_status(self, packages_dir) -> Dict[str, Any]:
+        """当前任务和最近一次运行结果"""
+        status_path = get_state_dir(packages_dir) / 'retention.json'
+        last_run = None
+        if status_path.exists():
+            with open(status_path, 'r', encoding='utf-8') as f:
+                last_run = json.load(f)
+        return {'running': self._running, 'last_run': last_run}
+    
+    def _run(self, engine: RetentionEngine, lock_file, state_dir: Path):
+        run = dict(self._running)
+        try:
+            run['report'] = engine.plan(run['package'])
+            if not run['dry_run']:
+                run['result'] = engine.apply(run['report'], self._stop)
+        except Exception as e:
+            logger.error(f"Retention run failed: {e}")
+            run['error'] = str(e)
+        finally:
+            run['finished_at'] = time.time()
+            atomic_write(state_dir / 'retention.json', json.dumps(run, ensure_ascii=False).encode('utf-8'))
+            self._running = None
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+
+# 进程内共享的后台任务
+retention_runner = RetentionRunner()
@@ -0,0 +1,351 @@
+"""
+Scrubber - 包文件完整性巡检
+
+后台逐个重新计算包文件的 sha256，与入库时记录的值比较，并检查归档能否完整读取，
+在客户端 pip 安装因哈希不符失败之前发现位衰减或不完整的复制。
+
+- I/O 限速：哈希和归档检查都按 bytes_per_second 读取；idle_priority 时巡检线程使用最低的 CPU 和 I/O
+  优先级（Linux 的 idle I/O 调度类），不与下载争抢磁盘
+- 断点续巡：进度（包名、文件名）定期写入 .repo/scrub.json，进程重启后从断点继续
+- 隔离：损坏的文件在包写锁内移动到 .repo/quarantine/<包名>/，同时删除记录并失效缓存，
+  不再出现在索引中；巡检结果可通过管理接口和 /stats 查看
+
+文件在入库后被替换（修改时间变化）时跳过，由 PackageCatalog.ensure_records() 重新记录。
+所有 gunicorn 进程和命令行工具中同一时间只有一个巡检在运行（.repo/scrub.lock）。
+"""
+
+import os
+import json
+import time
+import fcntl
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from models.compression import atomic_write
+from models.events import get_state_dir
+from models.jobs import JobError, validate_archive
+from models.locks import package_lock
+
+logger = logging.getLogger(__name__)
+
+SCRUB_CHUNK_SIZE = 1024 * 1024
+
+# 进度写入间隔（秒）
+CHECKPOINT_INTERVAL = 10.0
+
+# 状态文件中保留的损坏文件记录数
+MAX_CORRUPT_RECORDS = 1000
+
+
+def get_quarantine_dir(packages_dir) -> Path:
+    return get_state_dir(packages_dir) / 'quarantine'
+
+
+def set_idle_priority() -> None:
+    """把当前线程的 CPU 和 I/O 优先级降到最低（仅 Linux，不支持时忽略）"""
+    thread_id = threading.get_native_id()
+    try:
+        os.setpriority(os.PRIO_PROCESS, thread_id, 19)
+    except (AttributeError, OSError) as e:
+        logger.debug(f"Cannot lower scrubber CPU priority: {e}")
+    try:
+        import psutil
+        psutil.Process(thread_id).ionice(psutil.IOPRIO_CLASS_IDLE)
+    except Exception as e:
+        logger.debug(f"Cannot set idle I/O priority for the scrubber: {e}")
+
+
+class IOBudget:
+    """按字节限速（令牌桶，最多积累一秒的额度）"""
+    
+    def __init__(self, bytes_per_second: float):
+        self.rate = bytes_per_second
+        self._allowance = 0.0
+        self._last = time.monotonic()
+    
+    def consume(self, size: int) -> None:
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate) - size
+        self._last = now
+        if self._allowance < 0:
+            time.sleep(-self._allowance / self.rate)
+
+
+class ScrubStopped(Exception):
+    """巡检被要求停止"""
+
+
+class BudgetedReader:
+    """按 IOBudget 限速读取的文件对象，被要求停止时抛出 ScrubStopped"""
+    
+    def __init__(self, f, budget: IOBudget, stop_event: Optional[threading.Event] = None):
+        self._f = f
+        self.budget = budget
+        self.stop_event = stop_event
+    
+    def read(self, size: int = -1) -> bytes:
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise ScrubStopped()
+        data = self._f.read(size)
+        self.budget.consume(len(data))
+        return data
+    
+    def __getattr__(self, name):
+        # seek / tell 等不读取数据的操作直接交给底层文件
+        return getattr(self._f, name)
+
+
+class IntegrityScrubber:
+    """一轮完整性巡检"""
+    
+    def __init__(self, repo_manager, bytes_per_second: float = 8 * 1024 * 1024):
+        self.repo_manager = repo_manager
+        self.packages_dir = repo_manager.packages_dir
+        self.state_path = get_state_dir(self.packages_dir) / 'scrub.json'
+        self.budget = IOBudget(bytes_per_second)
+    
+    def load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {'current_pass': None, 'last_pass': None, 'next_pass_at': 0, 'corrupt': [],
+                    'totals': {'files_checked': 0, 'bytes_checked': 0, 'corrupt_found': 0}}
+    
+    def save_state(self, state: Dict[str, Any]) -> None:
+        atomic_write(self.state_path, json.dumps(state, ensure_ascii=False).encode('utf-8'))
+    
+    def _hash(self, path: Path, stop_event: Optional[threading.Event]) -> Optional[str]:
+        """限速读取并计算 sha256，被要求停止时返回None"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while True:
+                if stop_event is not None and stop_event.is_set():
+                    return None
+                chunk = f.read(SCRUB_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.budget.consume(len(chunk))
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def check_file(self, package_name: str, filename: str, record: Dict[str, Any],
+                   stop_event: Optional[threading.Event] = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """检查单个文件，返回 (ok / changed / missing / stopped / corrupt, 损坏详情)"""
+        path = self.packages_dir / package_name / filename
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return 'missing', None
+        
+        if stat.st_mtime_ns != record['mtime_ns']:
+            return 'changed', None
+        
+        problem = {
+            'package': package_name,
+            'filename': filename,
+            'expected_size': record['size'],
+            'size': stat.st_size,
+            'expected_sha256': record['sha256'],
+            'mtime_ns': stat.st_mtime_ns,
+        }
+        if stat.st_size != record['size']:
+            return 'corrupt', dict(problem, reason='size mismatch')
+        
+        sha256 = self._hash(path, stop_event)
+        if sha256 is None:
+            return 'stopped', None
+        if sha256 != record['sha256']:
+            return 'corrupt', dict(problem, reason='sha256 mismatch', sha256=sha256)
+        
+        # 哈希一致但入库时就不完整的归档（例如复制中断）同样无法安装；读取同样计入限速
+        try:
+            with open(path, 'rb') as f:
+                validate_archive(path, BudgetedReader(f, self.budget, stop_event))
+        except ScrubStopped:
+            return 'stopped', None
+        except JobError as e:
+            return 'corrupt', dict(problem, reason=str(e), sha256=sha256)
+        return 'ok', None
+    
+    def quarantine(self, problem: Dict[str, Any]) -> Optional[str]:
+        """把损坏的文件移出包目录，返回隔离路径；文件已被替换时返回None"""
+        package_name, filename = problem['package'], problem['filename']
+        path = self.packages_dir / package_name / filename
+        target_dir = get_quarantine_dir(self.packages_dir) / package_name
+        target_dir.mkdir(parents=True, exist_ok=True)
+        target = target_dir / f"{filename}.{int(time.time())}"
+        
+        with package_lock(self.packages_dir, package_name, exclusive=True):
+            try:
+                if path.stat().st_mtime_ns != problem['mtime_ns']:
+                    return None
+            except FileNotFoundError:
+                return None
+            os.replace(path, target)
+            self.repo_manager.catalog.remove_file(package_name, filename)
+        
+        emptied = not self.repo_manager.list_package_dir(package_name)
+        self.repo_manager.invalidate(package_name, action='quarantined', delta={
+            'packages_count': -1 if emptied else 0,
+            'files_count': -1,
+            'total_size': -problem['size'],
+        })
+        logger.error(f"Quarantined corrupt file {package_name}/{filename}: {problem['reason']}")
+        return str(target.relative_to(self.packages_dir))
+    
+    def _record_corrupt(self, state: Dict[str, Any], problem: Dict[str, Any]) -> bool:
+        """隔离损坏的文件并记录，文件在检查期间被替换时返回False"""
+        quarantined_to = self.quarantine(problem)
+        if quarantined_to is None:
+            return False
+        problem.update(detected_at=time.time(), quarantined_to=quarantined_to)
+        state['totals']['corrupt_found'] += 1
+        state['corrupt'] = (state['corrupt'] + [problem])[-MAX_CORRUPT_RECORDS:]
+        return True
+    
+    def run_pass(self, stop_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """执行（或从断点继续）一轮巡检，返回更新后的状态"""
+        state = self.load_state()
+        current = state.get('current_pass') or {
+            'started_at': time.time(), 'cursor': None,
+            'files': 0, 'bytes': 0, 'skipped': 0, 'corrupt': 0,
+        }
+        state['current_pass'] = current
+        cursor = tuple(current['cursor']) if current['cursor'] else None
+        last_checkpoint = time.monotonic()
+        
+        names = sorted(self.repo_manager.iter_package_names())
+        for package_name in names:
+            if cursor and package_name < cursor[0]:
+                continue
+            
+            files = self.repo_manager.list_package_dir(package_name)
+            if not files:
+                continue
+            with package_lock(self.packages_dir, package_name):
+                records = self.repo_manager.catalog.ensure_records(package_name, files)
+            
+            for filename in sorted(records):
+                if cursor and (package_name, filename) <= cursor:
+                    continue
+                if stop_event is not None and stop_event.is_set():
+                    self.save_state(state)
+                    return state
+                
+                status, problem = self.check_file(package_name, filename, records[filename], stop_event)
+                if status == 'stopped':
+                    self.save_state(state)
+                    return state
+                if status == 'ok':
+                    current['files'] += 1
+                    current['bytes'] += records[filename]['size']
+                    state['totals']['files_checked'] += 1
+                    state['totals']['bytes_checked'] += records[filename]['size']
+                elif status == 'corrupt' and self._record_corrupt(state, problem):
+                    current['corrupt'] += 1
+                else:
+                    current['skipped'] += 1
+                current['cursor'] = [package_name, filename]
+                
+                if status == 'corrupt' or time.monotonic() - last_checkpoint > CHECKPOINT_INTERVAL:
+                    self.save_state(state)
+                    last_checkpoint = time.monotonic()
+        
+        current['finished_at'] = time.time()
+        current.pop('cursor', None)
+        state['last_pass'] = current
+        state['current_pass'] = None
+        self.save_state(state)
+        logger.info(f"Integrity scrub finished: {current['files']} files, {current['corrupt']} corrupt")
+        return state
+
+
+class ScrubberRunner:
+    """在后台线程中周期性运行巡检
+
+    每个 gunicorn 工作进程都会启动该线程，但只有取得 .repo/scrub.lock 的进程执行巡检；
+    该进程退出（例如被 max_requests 回收）后由其他进程接手并从断点继续。
+    """
+    
+    # 未取得锁时重试的间隔（秒）
+    RETRY_INTERVAL = 60
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+    
+    def start(self, repo_manager, bytes_per_second: float, idle_priority: bool = True,
+              interval: float = 7 * 86400) -> bool:
+        """启动后台线程，已启动时返回False"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(repo_manager, bytes_per_second, idle_priority, interval),
+                name='scrubber', daemon=True
+            )
+            self._thread.start()
+            return True
+    
+    def stop(self):
+        self._stop.set()
+    
+    @staticmethod
+    def request_pass(packages_dir) -> None:
+        """要求尽快开始新一轮巡检（由持有锁的进程执行）"""
+        (get_state_dir(packages_dir) / 'scrub.request').touch()
+    
+    @staticmethod
+    def get_status(repo_manager) -> Dict[str, Any]:
+        state = IntegrityScrubber(repo_manager).load_state()
+        state['requested'] = (get_state_dir(repo_manager.packages_dir) / 'scrub.request').exists()
+        return state
+    
+    def _run(self, repo_manager, bytes_per_second: float, idle_priority: bool, interval: float):
+        if idle_priority:
+            set_idle_priority()
+        
+        state_dir = get_state_dir(repo_manager.packages_dir)
+        while not self._stop.is_set():
+            with open(state_dir / 'scrub.lock', 'a') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    self._stop.wait(self.RETRY_INTERVAL)
+                    continue
+                try:
+                    self._scrub_loop(repo_manager, bytes_per_second, interval, state_dir)
+                except Exception as e:
+                    logger.error(f"Integrity scrub failed: {e}")
+                    self._stop.wait(self.RETRY_INTERVAL)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _scrub_loop(self, repo_manager, bytes_per_second: float, interval: float, state_dir: Path):
+        scrubber = IntegrityScrubber(repo_manager, bytes_per_second)
+        request_path = state_dir / 'scrub.request'
+        while not self._stop.is_set():
+            state = scrubber.load_state()
+            requested = request_path.exists()
+            if state['current_pass'] is None and not requested and time.time() < state.get('next_pass_at', 0):
+                self._stop.wait(min(self.RETRY_INTERVAL, state['next_pass_at'] - time.time()))
+                continue
+            
+            if requested:
+                request_path.unlink(missing_ok=True)
+            state = scrubber.run_pass(self._stop)
+            if state['current_pass'] is None:
+                state['next_pass_at'] = time.time() + interval
+                scrubber.save_state(state)
+
+
+# 进程内共享的后台任务
+scrubber_runner = ScrubberRunner()
@@ -0,0 +1,210 @@
+"""
+Simple Pages - PyPI Simple Repository 页面的生成与磁盘缓存
+
+页面（PEP 503 HTML 和 PEP 691 JSON）在包内容变化后生成一次，
+同时写出 gzip / brotli 预压缩变体，之后的请求直接读取缓存文件。
+"""
+
+import html
+import json
+import shutil
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from models.compression import write_with_variants
+from models.locks import package_lock
+
+logger = logging.getLogger(__name__)
+
+# Simple API 内容类型
+HTML_CONTENT_TYPE = 'text/html; charset=utf-8'
+JSON_CONTENT_TYPE = 'application/vnd.pypi.simple.v1+json'
+PAGE_FORMATS = {
+    'html': ('index.html', HTML_CONTENT_TYPE),
+    'json': ('index.json', JSON_CONTENT_TYPE),
+}
+
+# 根索引页在缓存目录中的名称（包名不能以点开头，不会冲突）
+ROOT_PAGE = '.root'
+
+
+def render_root_html(package_names: List[str]) -> str:
+    """生成仓库索引 HTML（PEP 503）"""
+    html_content = """<!DOCTYPE html>
+<html>
+<head>
+    <meta name="pypi:repository-version" content="1.0">
+    <title>Simple Package Index</title>
+</head>
+<body>
+    <h1>Simple Package Index</h1>
+    <ul>
+"""
+    
+    for package_name in package_names:
+        name = html.escape(package_name)
+        html_content += f'        <li><a href="{name}/">{name}</a></li>\n'
+    
+    html_content += """    </ul>
+</body>
+</html>"""
+    return html_content
+
+
+def render_root_json(package_names: List[str]) -> str:
+    """生成仓库索引 JSON（PEP 691）"""
+    return json.dumps({
+        'meta': {'api-version': '1.0'},
+        'projects': [{'name': name} for name in package_names],
+    })
+
+
+def _file_url(package_name: str, file_name: str) -> str:
+    """相对于 /simple/<package>/ 的下载链接，缓存页面因此与访问域名无关"""
+    return f"../../{package_name}/{file_name}"
+
+
+def render_project_html(package_name: str, records: List[Dict[str, Any]]) -> str:
+    """生成包索引 HTML（PEP 503），records 为目录记录"""
+    name = html.escape(package_name)
+    html_content = f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta name="pypi:repository-version" content="1.0">
+    <title>Links for {name}</title>
+</head>
+<body>
+    <h1>Links for {name}</h1>
+"""
+    
+    for record in records:
+        file_name = record['filename']
+        download_url = _file_url(package_name, file_name)
+        if record.get('sha256'):
+            download_url += f"#sha256={record['sha256']}"
+        attributes = f' href="{html.escape(download_url)}"'
+        if record.get('requires_python'):
+            attributes += f' data-requires-python="{html.escape(record["requires_python"])}"'
+        if record.get('yanked') is not None:
+            attributes += f' data-yanked="{html.escape(record["yanked"])}"'
+        html_content += f'    <a{attributes}>{html.escape(file_name)}</a><br/>\n'
+    
+    html_content += """</body>
+</html>"""
+    return html_content
+
+
+def render_project_json(package_name: str, records: List[Dict[str, Any]]) -> str:
+    """生成包索引 JSON（PEP 691），records 为目录记录"""
+    files = []
+    for record in records:
+        entry = {
+            'filename': record['filename'],
+            'url': _file_url(package_name, record['filename']),
+            'hashes': {'sha256': record['sha256']} if record.get('sha256') else {},
+            'size': record.get('size'),
+        }
+        if record.get('requires_python'):
+            entry['requires-python'] = record['requires_python']
+        if record.get('yanked') is not None:
+            # PEP 691：有原因时为原因字符串，否则为 true
+            entry['yanked'] = record['yanked'] or True
+        files.append(entry)
+    
+    return json.dumps({
+        'meta': {'api-version': '1.0'},
+        'name': package_name,
+        'files': files,
+    })
+
+
+class SimplePageCache:
+    """Simple 页面磁盘缓存
+
+    缓存文件位于 <packages_dir>/.cache/simple/<package>/<签名>.index.html，
+    签名由存储后端提供（本地存储为包目录的 mtime_ns）：包内文件增删后签名自动变化，
+    覆盖同名文件时由写入方调用 invalidate() 显式失效。
+    """
+    
+    def __init__(self, packages_dir: Path, storage):
+        self.packages_dir = Path(packages_dir)
+        self.storage = storage
+        self.cache_dir = self.packages_dir / '.cache' / 'simple'
+        # 提前创建缓存目录，避免首次写缓存时改变仓库目录签名
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+    
+    def _page_path(self, page_name: str, signature: str, page_format: str) -> Path:
+        file_name, _ = PAGE_FORMATS[page_format]
+        return self.cache_dir / page_name / f"{signature}.{file_name}"
+    
+    def _store(self, page_name: str, signature: str, pages: dict) -> None:
+        """写出所有格式及其压缩变体，并清理旧签名的缓存"""
+        page_dir = self.cache_dir / page_name
+        for page_format, content in pages.items():
+            write_with_variants(self._page_path(page_name, signature, page_format),
+                                content.encode('utf-8'))
+        
+        for stale in page_dir.iterdir():
+            if not stale.name.startswith(f"{signature}."):
+                try:
+                    stale.unlink()
+                except FileNotFoundError:
+                    pass
+        
+        logger.info(f"Regenerated simple pages for {page_name} ({signature})")
+    
+    def get_root_page(self, repo_manager, page_format: str) -> Path:
+        """返回仓库索引页缓存文件路径，必要时重新生成"""
+        signature = str(self.storage.signature())
+        path = self._page_path(ROOT_PAGE, signature, page_format)
+        if path.exists():
+            return path
+        
+        package_names = [
+            name for name in repo_manager.iter_package_names()
+            if repo_manager.list_package_dir(name)
+        ]
+        self._store(ROOT_PAGE, signature, {
+            'html': render_root_html(package_names),
+            'json': render_root_json(package_names),
+        })
+        return path
+    
+    def get_project_page(self, repo_manager, package_name: str, page_format: str) -> Optional[Path]:
+        """返回包索引页缓存文件路径，包不存在时返回None"""
+        if package_name.startswith('.'):
+            return None
+        
+        signature = self.storage.package_signature(package_name)
+        if signature is None:
+            return None
+        signature = str(signature)
+        
+        path = self._page_path(package_name, signature, page_format)
+        if path.exists():
+            return path
+        
+        # 读锁：生成期间包内容不会被发布或删除修改
+        with package_lock(self.packages_dir, package_name):
+            files = repo_manager.list_package_dir(package_name)
+            if not files:
+                return None
+            
+            # 只对尚无记录的文件计算哈希（例如直接复制进包目录的旧文件）
+            records = repo_manager.catalog.ensure_records(package_name, files)
+            ordered = [records[name] for name in files if name in records]
+            self._store(package_name, signature, {
+                'html': render_project_html(package_name, ordered),
+                'json': render_project_json(package_name, ordered),
+            })
+        return path
+    
+    def invalidate(self, package_name: Optional[str] = None) -> None:
+        """删除包页面缓存和仓库索引页缓存"""
+        targets = [ROOT_PAGE]
+        if package_name:
+            targets.append(package_name)
+        
+        for target in targets:
+            shutil.rmtree(self.cache_dir / target, ignore_errors=True)
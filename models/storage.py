@@ -0,0 +1,762 @@
+"""
+Storage - 包文件的存储后端
+
+仓库中所有对包文件本身的操作（列出、读取、发布、删除）都通过存储后端进行，
+记录、索引页、变更日志等状态仍然保存在每个节点本地的 <packages_dir>/.repo/ 中。
+
+- LocalStorage: 默认后端，包文件直接保存在 <packages_dir>/<包名>/ 目录中
+- RemoteStorage: 包文件保存在 S3 兼容的对象存储中，多个无状态节点共享同一个存储
+  - 文件列表保存在本地索引（.repo/storage/index/）中，请求不访问对象存储；
+    由 StorageSyncRunner 定期与对象存储同步，发现其他节点的变更后失效对应包的缓存
+  - 读取时先查本地磁盘缓存（.repo/storage/cache/），未命中时下载到缓存后再发送，
+    缓存总大小超过上限时按最近访问时间淘汰；只读取部分内容（如 wheel 中央目录）时使用 Range 请求
+  - 发布时从暂存文件分块上传（multipart），每次只有一个分块在内存中，上传完成后文件直接放入缓存
+  - yanked 标记是用户设置的状态，不能只保存在节点本地的记录中：每个包一个旁路对象
+    （<prefix>.yanked/<包名>.json），同步时按 ETag 发现其他节点的修改并写入本节点的记录
+
+对象存储后端需要安装 boto3，凭据使用 AWS SDK 的标准配置（环境变量、配置文件或实例角色）。
+"""
+
+import io
+import os
+import json
+import time
+import shutil
+import fcntl
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from models.compression import atomic_write
+from models.events import get_state_dir
+from models.locks import move_to_trash, package_lock
+
+logger = logging.getLogger(__name__)
+
+# 分块上传的默认分块大小（S3 要求除最后一块外不小于 5MB）
+DEFAULT_PART_SIZE = 64 * 1024 * 1024
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+# 下载到本地缓存时每次读取的字节数
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 范围读取的缓冲区大小（读取 zip 中央目录等小块数据）
+RANGE_BUFFER_SIZE = 64 * 1024
+
+# 对象存储中保存 yanked 标记的前缀（以 . 开头，不会被当作包列出）
+YANKED_PREFIX = '.yanked/'
+
+
+class ObjectInfo:
+    """存储中一个文件的元数据"""
+    
+    __slots__ = ('size', 'mtime_ns', 'etag', 'ino')
+    
+    def __init__(self, size: int, mtime_ns: int, etag: Optional[str] = None, ino: int = 0):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.etag = etag
+        self.ino = ino
+    
+    @property
+    def mtime(self) -> float:
+        return self.mtime_ns / 1e9
+    
+    @property
+    def generation(self) -> tuple:
+        """文件内容的标识：本地文件为 (inode, mtime, size)，对象为 (ETag, mtime, size)"""
+        return (self.etag or self.ino, self.mtime_ns, self.size)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {'size': self.size, 'mtime_ns': self.mtime_ns, 'etag': self.etag}
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ObjectInfo':
+        return cls(data['size'], data['mtime_ns'], data.get('etag'))
+
+
+def is_valid_name(name: str) -> bool:
+    """包名和文件名不能为空、不能包含路径分隔符，也不能以 . 开头（.repo 等内部状态目录）"""
+    return bool(name) and not name.startswith('.') and '/' not in name
+
+
+class LocalStorage:
+    """包文件保存在 <packages_dir>/<包名>/ 目录中"""
+    
+    kind = 'local'
+    is_local = True
+    
+    def __init__(self, packages_dir):
+        self.packages_dir = Path(packages_dir)
+    
+    def list_packages(self) -> List[str]:
+        """所有包名（目录名），按名称排序"""
+        try:
+            with os.scandir(self.packages_dir) as entries:
+                return sorted(entry.name for entry in entries
+                              if entry.is_dir() and not entry.name.startswith('.'))
+        except FileNotFoundError:
+            return []
+    
+    def list_files(self, package_name: str) -> List[str]:
+        if not is_valid_name(package_name):
+            return []
+        try:
+            with os.scandir(self.packages_dir / package_name) as entries:
+                return [entry.name for entry in entries if entry.is_file()]
+        except (FileNotFoundError, NotADirectoryError):
+            return []
+    
+    def exists(self, package_name: str) -> bool:
+        return is_valid_name(package_name) and (self.packages_dir / package_name).is_dir()
+    
+    def signature(self) -> int:
+        """包增删时变化的签名（仓库目录的 mtime）"""
+        return self.packages_dir.stat().st_mtime_ns
+    
+    def package_signature(self, package_name: str) -> Optional[int]:
+        """包内文件增删时变化的签名（包目录的 mtime），包不存在时返回None"""
+        if not is_valid_name(package_name):
+            return None
+        try:
+            return (self.packages_dir / package_name).stat().st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+    
+    def stat(self, package_name: str, filename: str) -> Optional[ObjectInfo]:
+        if not (is_valid_name(package_name) and is_valid_name(filename)):
+            return None
+        try:
+            stat = os.stat(self.packages_dir / package_name / filename)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return ObjectInfo(stat.st_size, stat.st_mtime_ns, ino=stat.st_ino)
+    
+    def local_path(self, package_name: str, filename: str) -> Path:
+        """文件在本地磁盘上的路径（可以直接 sendfile）"""
+        self._check_names(package_name, filename)
+        return self.packages_dir / package_name / filename
+    
+    def open(self, package_name: str, filename: str):
+        """以只读方式打开文件（可 seek）"""
+        self._check_names(package_name, filename)
+        return open(self.packages_dir / package_name / filename, 'rb')
+    
+    @staticmethod
+    def _check_names(package_name: str, filename: str) -> None:
+        if not (is_valid_name(package_name) and is_valid_name(filename)):
+            raise FileNotFoundError(f"{package_name}/{filename}")
+    
+    def publish(self, package_name: str, source: Path) -> ObjectInfo:
+        """把暂存文件原子地移动到包目录（调用方持有包的写锁），返回文件元数据"""
+        package_dir = self.packages_dir / package_name
+        package_dir.mkdir(exist_ok=True)
+        dest_path = package_dir / source.name
+        # 移动不改变 mtime
+        os.replace(source, dest_path)
+        return self.stat(package_name, source.name)
+    
+    def delete(self, package_name: str, filename: str) -> bool:
+        try:
+            (self.packages_dir / package_name / filename).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+    
+    def delete_package(self, package_name: str) -> bool:
+        """删除整个包：目录移入回收站后在后台清除"""
+        package_dir = self.packages_dir / package_name
+        if not package_dir.is_dir():
+            return False
+        move_to_trash(self.packages_dir, package_dir)
+        return True
+    
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': self.kind}
+
+
+class _RangeReader(io.RawIOBase):
+    """按需发送 Range 请求的只读文件对象，供 zipfile 等只读取部分内容的场景使用"""
+    
+    def __init__(self, store, package_name: str, filename: str, size: int):
+        self.store = store
+        self.package_name = package_name
+        self.name = f"{package_name}/{filename}"
+        self.filename = filename
+        self.size = size
+        self.position = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self.position
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise OSError(f"Negative seek position {offset}")
+        self.position = offset
+        return self.position
+    
+    def readinto(self, buffer) -> int:
+        length = min(len(buffer), self.size - self.position)
+        if length <= 0:
+            return 0
+        data = self.store.read_range(self.package_name, self.filename, self.position, length)
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+class S3ObjectStore:
+    """S3 兼容对象存储的访问（对象键为 <prefix><包名>/<文件名>）"""
+    
+    def __init__(self, bucket: str, prefix: str = '', endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, part_size: int = DEFAULT_PART_SIZE):
+        try:
+            import boto3
+            from botocore.config import Config as BotoConfig
+        except ImportError:
+            raise RuntimeError('STORAGE_BACKEND=s3 requires boto3 (pip install boto3)')
+        
+        if not bucket:
+            raise RuntimeError('S3_BUCKET is required for STORAGE_BACKEND=s3')
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.client = boto3.client(
+            's3', endpoint_url=endpoint_url or None, region_name=region or None,
+            config=BotoConfig(retries={'max_attempts': 5, 'mode': 'standard'}, max_pool_connections=32),
+        )
+    
+    def _key(self, package_name: str, filename: str) -> str:
+        return f"{self.prefix}{package_name}/{filename}"
+    
+    @staticmethod
+    def _info(obj: Dict[str, Any]) -> ObjectInfo:
+        return ObjectInfo(obj['Size'], int(obj['LastModified'].timestamp() * 1e9), obj['ETag'].strip('"'))
+    
+    def _list(self, prefix: str) -> Dict[str, Dict[str, ObjectInfo]]:
+        """列出前缀下的对象，返回 {包名: {文件名: 元数据}}"""
+        packages: Dict[str, Dict[str, ObjectInfo]] = {}
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                parts = obj['Key'][len(self.prefix):].split('/')
+                # 只接受 <包名>/<文件名> 形式的键，忽略其他对象
+                if len(parts) != 2 or not parts[0] or not parts[1] or parts[0].startswith('.'):
+                    continue
+                packages.setdefault(parts[0], {})[parts[1]] = self._info(obj)
+        return packages
+    
+    def list_all(self) -> Dict[str, Dict[str, ObjectInfo]]:
+        return self._list(self.prefix)
+    
+    def list_package(self, package_name: str) -> Dict[str, ObjectInfo]:
+        return self._list(f"{self.prefix}{package_name}/").get(package_name, {})
+    
+    def read_range(self, package_name: str, filename: str, start: int, length: int) -> bytes:
+        response = self.client.get_object(Bucket=self.bucket, Key=self._key(package_name, filename),
+                                          Range=f"bytes={start}-{start + length - 1}")
+        return response['Body'].read()
+    
+    def download(self, package_name: str, filename: str, dest) -> int:
+        """流式下载到已打开的文件，返回字节数"""
+        response = self.client.get_object(Bucket=self.bucket, Key=self._key(package_name, filename))
+        written = 0
+        for chunk in response['Body'].iter_chunks(DOWNLOAD_CHUNK_SIZE):
+            dest.write(chunk)
+            written += len(chunk)
+        return written
+    
+    def upload(self, package_name: str, source: Path) -> ObjectInfo:
+        """上传文件：大于一个分块时使用分块上传，每次只读取一个分块"""
+        key = self._key(package_name, source.name)
+        with open(source, 'rb') as f:
+            if os.fstat(f.fileno()).st_size <= self.part_size:
+                self.client.put_object(Bucket=self.bucket, Key=key, Body=f)
+            else:
+                self._multipart_upload(key, f)
+        # 元数据取自列表接口，与同步时看到的完全一致
+        info = self.list_package(package_name).get(source.name)
+        if info is None:
+            raise RuntimeError(f"Uploaded object is not listed: {key}")
+        return info
+    
+    def _multipart_upload(self, key: str, f) -> None:
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key)['UploadId']
+        try:
+            parts = []
+            while True:
+                data = f.read(self.part_size)
+                if not data:
+                    break
+                response = self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                                   PartNumber=len(parts) + 1, Body=data)
+                parts.append({'ETag': response['ETag'], 'PartNumber': len(parts) + 1})
+            self.client.complete_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                                  MultipartUpload={'Parts': parts})
+        except Exception:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+    
+    def _yanked_key(self, package_name: str) -> str:
+        return f"{self.prefix}{YANKED_PREFIX}{package_name}.json"
+    
+    def list_yanked(self) -> Dict[str, str]:
+        """所有 yanked 标记对象，返回 {包名: ETag}"""
+        tags = {}
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{self.prefix}{YANKED_PREFIX}"):
+            for obj in page.get('Contents', []):
+                name = obj['Key'][len(self.prefix) + len(YANKED_PREFIX):]
+                if name.endswith('.json') and '/' not in name:
+                    tags[name[:-len('.json')]] = obj['ETag'].strip('"')
+        return tags
+    
+    def get_yanked(self, package_name: str) -> Tuple[Dict[str, str], Optional[str]]:
+        """读取一个包的 yanked 标记，返回 ({文件名: 原因}, ETag)，没有标记时为 ({}, None)"""
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._yanked_key(package_name))
+        except self.client.exceptions.NoSuchKey:
+            return {}, None
+        return json.loads(response['Body'].read()), response['ETag'].strip('"')
+    
+    def put_yanked(self, package_name: str, yanked: Dict[str, str]) -> Optional[str]:
+        """写入一个包的 yanked 标记（为空时删除对象），返回新的 ETag"""
+        key = self._yanked_key(package_name)
+        if not yanked:
+            self.client.delete_object(Bucket=self.bucket, Key=key)
+            return None
+        response = self.client.put_object(Bucket=self.bucket, Key=key, ContentType='application/json',
+                                          Body=json.dumps(yanked, sort_keys=True).encode('utf-8'))
+        return response['ETag'].strip('"')
+    
+    def delete(self, package_name: str, filenames: List[str]) -> None:
+        keys = [{'Key': self._key(package_name, filename)} for filename in filenames]
+        # 每次请求最多删除 1000 个对象
+        for start in range(0, len(keys), 1000):
+            self.client.delete_objects(Bucket=self.bucket, Delete={'Objects': keys[start:start + 1000], 'Quiet': True})
+
+
+class RemoteStorage:
+    """对象存储 + 本地文件列表索引 + 本地磁盘读缓存"""
+    
+    kind = 's3'
+    is_local = False
+    
+    def __init__(self, packages_dir, store: S3ObjectStore, cache_max_bytes: int):
+        self.packages_dir = Path(packages_dir)
+        self.store = store
+        self.cache_max_bytes = cache_max_bytes
+        state_dir = get_state_dir(packages_dir) / 'storage'
+        self.index_dir = state_dir / 'index'
+        self.cache_dir = state_dir / 'cache'
+        self.yanked_dir = state_dir / 'yanked'
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.yanked_dir.mkdir(parents=True, exist_ok=True)
+        self.synced_marker = state_dir / 'synced'
+        self.sync_lock_path = state_dir / 'sync.lock'
+        
+        self._lock = threading.Lock()
+        self._cached_bytes: Optional[int] = None
+        self._counters = {'hits': 0, 'misses': 0, 'fetched_bytes': 0, 'evictions': 0, 'range_reads': 0}
+    
+    # 文件列表索引：每个包一个 JSON 文档 {文件名: 元数据}
+    
+    def _index_path(self, package_name: str) -> Path:
+        return self.index_dir / f"{package_name}.json"
+    
+    def _read_index(self, package_name: str) -> Dict[str, ObjectInfo]:
+        try:
+            with open(self._index_path(package_name), 'r', encoding='utf-8') as f:
+                return {name: ObjectInfo.from_dict(data) for name, data in json.load(f).items()}
+        except (FileNotFoundError, ValueError):
+            return {}
+    
+    def _write_index(self, package_name: str, entries: Dict[str, ObjectInfo]) -> None:
+        if not entries:
+            self._index_path(package_name).unlink(missing_ok=True)
+            return
+        atomic_write(self._index_path(package_name), json.dumps(
+            {name: info.to_dict() for name, info in entries.items()}, sort_keys=True).encode('utf-8'))
+    
+    def _ensure_synced(self) -> None:
+        # 首次使用（例如新节点上的命令行工具）时先从对象存储建立索引
+        if not self.synced_marker.exists():
+            self.sync()
+    
+    def list_packages(self) -> List[str]:
+        self._ensure_synced()
+        return sorted(path.name[:-len('.json')] for path in self.index_dir.iterdir()
+                      if path.name.endswith('.json') and not path.name.startswith('.'))
+    
+    def list_files(self, package_name: str) -> List[str]:
+        self._ensure_synced()
+        return list(self._read_index(package_name))
+    
+    def exists(self, package_name: str) -> bool:
+        self._ensure_synced()
+        return self._index_path(package_name).exists()
+    
+    def signature(self) -> int:
+        return self.index_dir.stat().st_mtime_ns
+    
+    def package_signature(self, package_name: str) -> Optional[int]:
+        # 索引文件每次更新都原子替换，mtime 随之变化
+        self._ensure_synced()
+        try:
+            return self._index_path(package_name).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    def stat(self, package_name: str, filename: str) -> Optional[ObjectInfo]:
+        self._ensure_synced()
+        return self._read_index(package_name).get(filename)
+    
+    # 本地磁盘缓存：文件的 mtime 设为对象的修改时间用于校验，atime 为最近访问时间用于 LRU 淘汰
+    
+    def _cache_path(self, package_name: str, filename: str) -> Path:
+        return self.cache_dir / package_name / filename
+    
+    def _cached(self, package_name: str, filename: str, info: ObjectInfo) -> Optional[Path]:
+        path = self._cache_path(package_name, filename)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        if stat.st_size != info.size or stat.st_mtime_ns != info.mtime_ns:
+            return None
+        os.utime(path, ns=(time.time_ns(), info.mtime_ns))
+        return path
+    
+    def local_path(self, package_name: str, filename: str) -> Path:
+        """返回文件在本地缓存中的路径，未缓存时先从对象存储下载"""
+        info = self.stat(package_name, filename)
+        if info is None:
+            raise FileNotFoundError(f"{package_name}/{filename}")
+        path = self._cached(package_name, filename, info)
+        if path is not None:
+            with self._lock:
+                self._counters['hits'] += 1
+            return path
+        
+        path = self._cache_path(package_name, filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.parent / f".{filename}.{os.getpid()}.{threading.get_ident()}.partial"
+        try:
+            with open(partial, 'wb') as f:
+                size = self.store.download(package_name, filename, f)
+            if size != info.size:
+                raise OSError(f"Downloaded {size} bytes for {package_name}/{filename}, expected {info.size}")
+            os.utime(partial, ns=(time.time_ns(), info.mtime_ns))
+            os.replace(partial, path)
+        finally:
+            partial.unlink(missing_ok=True)
+        
+        with self._lock:
+            self._counters['misses'] += 1
+            self._counters['fetched_bytes'] += size
+        self._account(size)
+        return path
+    
+    def open(self, package_name: str, filename: str):
+        """已缓存时打开本地文件，否则返回按需发送 Range 请求的文件对象（不下载整个文件）"""
+        info = self.stat(package_name, filename)
+        if info is None:
+            raise FileNotFoundError(f"{package_name}/{filename}")
+        path = self._cached(package_name, filename, info)
+        if path is not None:
+            return open(path, 'rb')
+        with self._lock:
+            self._counters['range_reads'] += 1
+        return io.BufferedReader(_RangeReader(self.store, package_name, filename, info.size), RANGE_BUFFER_SIZE)
+    
+    def _account(self, added: int) -> None:
+        """累计缓存大小，估计值超过上限时扫描缓存目录并淘汰最久未访问的文件"""
+        with self._lock:
+            if self._cached_bytes is not None:
+                self._cached_bytes += added
+                if self._cached_bytes <= self.cache_max_bytes:
+                    return
+        self.evict()
+    
+    def evict(self) -> None:
+        entries = []
+        for path in self.cache_dir.glob('*/*'):
+            if path.name.startswith('.'):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+        
+        total = sum(size for _, size, _ in entries)
+        # 淘汰到上限的 90%，避免每次下载都扫描缓存目录
+        target = self.cache_max_bytes * 0.9 if total > self.cache_max_bytes else total
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._cached_bytes = total
+            self._counters['evictions'] += evicted
+    
+    # 写入（调用方持有包的写锁）
+    
+    def publish(self, package_name: str, source: Path) -> ObjectInfo:
+        """上传暂存文件，更新本地索引，文件本身移入缓存"""
+        info = self.store.upload(package_name, source)
+        entries = self._read_index(package_name)
+        entries[source.name] = info
+        self._write_index(package_name, entries)
+        
+        path = self._cache_path(package_name, source.name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.utime(source, ns=(time.time_ns(), info.mtime_ns))
+        os.replace(source, path)
+        self._account(info.size)
+        return info
+    
+    def delete(self, package_name: str, filename: str) -> bool:
+        entries = self._read_index(package_name)
+        if entries.pop(filename, None) is None:
+            return False
+        self.store.delete(package_name, [filename])
+        self._write_index(package_name, entries)
+        self._cache_path(package_name, filename).unlink(missing_ok=True)
+        return True
+    
+    def delete_package(self, package_name: str) -> bool:
+        entries = self._read_index(package_name)
+        if not entries:
+            return False
+        self.store.delete(package_name, list(entries))
+        self._write_index(package_name, {})
+        shutil.rmtree(self.cache_dir / package_name, ignore_errors=True)
+        return True
+    
+    # yanked 标记：对象存储中的旁路对象为准，本地保存一份副本及其 ETag
+    
+    def _yanked_path(self, package_name: str) -> Path:
+        return self.yanked_dir / f"{package_name}.json"
+    
+    def _read_yanked(self, package_name: str) -> Dict[str, Any]:
+        try:
+            with open(self._yanked_path(package_name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {'etag': None, 'files': {}}
+    
+    def _write_yanked(self, package_name: str, yanked: Dict[str, str], etag: Optional[str]) -> None:
+        if etag is None:
+            self._yanked_path(package_name).unlink(missing_ok=True)
+            return
+        atomic_write(self._yanked_path(package_name),
+                     json.dumps({'etag': etag, 'files': yanked}, sort_keys=True).encode('utf-8'))
+    
+    def yanked(self, package_name: str) -> Dict[str, str]:
+        """本节点已同步的 yanked 标记 {文件名: 原因}"""
+        return self._read_yanked(package_name)['files']
+    
+    def set_yanked(self, package_name: str, filename: str, reason: Optional[str]) -> None:
+        """标记或取消标记文件为 yanked，写入对象存储供其他节点同步（调用方持有包的写锁）
+
+        先读取对象存储中的最新标记再修改，不会丢失其他节点此前的修改；
+        不同节点同时修改同一个包时以最后一次写入为准。
+        """
+        yanked, _ = self.store.get_yanked(package_name)
+        if reason is None:
+            yanked.pop(filename, None)
+        else:
+            yanked[filename] = reason
+        self._write_yanked(package_name, yanked, self.store.put_yanked(package_name, yanked))
+    
+    def _sync_yanked(self) -> List[str]:
+        """同步 yanked 标记，返回标记发生变化的包名"""
+        remote = self.store.list_yanked()
+        known = {path.name[:-len('.json')] for path in self.yanked_dir.iterdir() if path.name.endswith('.json')}
+        
+        changed = []
+        for package_name in sorted(known | set(remote)):
+            if remote.get(package_name) == self._read_yanked(package_name)['etag']:
+                continue
+            yanked, etag = self.store.get_yanked(package_name)
+            self._write_yanked(package_name, yanked, etag)
+            changed.append(package_name)
+        return changed
+    
+    def sync(self) -> List[str]:
+        """与对象存储同步文件列表和 yanked 标记，返回发生变化的包名（包括其他节点的上传、删除和 yank）"""
+        listing = self.store.list_all()
+        known = {path.name[:-len('.json')] for path in self.index_dir.iterdir() if path.name.endswith('.json')}
+        
+        changed = []
+        for package_name in sorted(known | set(listing)):
+            entries = listing.get(package_name, {})
+            if _same_entries(entries, self._read_index(package_name)):
+                continue
+            # 在写锁内重新列出该包，避免覆盖本节点刚刚完成的发布或删除
+            with package_lock(self.packages_dir, package_name, exclusive=True):
+                entries = self.store.list_package(package_name)
+                if _same_entries(entries, self._read_index(package_name)):
+                    continue
+                self._write_index(package_name, entries)
+                if not entries:
+                    shutil.rmtree(self.cache_dir / package_name, ignore_errors=True)
+            changed.append(package_name)
+        
+        changed = sorted(set(changed) | set(self._sync_yanked()))
+        self.synced_marker.touch()
+        return changed
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        cached_files, cached_bytes = 0, 0
+        for path in self.cache_dir.glob('*/*'):
+            if not path.name.startswith('.'):
+                try:
+                    cached_bytes += path.stat().st_size
+                    cached_files += 1
+                except FileNotFoundError:
+                    pass
+        try:
+            last_sync = self.synced_marker.stat().st_mtime
+        except FileNotFoundError:
+            last_sync = None
+        return {
+            'backend': self.kind,
+            'bucket': self.store.bucket,
+            'last_sync': last_sync,
+            'cache': {**counters, 'files': cached_files, 'bytes': cached_bytes, 'max_bytes': self.cache_max_bytes},
+        }
+
+
+def _same_entries(a: Dict[str, ObjectInfo], b: Dict[str, ObjectInfo]) -> bool:
+    return a.keys() == b.keys() and all(a[name].generation == b[name].generation for name in a)
+
+
+_storages: Dict[str, Any] = {}
+_storages_lock = threading.Lock()
+
+
+def get_storage(packages_dir):
+    """获取进程内共享的存储后端（由 STORAGE_BACKEND 等环境变量决定）"""
+    key = str(Path(packages_dir).resolve())
+    with _storages_lock:
+        storage = _storages.get(key)
+        if storage is None:
+            storage = _create_storage(Path(packages_dir))
+            _storages[key] = storage
+        return storage
+
+
+def _create_storage(packages_dir: Path):
+    backend = (os.environ.get('STORAGE_BACKEND') or 'local').lower()
+    if backend == 'local':
+        return LocalStorage(packages_dir)
+    if backend == 's3':
+        store = S3ObjectStore(
+            os.environ.get('S3_BUCKET', ''),
+            prefix=os.environ.get('S3_PREFIX', ''),
+            endpoint_url=os.environ.get('S3_ENDPOINT_URL'),
+            region=os.environ.get('S3_REGION'),
+            part_size=int(os.environ.get('S3_PART_SIZE') or DEFAULT_PART_SIZE),
+        )
+        return RemoteStorage(packages_dir, store,
+                             int(os.environ.get('STORAGE_CACHE_MAX_BYTES') or 10 * 1024 * 1024 * 1024))
+    raise RuntimeError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+class StorageSyncRunner:
+    """在后台线程中定期同步对象存储的文件列表
+
+    每个 gunicorn 工作进程都会启动该线程，但每个节点只有取得 .repo/storage/sync.lock 的进程执行同步；
+    发现变化的包通过 RepositoryManager.invalidate() 失效缓存并记录变更事件，本节点的其他进程随之更新。
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+    
+    def start(self, repo_manager, interval: float = 30) -> bool:
+        """启动后台线程（本地存储不需要同步），已启动时返回False"""
+        if repo_manager.storage.is_local:
+            return False
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(repo_manager, interval),
+                                            name='storage-sync', daemon=True)
+            self._thread.start()
+            return True
+    
+    def stop(self):
+        self._stop.set()
+    
+    def _run(self, repo_manager, interval: float):
+        storage = repo_manager.storage
+        while not self._stop.is_set():
+            with open(storage.sync_lock_path, 'a') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    self._stop.wait(interval)
+                    continue
+                try:
+                    while not self._stop.is_set():
+                        sync_storage(repo_manager)
+                        self._stop.wait(interval)
+                except Exception as e:
+                    logger.error(f"Storage sync failed: {e}")
+                    self._stop.wait(interval)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def sync_storage(repo_manager) -> List[str]:
+    """同步一次文件列表并失效发生变化的包，返回这些包名
+
+    发生变化的包按对象存储中的 yanked 标记更新本节点的记录。
+    """
+    changed = repo_manager.storage.sync()
+    for package_name in changed:
+        apply_yanked(repo_manager, package_name)
+        repo_manager.invalidate(package_name, action='synced')
+    if changed:
+        logger.info(f"Storage sync: {len(changed)} packages changed")
+    return changed
+
+
+def apply_yanked(repo_manager, package_name: str) -> None:
+    """把存储后端同步来的 yanked 标记写入包的文件记录"""
+    with package_lock(repo_manager.packages_dir, package_name, exclusive=True):
+        files = repo_manager.list_package_dir(package_name)
+        if not files:
+            return
+        records = repo_manager.catalog.ensure_records(package_name, files)
+        yanked = repo_manager.storage.yanked(package_name)
+        updates = {filename: {'yanked': yanked.get(filename)} for filename in files
+                   if filename in records and records[filename].get('yanked') != yanked.get(filename)}
+        if updates:
+            repo_manager.catalog.update_records(package_name, updates)
+
+
+# 进程内共享的后台任务
+storage_sync_runner = StorageSyncRunner()
@@ -0,0 +1,282 @@
+"""
+Uploads - 可续传的分块上传
+
+客户端先创建上传会话（声明文件名和总大小），然后以任意顺序、可并发地
+PUT 字节区间（Content-Range），随时可以查询已接收的区间，全部接收后完成上传。
+
+会话位于 <packages_dir>/.incoming/<session_id>/：
+- upload.part  预先分配为声明大小的暂存文件，分块直接按偏移写入
+- upload.json  会话元数据（已接收区间等），在会话锁内原子更新
+
+sha256 在分块按顺序到达时随写入增量计算；完成上传时只需补算尚未计算的部分。
+计算状态保存在处理该会话的进程内存中，由其他进程完成时会在后台任务中重新计算。
+完成后的文件交给 process_upload 任务，与普通上传一样校验并原子地发布到包目录。
+"""
+
+import os
+import json
+import time
+import uuid
+import fcntl
+import shutil
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from models.compression import atomic_write
+from models.jobs import get_incoming_dir
+
+logger = logging.getLogger(__name__)
+
+META_NAME = 'upload.json'
+PART_NAME = 'upload.part'
+LOCK_NAME = 'upload.lock'
+
+# 写入分块时每次从请求流读取的大小
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """上传请求无效（客户端错误）"""
+    
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def merge_ranges(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """把 [start, end) 合并到有序、不重叠的区间列表中"""
+    merged = []
+    for range_start, range_end in sorted(ranges + [[start, end]]):
+        if merged and range_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], range_end)
+        else:
+            merged.append([range_start, range_end])
+    return merged
+
+
+def parse_content_range(header: Optional[str]) -> Tuple[int, int, Optional[int]]:
+    """解析 'bytes <start>-<end>/<total>'，返回 (start, end（不含）, total)"""
+    if not header or not header.startswith('bytes '):
+        raise UploadError('Content-Range header is required')
+    try:
+        range_part, total_part = header[len('bytes '):].split('/', 1)
+        start, end = (int(value) for value in range_part.split('-', 1))
+        total = None if total_part == '*' else int(total_part)
+    except ValueError:
+        raise UploadError(f'Invalid Content-Range: {header}')
+    if start < 0 or end < start:
+        raise UploadError(f'Invalid Content-Range: {header}')
+    return start, end + 1, total
+
+
+class _IncrementalHash:
+    """进程内的增量 sha256，offset 之前的内容已经计算"""
+    
+    def __init__(self):
+        self.digest = hashlib.sha256()
+        self.offset = 0
+        self.lock = threading.Lock()
+
+
+class UploadSessionStore:
+    """上传会话存储"""
+    
+    # 进程内的增量哈希状态 {session_id: _IncrementalHash}
+    _hashes: Dict[str, _IncrementalHash] = {}
+    _hashes_lock = threading.Lock()
+    
+    def __init__(self, packages_dir, max_size: int, ttl: float = 24 * 3600):
+        self.packages_dir = Path(packages_dir)
+        self.incoming_dir = get_incoming_dir(packages_dir)
+        self.max_size = max_size
+        self.ttl = ttl
+    
+    def _session_dir(self, session_id: str) -> Path:
+        # 会话 ID 由服务端生成（uuid4 hex），拒绝其他形式，避免路径穿越
+        if len(session_id) != 32 or not all(c in '0123456789abcdef' for c in session_id):
+            raise UploadError('Upload session not found', 404)
+        return self.incoming_dir / session_id
+    
+    @contextmanager
+    def _locked(self, session_id: str):
+        """会话锁（跨进程），返回会话元数据"""
+        session_dir = self._session_dir(session_id)
+        try:
+            lock_file = open(session_dir / LOCK_NAME, 'a')
+        except FileNotFoundError:
+            raise UploadError('Upload session not found', 404)
+        with lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                meta = self._read_meta(session_dir)
+                if meta is None:
+                    raise UploadError('Upload session not found', 404)
+                yield meta
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _read_meta(self, session_dir: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with open(session_dir / META_NAME, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    def _save_meta(self, meta: Dict[str, Any]) -> None:
+        meta['updated_at'] = time.time()
+        atomic_write(self.incoming_dir / meta['id'] / META_NAME,
+                     json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+    
+    def _get_hash(self, session_id: str) -> _IncrementalHash:
+        with self._hashes_lock:
+            return self._hashes.setdefault(session_id, _IncrementalHash())
+    
+    def _drop_hash(self, session_id: str) -> None:
+        with self._hashes_lock:
+            self._hashes.pop(session_id, None)
+    
+    def create(self, filename: str, size: int, package_name: str,
+               sha256: Optional[str] = None) -> Dict[str, Any]:
+        """创建会话并预分配暂存文件"""
+        if size <= 0 or size > self.max_size:
+            raise UploadError(f'Invalid size, expected 1..{self.max_size} bytes')
+        
+        self.cleanup()
+        
+        session_id = uuid.uuid4().hex
+        session_dir = self.incoming_dir / session_id
+        session_dir.mkdir()
+        with open(session_dir / PART_NAME, 'wb') as f:
+            f.truncate(size)
+        (session_dir / LOCK_NAME).touch()
+        
+        meta = {
+            'id': session_id,
+            'filename': filename,
+            'package_name': package_name,
+            'size': size,
+            'sha256': sha256.lower() if sha256 else None,
+            'received': [],
+            'created_at': time.time(),
+        }
+        self._save_meta(meta)
+        return meta
+    
+    def get(self, session_id: str) -> Dict[str, Any]:
+        meta = self._read_meta(self._session_dir(session_id))
+        if meta is None:
+            raise UploadError('Upload session not found', 404)
+        return meta
+    
+    def write_chunk(self, session_id: str, start: int, end: int,
+                    total: Optional[int], stream) -> Dict[str, Any]:
+        """把 [start, end) 区间的内容从流中直接写入暂存文件，返回更新后的会话"""
+        meta = self.get(session_id)
+        if total is not None and total != meta['size']:
+            raise UploadError(f"Total size does not match the session ({meta['size']} bytes)")
+        if end > meta['size']:
+            raise UploadError('Range is beyond the end of the file', 416)
+        
+        state = self._get_hash(session_id)
+        part_path = self.incoming_dir / session_id / PART_NAME
+        # 区间互不重叠时，多个请求可以同时写同一个文件
+        fd = os.open(part_path, os.O_WRONLY)
+        try:
+            offset = start
+            with state.lock:
+                in_order = state.offset == start
+            while offset < end:
+                data = stream.read(min(WRITE_BUFFER_SIZE, end - offset))
+                if not data:
+                    break
+                os.pwrite(fd, data, offset)
+                offset += len(data)
+                if in_order:
+                    with state.lock:
+                        if state.offset == offset - len(data):
+                            state.digest.update(data)
+                            state.offset = offset
+                        else:
+                            in_order = False
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        
+        if offset != end:
+            raise UploadError(f'Body is shorter than the declared range ({offset - start} of {end - start} bytes)')
+        
+        with self._locked(session_id) as meta:
+            meta['received'] = merge_ranges(meta['received'], start, end)
+            self._save_meta(meta)
+        
+        self._catch_up(session_id, meta)
+        return meta
+    
+    def _catch_up(self, session_id: str, meta: Dict[str, Any]) -> None:
+        """增量哈希追上已连续接收的前缀（乱序到达的分块在这里补算）"""
+        received = meta['received']
+        if not received or received[0][0] != 0:
+            return
+        prefix_end = received[0][1]
+        
+        state = self._get_hash(session_id)
+        with state.lock:
+            if state.offset >= prefix_end:
+                return
+            with open(self.incoming_dir / session_id / PART_NAME, 'rb') as f:
+                f.seek(state.offset)
+                while state.offset < prefix_end:
+                    data = f.read(min(WRITE_BUFFER_SIZE, prefix_end - state.offset))
+                    if not data:
+                        break
+                    state.digest.update(data)
+                    state.offset += len(data)
+    
+    def complete(self, session_id: str) -> Tuple[Dict[str, Any], Path, Optional[str]]:
+        """完成上传，返回 (会话, 暂存文件路径, sha256)
+
+        本进程持有完整的增量哈希时直接得到 sha256，否则为None，由后台任务计算。
+        """
+        with self._locked(session_id) as meta:
+            if meta['received'] != [[0, meta['size']]]:
+                raise UploadError('Upload is incomplete', 409)
+            
+            self._catch_up(session_id, meta)
+            state = self._get_hash(session_id)
+            with state.lock:
+                sha256 = state.digest.hexdigest() if state.offset == meta['size'] else None
+            
+            if sha256 and meta['sha256'] and sha256 != meta['sha256']:
+                self._abort(session_id)
+                raise UploadError('sha256 does not match the declared value', 422)
+            
+            session_dir = self.incoming_dir / session_id
+            staged_path = session_dir / meta['filename']
+            os.replace(session_dir / PART_NAME, staged_path)
+            (session_dir / META_NAME).unlink()
+        
+        self._drop_hash(session_id)
+        return meta, staged_path, sha256
+    
+    def abort(self, session_id: str) -> None:
+        self._session_dir(session_id)
+        self._abort(session_id)
+    
+    def _abort(self, session_id: str) -> None:
+        self._drop_hash(session_id)
+        shutil.rmtree(self.incoming_dir / session_id, ignore_errors=True)
+    
+    def cleanup(self) -> int:
+        """删除超过 ttl 未更新的会话"""
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for session_dir in self.incoming_dir.iterdir():
+            meta = self._read_meta(session_dir) if session_dir.is_dir() else None
+            if meta is not None and meta.get('updated_at', 0) < cutoff:
+                self._abort(meta['id'])
+                removed += 1
+        return removed
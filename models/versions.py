@@ -0,0 +1,109 @@
+"""
+Versions - 从分发文件名解析包名和版本，以及包名规范化
+
+支持 wheel（PEP 427）和 sdist（.tar.gz / .zip）文件名，
+版本按 PEP 440 比较；无法解析的版本排在所有合法版本之前。
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from packaging.version import InvalidVersion, Version
+
+SDIST_EXTENSIONS = ('.tar.gz', '.zip')
+
+
+def normalize_name(name: str) -> str:
+    """PEP 503 规范化包名：Foo_Bar、foo.bar、foo--bar 都对应 foo-bar"""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def split_filename(filename: str) -> Optional[Tuple[str, str]]:
+    """从分发文件名中拆出 (项目名, 版本字符串)，无法识别时返回None"""
+    if filename.endswith('.whl'):
+        parts = filename[:-4].split('-')
+        # name-version(-build)?-python-abi-platform
+        if len(parts) not in (5, 6):
+            return None
+        return parts[0], parts[1]
+    
+    for extension in SDIST_EXTENSIONS:
+        if filename.endswith(extension):
+            stem = filename[:-len(extension)]
+            # 版本号以数字开头，项目名中可能包含连字符
+            match = re.match(r'^(?P<name>.+?)-(?P<version>\d[^-]*)$', stem)
+            if not match:
+                return None
+            return match.group('name'), match.group('version')
+    
+    return None
+
+
+def parse_version(version: str) -> Optional[Version]:
+    """解析 PEP 440 版本，非法版本返回None"""
+    try:
+        return Version(version)
+    except InvalidVersion:
+        return None
+
+
+def version_key(version: str) -> tuple:
+    """版本排序键：合法版本按 PEP 440 排序，非法版本按字符串排在最前"""
+    parsed = parse_version(version)
+    if parsed is None:
+        return (0, version)
+    return (1, parsed)
+
+
+def parse_filename(filename: str) -> Optional[Dict[str, Any]]:
+    """解析分发文件名，返回可直接写入包文件记录的字段，无法识别时返回None
+
+    wheel 额外包含构建号和兼容性标签（python / abi / platform）。
+    """
+    parsed = split_filename(filename)
+    if parsed is None:
+        return None
+    
+    info = {'version': parsed[1], 'build': None, 'tags': None}
+    if filename.endswith('.whl'):
+        parts = filename[:-4].split('-')
+        if len(parts) == 6:
+            info['build'] = parts[2]
+        info['tags'] = {'python': parts[-3], 'abi': parts[-2], 'platform': parts[-1]}
+    return info
+
+
+def build_key(build: Optional[str]) -> Tuple[int, str]:
+    """wheel 构建号排序键：数字前缀优先，没有构建号的排最前"""
+    if not build:
+        return (-1, '')
+    match = re.match(r'^(\d+)(.*)$', build)
+    if not match:
+        return (-1, build)
+    return (int(match.group(1)), match.group(2))
+
+
+def file_sort_key(filename: str, info: Optional[Dict[str, Any]] = None) -> tuple:
+    """文件排序键：按版本、构建号、文件名排序，无法识别的文件排在最前
+
+    info 为已解析的字段（例如包文件记录），未提供时从文件名解析。
+    """
+    if info is None or 'version' not in info:
+        info = parse_filename(filename)
+    if info is None or info.get('version') is None:
+        return (0, filename)
+    return (1, version_key(info['version']), build_key(info.get('build')), filename)
+
+
+def sort_filenames(filenames: List[str]) -> List[str]:
+    """按版本顺序排列文件名（1.9 在 1.10 之前）"""
+    return sorted(filenames, key=file_sort_key)
+
+
+def latest_version(versions: List[str]) -> Optional[str]:
+    """最新版本：优先取最新的正式版本，没有时取最新的预发布版本"""
+    if not versions:
+        return None
+    ordered = sorted(versions, key=version_key)
+    stable = [v for v in ordered if parse_version(v) is not None and not parse_version(v).is_prerelease]
+    return (stable or ordered)[-1]
@@ -0,0 +1,221 @@
+"""
+Wheel Contents - 只读取 zip 中央目录的 wheel 内容查看
+
+列出 wheel 中的文件、读取单个成员（RECORD、entry_points.txt 等），不需要下载或读取整个文件：
+
+- 文件列表来自 zip 末尾的中央目录：读取目录结束记录和中央目录本身，通常只有几 KB，
+  与 wheel 的大小无关
+- 读取成员时 seek 到它的本地文件头，只读取这个成员的压缩数据，边解压边发送并校验 CRC32
+- 解析后的中央目录按文件的 sha256 缓存在进程内；同名文件被替换后 sha256 变化，不会读到旧的目录
+"""
+
+import zlib
+import struct
+import fnmatch
+import logging
+import threading
+import zipfile
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 每个进程缓存的中央目录数量
+DIRECTORY_CACHE_SIZE = 128
+
+# 读取成员时每次读取的压缩数据字节数
+CHUNK_SIZE = 64 * 1024
+
+# 共享库的扩展名
+SHARED_LIBRARY_SUFFIXES = ('.so', '.pyd', '.dylib', '.dll')
+
+_LOCAL_HEADER = struct.Struct(zipfile.structFileHeader)
+
+
+class ContentsError(Exception):
+    """文件不是 zip 归档、成员不存在或无法读取"""
+    
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Member:
+    """中央目录中的一项"""
+    
+    __slots__ = ('name', 'size', 'compressed_size', 'compress_type', 'crc', 'header_offset', 'flag_bits',
+                 'date_time')
+    
+    def __init__(self, info: zipfile.ZipInfo):
+        self.name = info.filename
+        self.size = info.file_size
+        self.compressed_size = info.compress_size
+        self.compress_type = info.compress_type
+        self.crc = info.CRC
+        self.header_offset = info.header_offset
+        self.flag_bits = info.flag_bits
+        self.date_time = info.date_time
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'size': self.size,
+            'compressed_size': self.compressed_size,
+            'modified': '%04d-%02d-%02dT%02d:%02d:%02d' % self.date_time,
+        }
+
+
+class Directory:
+    """解析后的中央目录"""
+    
+    def __init__(self, members: List[Member]):
+        self.members = members
+        self.by_name = {member.name: member for member in members if not member.name.endswith('/')}
+        dist_info = {name.split('/', 1)[0] for name in self.by_name
+                     if '/' in name and name.split('/', 1)[0].endswith('.dist-info')}
+        self.dist_info = min(dist_info) if dist_info else None
+    
+    def find(self, name: str) -> Optional[Member]:
+        """按完整路径查找成员；不含目录的名称（如 RECORD）在 .dist-info 目录中查找"""
+        member = self.by_name.get(name)
+        if member is None and '/' not in name and self.dist_info is not None:
+            member = self.by_name.get(f"{self.dist_info}/{name}")
+        return member
+    
+    def summary(self) -> Dict[str, Any]:
+        """顶层模块、共享库等概要信息"""
+        modules = set()
+        for name in self.by_name:
+            top = name.split('/', 1)[0]
+            if top.endswith('.dist-info') or top.endswith('.data'):
+                continue
+            if '/' in name:
+                modules.add(top)
+            elif name.endswith('.py') or name.endswith(SHARED_LIBRARY_SUFFIXES):
+                modules.add(top.split('.', 1)[0])
+        return {
+            'files': len(self.by_name),
+            'size': sum(member.size for member in self.by_name.values()),
+            'dist_info': self.dist_info,
+            'top_level': sorted(modules),
+            'shared_libraries': sorted(name for name in self.by_name
+                                       if name.endswith(SHARED_LIBRARY_SUFFIXES) or '.so.' in name.rsplit('/', 1)[-1]),
+        }
+    
+    def list(self, pattern: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [member.to_dict() for member in self.members
+                if not member.name.endswith('/') and (pattern is None or fnmatch.fnmatchcase(member.name, pattern))]
+
+
+class ContentsReader:
+    """按 sha256 缓存中央目录的读取器（线程安全）"""
+    
+    def __init__(self, max_directories: int = DIRECTORY_CACHE_SIZE):
+        self.max_directories = max_directories
+        self._directories: 'OrderedDict[str, Directory]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0}
+    
+    def directory(self, handle, sha256: str) -> Directory:
+        """获取已打开文件的中央目录，只在缓存未命中时读取文件末尾"""
+        with self._lock:
+            directory = self._directories.get(sha256)
+            if directory is not None:
+                self._directories.move_to_end(sha256)
+                self._counters['hits'] += 1
+                return directory
+            self._counters['misses'] += 1
+        
+        try:
+            # ZipFile 只读取目录结束记录和中央目录，不读取成员数据
+            with zipfile.ZipFile(handle) as archive:
+                directory = Directory([Member(info) for info in archive.infolist()])
+        except (zipfile.BadZipFile, EOFError, OSError) as e:
+            raise ContentsError(f"Not a readable zip archive: {e}", 422)
+        
+        with self._lock:
+            self._directories[sha256] = directory
+            while len(self._directories) > self.max_directories:
+                self._directories.popitem(last=False)
+        return directory
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._counters, 'directories': len(self._directories)}
+
+
+def read_member(handle, member: Member) -> Iterator[bytes]:
+    """读取单个成员：seek 到本地文件头，只读取该成员的数据，解压并校验 CRC32"""
+    if member.flag_bits & 0x1:
+        raise ContentsError(f"{member.name} is encrypted")
+    if member.compress_type == zipfile.ZIP_STORED:
+        decompressor = None
+    elif member.compress_type == zipfile.ZIP_DEFLATED:
+        decompressor = zlib.decompressobj(-15)
+    else:
+        raise ContentsError(f"Unsupported compression method {member.compress_type} for {member.name}")
+    
+    handle.seek(member.header_offset)
+    header = handle.read(_LOCAL_HEADER.size)
+    if len(header) != _LOCAL_HEADER.size or header[:4] != zipfile.stringFileHeader:
+        raise ContentsError(f"Bad local file header for {member.name}", 422)
+    # 本地文件头最后两个字段是文件名和扩展字段的长度
+    name_length, extra_length = struct.unpack('<2H', header[-4:])
+    handle.seek(name_length + extra_length, 1)
+    
+    crc = 0
+    produced = 0
+    
+    def account(chunk: bytes) -> bytes:
+        nonlocal crc, produced
+        produced += len(chunk)
+        if produced > member.size:
+            raise ContentsError(f"{member.name} is larger than its directory entry", 422)
+        crc = zlib.crc32(chunk, crc)
+        return chunk
+    
+    remaining = member.compressed_size
+    while remaining > 0:
+        data = handle.read(min(CHUNK_SIZE, remaining))
+        if not data:
+            raise ContentsError(f"Truncated data for {member.name}", 422)
+        remaining -= len(data)
+        while data:
+            if decompressor is None:
+                chunk, data = data, b''
+            else:
+                # 限制每次解压的输出，压缩比异常高的成员不会占用大量内存
+                chunk = decompressor.decompress(data, CHUNK_SIZE * 4)
+                data = decompressor.unconsumed_tail
+            if chunk:
+                yield account(chunk)
+    
+    # 输入读完后 zlib 内部可能还有未输出的数据（输出受 max_length 限制时），继续取出直到流结束
+    while decompressor is not None and not decompressor.eof:
+        chunk = decompressor.decompress(b'', CHUNK_SIZE * 4)
+        if not chunk:
+            chunk = decompressor.flush()
+            if chunk:
+                yield account(chunk)
+            break
+        yield account(chunk)
+    if produced != member.size or crc != member.crc:
+        raise ContentsError(f"CRC mismatch for {member.name}", 422)
+
+
+def is_inspectable(filename: str) -> bool:
+    """只有 zip 格式的文件（wheel、zip sdist）有中央目录"""
+    return filename.endswith('.whl') or filename.endswith('.zip')
+
+
+_reader: Optional[ContentsReader] = None
+_reader_lock = threading.Lock()
+
+
+def get_contents_reader() -> ContentsReader:
+    """获取进程内共享的读取器"""
+    global _reader
+    with _reader_lock:
+        if _reader is None:
+            _reader = ContentsReader()
+        return _reader
@@ -0,0 +1,357 @@
+"""
+Workers - 工作进程负载报告与按内存回收
+
+每个 gunicorn 工作进程统计自己正在处理的请求数和最近的请求延迟，由后台线程每隔几秒
+原子地写入 <packages_dir>/.repo/workers/<pid>.json；自动扩缩容等进程外的控制器读取这些报告，
+不需要向工作进程发送请求（繁忙的工作进程恰恰无法及时响应）。
+
+同一个线程跟踪本进程的 RSS（以及启用 tracemalloc 时 Python 堆的大小），只在 RSS 超过上限、
+或度过预热期后在整个观察窗口内持续增长时才回收工作进程，代替按请求数的定期重启：
+
+- 回收是优雅的：工作进程停止接受新连接，处理完在途请求后退出，由 gunicorn 启动替代进程
+- 同一时刻只有一个工作进程回收（.repo/workers/recycle.lock），不会同时失去多个进程的容量
+- 每次回收及其原因追加到 .repo/workers/recycles.jsonl，/stats 中按原因汇总
+- 退出前把本进程的热点文件列表写入 .repo/workers/hot.json，替代进程在接受请求前据此预热
+
+已退出进程的报告由读取方清理。
+"""
+
+import os
+import json
+import time
+import math
+import fcntl
+import logging
+import threading
+import tracemalloc
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import psutil
+
+from models.compression import atomic_write
+from models.events import get_state_dir
+from models.hot_cache import hot_object_keys
+
+logger = logging.getLogger(__name__)
+
+# 每个报告周期最多保留的延迟样本数
+LATENCY_WINDOW_SIZE = 2048
+
+# 报告中和退出时保存的热点文件数量
+HOT_KEYS_LIMIT = 64
+
+# 回收记录保留的最大字节数，超过后保留后一半
+RECYCLE_LOG_MAX_BYTES = 1024 * 1024
+
+
+def get_workers_dir(packages_dir) -> Path:
+    workers_dir = get_state_dir(packages_dir) / 'workers'
+    workers_dir.mkdir(parents=True, exist_ok=True)
+    return workers_dir
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    """最近秩法计算分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))]
+
+
+class WorkerLoad:
+    """当前进程的请求计数（线程安全）"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW_SIZE)
+        self._window_requests = 0
+    
+    def begin(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+    
+    def end(self, duration: float, failed: bool = False) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.requests += 1
+            self._window_requests += 1
+            if failed:
+                self.errors += 1
+            self._latencies.append(duration * 1000)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """当前计数和上次快照以来的延迟分位数（取快照后重新统计）"""
+        with self._lock:
+            latencies = list(self._latencies)
+            window_requests = self._window_requests
+            self._latencies.clear()
+            self._window_requests = 0
+            return {
+                'in_flight': self.in_flight,
+                'requests': self.requests,
+                'errors': self.errors,
+                'window_requests': window_requests,
+                'p50_ms': _percentile(latencies, 50),
+                'p95_ms': _percentile(latencies, 95),
+            }
+
+
+def _slope(points) -> float:
+    """最小二乘斜率（每秒变化量）"""
+    if len(points) < 2:
+        return 0.0
+    mean_t = sum(t for t, _ in points) / len(points)
+    mean_v = sum(v for _, v in points) / len(points)
+    denominator = sum((t - mean_t) ** 2 for t, _ in points)
+    if denominator == 0:
+        return 0.0
+    return sum((t - mean_t) * (v - mean_v) for t, v in points) / denominator
+
+
+class MemoryWatch:
+    """跟踪当前进程的内存，判断是否需要回收
+
+    tracemalloc 已启动时用 Python 堆的大小判断增长（不受内存碎片和分配器缓存影响），
+    否则用 RSS；上限始终按 RSS 判断。
+    """
+    
+    def __init__(self, max_rss: int, max_growth_per_hour: int, window: float = 1800, warmup: float = 600,
+                 min_uptime: float = 60):
+        self.max_rss = max_rss
+        self.max_growth_per_hour = max_growth_per_hour
+        self.window = window
+        self.warmup = warmup
+        # 上限低于进程的基础内存时避免反复重启
+        self.min_uptime = min_uptime
+        self.started_at = time.time()
+        self.process = psutil.Process()
+        self.history: deque = deque()
+    
+    def sample(self) -> Dict[str, Any]:
+        now = time.time()
+        rss = self.process.memory_info().rss
+        traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        # 预热期内缓存逐渐填满，内存增长是正常的
+        if now - self.started_at >= self.warmup:
+            self.history.append((now, traced if traced is not None else rss))
+            while self.history and now - self.history[0][0] > self.window:
+                self.history.popleft()
+        growth = _slope(self.history) * 3600 if self.history else 0.0
+        return {'rss': rss, 'heap': traced, 'growth_per_hour': int(growth)}
+    
+    def check(self, sample: Dict[str, Any]) -> Optional[str]:
+        """需要回收时返回原因（rss_limit / sustained_growth），否则返回None"""
+        if time.time() - self.started_at < self.min_uptime:
+            return None
+        if self.max_rss and sample['rss'] > self.max_rss:
+            return 'rss_limit'
+        if not self.max_growth_per_hour or len(self.history) < 2:
+            return None
+        # 观察满一个窗口、斜率超过阈值且窗口内的净增长也超过阈值的一半才算持续增长
+        span = self.history[-1][0] - self.history[0][0]
+        if span < self.window * 0.9 or sample['growth_per_hour'] <= self.max_growth_per_hour:
+            return None
+        net = self.history[-1][1] - self.history[0][1]
+        if net < self.max_growth_per_hour * span / 3600 / 2:
+            return None
+        return 'sustained_growth'
+
+
+class WorkerReporter:
+    """在后台线程中定期写出本进程的负载报告"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._packages_dir: Optional[Path] = None
+        self._memory: Optional[MemoryWatch] = None
+        self._on_recycle = None
+        # 回收锁在进程退出时才释放
+        self._recycle_lock_file = None
+        self.recycling: Optional[str] = None
+        self.started_at = time.time()
+    
+    def start(self, packages_dir, threads: int, interval: float = 2, memory: Optional[MemoryWatch] = None,
+              on_recycle=None) -> bool:
+        """启动后台线程，已启动时返回False
+
+        memory 和 on_recycle 同时提供时按内存回收：需要回收时调用 on_recycle(原因)，
+        由调用方让工作进程优雅退出。
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._stop.clear()
+            self._packages_dir = Path(packages_dir)
+            self._memory = memory
+            self._on_recycle = on_recycle
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._run, args=(Path(packages_dir), threads, interval),
+                                            name='worker-reporter', daemon=True)
+            self._thread.start()
+            return True
+    
+    def stop(self):
+        """停止报告并删除本进程的报告文件（工作进程退出时调用），热点文件列表留给替代进程预热"""
+        self._stop.set()
+        if self._packages_dir is None:
+            return
+        workers_dir = get_workers_dir(self._packages_dir)
+        hot_keys = hot_object_keys(HOT_KEYS_LIMIT)
+        if hot_keys:
+            # 同时退出的进程各自的热点合并保存，本进程的在前
+            merged = _unique(hot_keys + _read_saved_hot_keys(workers_dir))[:HOT_KEYS_LIMIT]
+            atomic_write(workers_dir / 'hot.json', json.dumps(merged).encode('utf-8'))
+        (workers_dir / f"{os.getpid()}.json").unlink(missing_ok=True)
+    
+    def report(self, packages_dir, threads: int) -> Dict[str, Any]:
+        report = {
+            'pid': os.getpid(),
+            'threads': threads,
+            'started_at': self.started_at,
+            'reported_at': time.time(),
+            'recycling': self.recycling,
+            'hot': hot_object_keys(HOT_KEYS_LIMIT),
+            **worker_load.snapshot(),
+        }
+        if self._memory is not None:
+            report.update(self._memory.sample())
+        atomic_write(get_workers_dir(packages_dir) / f"{os.getpid()}.json",
+                     json.dumps(report).encode('utf-8'))
+        return report
+    
+    def _run(self, packages_dir: Path, threads: int, interval: float):
+        while not self._stop.is_set():
+            try:
+                report = self.report(packages_dir, threads)
+                if self._memory is not None and self._on_recycle is not None and self.recycling is None:
+                    cause = self._memory.check(report)
+                    if cause is not None:
+                        self._recycle(packages_dir, cause, report)
+            except Exception as e:
+                logger.error(f"Failed to write worker report: {e}")
+            self._stop.wait(interval)
+    
+    def _recycle(self, packages_dir: Path, cause: str, report: Dict[str, Any]) -> None:
+        """取得回收锁后记录回收事件并通知工作进程退出；其他进程正在回收时下一轮再试"""
+        lock_file = open(get_workers_dir(packages_dir) / 'recycle.lock', 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return
+        self._recycle_lock_file = lock_file
+        self.recycling = cause
+        
+        event = {
+            'time': time.time(),
+            'pid': report['pid'],
+            'cause': cause,
+            'uptime': round(report['reported_at'] - self.started_at, 1),
+            'requests': report['requests'],
+            'rss': report['rss'],
+            'heap': report['heap'],
+            'growth_per_hour': report['growth_per_hour'],
+        }
+        _append_recycle_event(packages_dir, event)
+        logger.warning(f"Recycling worker {report['pid']} ({cause}): RSS {report['rss'] // (1024 * 1024)}MB, "
+                       f"growth {report['growth_per_hour'] // (1024 * 1024)}MB/h")
+        self._on_recycle(cause)
+
+
+def _append_recycle_event(packages_dir, event: Dict[str, Any]) -> None:
+    path = get_workers_dir(packages_dir) / 'recycles.jsonl'
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(event) + '\n')
+    if path.stat().st_size > RECYCLE_LOG_MAX_BYTES:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        atomic_write(path, ''.join(lines[len(lines) // 2:]).encode('utf-8'))
+
+
+def read_recycle_events(packages_dir, limit: int = 50) -> List[Dict[str, Any]]:
+    """最近的回收事件，最新的在前"""
+    try:
+        with open(get_workers_dir(packages_dir) / 'recycles.jsonl', 'r', encoding='utf-8') as f:
+            lines = deque(f, maxlen=limit)
+    except FileNotFoundError:
+        return []
+    events = []
+    for line in reversed(lines):
+        try:
+            events.append(json.loads(line))
+        except ValueError:
+            continue
+    return events
+
+
+def worker_summary(packages_dir, recent: int = 10) -> Dict[str, Any]:
+    """所有工作进程的内存合计和回收次数（按原因），用于 /stats"""
+    reports = read_worker_reports(packages_dir)
+    events = read_recycle_events(packages_dir, limit=10000)
+    causes: Dict[str, int] = {}
+    for event in events:
+        causes[event['cause']] = causes.get(event['cause'], 0) + 1
+    return {
+        'count': len(reports),
+        'rss_total': sum(report.get('rss') or 0 for report in reports),
+        'recycling': [report['pid'] for report in reports if report.get('recycling')],
+        'recycles': causes,
+        'recent_recycles': events[:recent],
+    }
+
+
+def read_hot_keys(packages_dir) -> List[List[str]]:
+    """替代进程预热用的热点文件：上一个退出进程保存的列表在前，再加上仍在运行的进程的热点"""
+    keys = _read_saved_hot_keys(get_workers_dir(packages_dir))
+    for report in read_worker_reports(packages_dir):
+        keys.extend(report.get('hot') or [])
+    return _unique(keys)[:HOT_KEYS_LIMIT]
+
+
+def _read_saved_hot_keys(workers_dir: Path) -> List[List[str]]:
+    try:
+        with open(workers_dir / 'hot.json', 'r', encoding='utf-8') as f:
+            return list(json.load(f))
+    except (FileNotFoundError, ValueError):
+        return []
+
+
+def _unique(keys: List[List[str]]) -> List[List[str]]:
+    unique = []
+    for key in keys:
+        if key not in unique:
+            unique.append(key)
+    return unique
+
+
+def read_worker_reports(packages_dir, max_age: float = 30) -> List[Dict[str, Any]]:
+    """读取仍在运行的工作进程的报告，清理已退出进程留下的报告"""
+    reports = []
+    now = time.time()
+    for path in get_workers_dir(packages_dir).glob('*.json'):
+        if not path.stem.isdigit():
+            continue
+        pid = int(path.stem)
+        if not psutil.pid_exists(pid):
+            path.unlink(missing_ok=True)
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                report = json.load(f)
+        except (FileNotFoundError, ValueError):
+            continue
+        if now - report.get('reported_at', 0) <= max_age:
+            reports.append(report)
+    return sorted(reports, key=lambda report: report['pid'])
+
+
+# 进程内共享的计数和报告线程
+worker_load = WorkerLoad()
+worker_reporter = WorkerReporter()
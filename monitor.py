@@ -1,18 +1,36 @@
 #!/usr/bin/env python3
 """
 PyPI Repository Monitor and Auto-Recovery Script
+
+并发探测所有副本的 /health、一个有代表性的 /simple/<包>/ 页面和一个小文件下载，
+按滑动窗口统计延迟分位数，在 SLO 被突破或延迟持续上升时告警；同时采样本机
+gunicorn 工作进程的 CPU、RSS 和打开的文件描述符，在资源耗尽需要重启之前告警。
+本机副本连续多次健康检查失败时通过 supervisor 重启服务。
+
+配置（环境变量）：
+- MONITOR_REPLICAS: 逗号分隔的副本地址，默认 http://localhost:8385
+- MONITOR_INTERVAL / MONITOR_SAMPLES / MONITOR_TIMEOUT: 探测间隔（秒）、每轮每项探测次数、超时（秒）
+- MONITOR_SLO_{HEALTH,SIMPLE,DOWNLOAD}_P95_MS / MONITOR_SLO_ERROR_RATE: 延迟和错误率 SLO
+- MONITOR_PROBE_PACKAGE: 用于探测的包名，默认自动选择
+- MONITOR_WORKER_RSS_LIMIT_MB / MONITOR_WORKER_CPU_PERCENT / MONITOR_FD_USAGE: 工作进程资源阈值
 """
 
 import os
 import sys
+import math
 import time
 import json
 import logging
 import requests
 import subprocess
 import signal
+import threading
+import psutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timedelta
+from urllib.parse import urlparse
 
 # 配置日志
 logging.basicConfig(
@@ -25,55 +43,333 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+PROBES = ('health', 'simple', 'download')
+
+# 各项探测的 p95 延迟 SLO（毫秒）
+DEFAULT_SLOS = {
+    'health': float(os.environ.get('MONITOR_SLO_HEALTH_P95_MS') or 250),
+    'simple': float(os.environ.get('MONITOR_SLO_SIMPLE_P95_MS') or 500),
+    'download': float(os.environ.get('MONITOR_SLO_DOWNLOAD_P95_MS') or 2000),
+}
+DEFAULT_ERROR_RATE_SLO = float(os.environ.get('MONITOR_SLO_ERROR_RATE') or 0.01)
+
+# 延迟趋势：本轮 p95 连续 TREND_ROUNDS 轮超过长期基线的 TREND_FACTOR 倍时告警
+TREND_FACTOR = 2.0
+TREND_ROUNDS = 3
+BASELINE_ALPHA = 0.05
+
+# 内存趋势：按当前增长速度预计在该时间内达到 RSS 上限时告警（秒）
+RSS_FORECAST_HORIZON = 3600
+RSS_HISTORY_SIZE = 30
+RSS_TREND_MIN_SAMPLES = 10
+
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+
+def percentile(values, pct):
+    """最近秩法计算分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _slope(points):
+    """最小二乘斜率（每秒变化量）"""
+    if len(points) < 2:
+        return 0.0
+    mean_t = sum(t for t, _ in points) / len(points)
+    mean_v = sum(v for _, v in points) / len(points)
+    denominator = sum((t - mean_t) ** 2 for t, _ in points)
+    if denominator == 0:
+        return 0.0
+    return sum((t - mean_t) * (v - mean_v) for t, v in points) / denominator
+
+
+class Replica:
+    """一个被监控的副本"""
+    
+    def __init__(self, url, window_size):
+        self.url = url.rstrip('/')
+        self.local = urlparse(self.url).hostname in LOCAL_HOSTS
+        self.last_healthy = None
+        self.consecutive_failures = 0
+        # 探测目标 (包名, 文件名)，首次探测时确定
+        self.probe_target = None
+        # 每项探测最近的样本 (延迟毫秒, 是否成功)
+        self.samples = {probe: deque(maxlen=window_size) for probe in PROBES}
+        self.baselines = {probe: None for probe in PROBES}
+        self.slow_rounds = {probe: 0 for probe in PROBES}
+
+
 class RepositoryMonitor:
     """仓库监控器"""
     
-    def __init__(self, repo_url="http://localhost:8385", check_interval=60):
-        self.repo_url = repo_url
+    def __init__(self, replicas=None, check_interval=60, samples=3, timeout=5,
+                 slos=None, error_rate_slo=DEFAULT_ERROR_RATE_SLO, window_size=60,
+                 probe_package=None, pidfile='gunicorn.pid'):
+        self.replicas = [Replica(url, window_size) for url in (replicas or ["http://localhost:8385"])]
         self.check_interval = check_interval
-        self.last_healthy = None
-        self.consecutive_failures = 0
+        self.samples = samples
+        self.timeout = timeout
+        self.slos = dict(DEFAULT_SLOS, **(slos or {}))
+        self.error_rate_slo = error_rate_slo
+        self.probe_package = probe_package
+        self.pidfile = Path(pidfile)
         self.max_failures = 3
         self.recovery_attempts = 0
         self.max_recovery_attempts = 5
         
-    def check_health(self):
-        """检查服务健康状态"""
+        self.rss_limit = int(os.environ.get('MONITOR_WORKER_RSS_LIMIT_MB') or 1024) * 1024 * 1024
+        self.cpu_limit = float(os.environ.get('MONITOR_WORKER_CPU_PERCENT') or 90)
+        self.fd_usage_limit = float(os.environ.get('MONITOR_FD_USAGE') or 0.8)
+        # 跨轮次保留的工作进程对象（cpu_percent 需要与上一次调用比较）
+        self.workers = {}
+        self.rss_history = {}
+        self.busy_rounds = {}
+        
+        # 当前处于告警状态的项 {key: message}，同一问题只告警一次，恢复时记录日志
+        self.active_alerts = {}
+        
+        self.executor = ThreadPoolExecutor(
+            max_workers=min(32, len(self.replicas) * len(PROBES) * samples),
+            thread_name_prefix='probe'
+        )
+        self._local = threading.local()
+    
+    def _session(self):
+        # requests.Session 不是线程安全的，每个探测线程使用自己的连接池
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+    
+    def check_health(self, replica):
+        """检查服务健康状态，返回 (是否健康, 延迟毫秒)"""
+        start = time.monotonic()
         try:
-            response = requests.get(f"{self.repo_url}/health", timeout=10)
+            response = self._session().get(f"{replica.url}/health", timeout=self.timeout)
+            latency = (time.monotonic() - start) * 1000
             if response.status_code == 200:
                 data = response.json()
                 if data.get('status') == 'healthy':
-                    self.consecutive_failures = 0
-                    self.last_healthy = datetime.now()
-                    logger.info("Service is healthy")
-                    return True
+                    return True, latency
                 else:
-                    logger.warning(f"Service reports unhealthy status: {data}")
-                    return False
+                    logger.warning(f"{replica.url} reports unhealthy status: {data}")
+                    return False, latency
             else:
-                logger.error(f"Health check failed with status code: {response.status_code}")
-                return False
+                logger.error(f"{replica.url} health check failed with status code: {response.status_code}")
+                return False, latency
         except requests.exceptions.RequestException as e:
-            logger.error(f"Health check request failed: {e}")
-            return False
+            logger.error(f"{replica.url} health check request failed: {e}")
+            return False, (time.monotonic() - start) * 1000
         except Exception as e:
-            logger.error(f"Unexpected error during health check: {e}")
-            return False
+            logger.error(f"Unexpected error during health check of {replica.url}: {e}")
+            return False, (time.monotonic() - start) * 1000
+    
+    def _timed_get(self, url):
+        """GET 并读完响应体，返回 (是否成功, 延迟毫秒)"""
+        start = time.monotonic()
+        try:
+            with self._session().get(url, timeout=self.timeout, stream=True) as response:
+                for _ in response.iter_content(64 * 1024):
+                    pass
+                ok = response.status_code == 200
+                if not ok:
+                    logger.warning(f"Probe {url} returned status code: {response.status_code}")
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Probe {url} failed: {e}")
+            ok = False
+        return ok, (time.monotonic() - start) * 1000
+    
+    def discover_probe_target(self, replica):
+        """选择探测用的包和其中最小的文件"""
+        try:
+            package_name = self.probe_package
+            if not package_name:
+                response = self._session().get(f"{replica.url}/packages",
+                                               params={'limit': 1, 'fields': 'name'}, timeout=self.timeout)
+                response.raise_for_status()
+                packages = response.json()['packages']
+                if not packages:
+                    return None
+                package_name = packages[0]['name']
+            
+            response = self._session().get(f"{replica.url}/packages/{package_name}/latest", timeout=self.timeout)
+            response.raise_for_status()
+            latest = response.json()
+            smallest = min(latest['files'], key=lambda f: f['size'] or 0)
+            return latest['name'], smallest['filename']
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            logger.warning(f"Failed to choose a probe target on {replica.url}: {e}")
+            return None
+    
+    def probe(self, replica, probe):
+        """执行一次探测，返回 (是否成功, 延迟毫秒)"""
+        if probe == 'health':
+            return self.check_health(replica)
+        package_name, filename = replica.probe_target
+        if probe == 'simple':
+            return self._timed_get(f"{replica.url}/simple/{package_name}/")
+        return self._timed_get(f"{replica.url}/{package_name}/{filename}")
+    
+    def probe_all(self):
+        """并发探测所有副本，返回 {副本地址: {探测项: [(是否成功, 延迟毫秒), ...]}}"""
+        for replica in self.replicas:
+            if replica.probe_target is None:
+                replica.probe_target = self.discover_probe_target(replica)
+        
+        futures = []
+        for replica in self.replicas:
+            probes = PROBES if replica.probe_target else ('health',)
+            for probe in probes:
+                for _ in range(self.samples):
+                    futures.append((replica, probe, self.executor.submit(self.probe, replica, probe)))
+        
+        results = {replica.url: {} for replica in self.replicas}
+        for replica, probe, future in futures:
+            results[replica.url].setdefault(probe, []).append(future.result())
+        return results
+    
+    def evaluate_latency(self, replica, round_results):
+        """记录样本并检查 SLO 和延迟趋势"""
+        summary = {}
+        for probe, results in round_results.items():
+            window = replica.samples[probe]
+            window.extend(results)
+            
+            latencies = [latency for ok, latency in window if ok]
+            errors = sum(1 for ok, _ in window if not ok)
+            p95 = percentile(latencies, 95)
+            summary[probe] = {
+                'p50': percentile(latencies, 50),
+                'p95': p95,
+                'p99': percentile(latencies, 99),
+                'error_rate': errors / len(window),
+            }
+            
+            key = f"{replica.url}:{probe}"
+            slo = self.slos[probe]
+            if p95 is not None and p95 > slo:
+                self.raise_alert(f"{key}:slo", f"{key} p95 latency {p95:.0f}ms exceeds SLO {slo:.0f}ms")
+            else:
+                self.clear_alert(f"{key}:slo")
+            
+            if errors / len(window) > self.error_rate_slo:
+                self.raise_alert(f"{key}:errors",
+                                 f"{key} error rate {errors / len(window):.1%} exceeds SLO {self.error_rate_slo:.1%}")
+            else:
+                self.clear_alert(f"{key}:errors")
+            
+            # 趋势：与长期基线比较本轮 p95，SLO 被突破之前发现逐渐变慢的副本
+            round_p95 = percentile([latency for ok, latency in results if ok], 95)
+            if round_p95 is None:
+                continue
+            baseline = replica.baselines[probe]
+            if baseline is not None and round_p95 > baseline * TREND_FACTOR:
+                replica.slow_rounds[probe] += 1
+            else:
+                replica.slow_rounds[probe] = 0
+            if replica.slow_rounds[probe] >= TREND_ROUNDS:
+                self.raise_alert(f"{key}:trend", f"{key} latency rising: p95 {round_p95:.0f}ms over "
+                                 f"{replica.slow_rounds[probe]} rounds vs baseline {baseline:.0f}ms")
+            else:
+                self.clear_alert(f"{key}:trend")
+            replica.baselines[probe] = round_p95 if baseline is None else \
+                baseline + BASELINE_ALPHA * (round_p95 - baseline)
+        return summary
+    
+    def sample_workers(self):
+        """采样本机 gunicorn 工作进程的 CPU、RSS 和文件描述符"""
+        try:
+            master = psutil.Process(int(self.pidfile.read_text().strip()))
+            children = master.children()
+        except (OSError, ValueError, psutil.Error) as e:
+            logger.debug(f"Cannot read gunicorn workers from {self.pidfile}: {e}")
+            return []
+        
+        now = time.time()
+        samples = []
+        current = {}
+        for child in children:
+            worker = self.workers.get(child.pid, child)
+            current[child.pid] = worker
+            try:
+                with worker.oneshot():
+                    cpu = worker.cpu_percent(interval=None)
+                    rss = worker.memory_info().rss
+                    fds = worker.num_fds()
+                fd_limit = worker.rlimit(psutil.RLIMIT_NOFILE)[0]
+            except psutil.Error:
+                continue
+            
+            # 新进程第一次调用 cpu_percent 没有参考值，返回0
+            if child.pid not in self.workers:
+                cpu = None
+            samples.append({'pid': child.pid, 'cpu_percent': cpu, 'rss': rss,
+                            'num_fds': fds, 'fd_limit': fd_limit})
+            history = self.rss_history.setdefault(child.pid, deque(maxlen=RSS_HISTORY_SIZE))
+            history.append((now, rss))
+        
+        # 已退出（例如被 max_requests 回收）的进程不再跟踪
+        for pid in set(self.workers) - set(current):
+            self.rss_history.pop(pid, None)
+            self.busy_rounds.pop(pid, None)
+        self.workers = current
+        return samples
+    
+    def evaluate_workers(self, samples):
+        """检查工作进程资源阈值和内存增长趋势"""
+        for sample in samples:
+            pid = sample['pid']
+            key = f"worker:{pid}"
+            
+            if sample['rss'] > self.rss_limit:
+                self.raise_alert(f"{key}:rss", f"Worker {pid} RSS {sample['rss'] // (1024 * 1024)}MB "
+                                 f"exceeds {self.rss_limit // (1024 * 1024)}MB", level='critical')
+            else:
+                self.clear_alert(f"{key}:rss")
+            
+            # 按当前增长速度预计达到上限的时间
+            history = self.rss_history.get(pid, [])
+            slope = _slope(history) if len(history) >= RSS_TREND_MIN_SAMPLES else 0.0
+            if slope > 0 and sample['rss'] < self.rss_limit \
+                    and (self.rss_limit - sample['rss']) / slope < RSS_FORECAST_HORIZON:
+                self.raise_alert(f"{key}:rss-trend", f"Worker {pid} RSS growing {slope * 60 / 1024 / 1024:.1f}MB/min, "
+                                 f"limit reached in {(self.rss_limit - sample['rss']) / slope / 60:.0f} minutes")
+            else:
+                self.clear_alert(f"{key}:rss-trend")
+            
+            if sample['fd_limit'] > 0 and sample['num_fds'] > sample['fd_limit'] * self.fd_usage_limit:
+                self.raise_alert(f"{key}:fds", f"Worker {pid} has {sample['num_fds']} open files "
+                                 f"(limit {sample['fd_limit']})")
+            else:
+                self.clear_alert(f"{key}:fds")
+            
+            if sample['cpu_percent'] is not None and sample['cpu_percent'] > self.cpu_limit:
+                self.busy_rounds[pid] = self.busy_rounds.get(pid, 0) + 1
+            else:
+                self.busy_rounds[pid] = 0
+            if self.busy_rounds[pid] >= TREND_ROUNDS:
+                self.raise_alert(f"{key}:cpu", f"Worker {pid} CPU above {self.cpu_limit:.0f}% "
+                                 f"for {self.busy_rounds[pid]} rounds")
+            else:
+                self.clear_alert(f"{key}:cpu")
     
-    def check_stats(self):
+    def check_stats(self, replica):
         """检查服务统计信息"""
         try:
-            response = requests.get(f"{self.repo_url}/stats", timeout=10)
+            response = self._session().get(f"{replica.url}/stats", timeout=self.timeout)
             if response.status_code == 200:
                 stats = response.json()
-                logger.info(f"Service stats: {stats}")
+                logger.info(f"{replica.url} stats: {stats}")
                 return stats
             else:
-                logger.error(f"Stats check failed with status code: {response.status_code}")
+                logger.error(f"{replica.url} stats check failed with status code: {response.status_code}")
                 return None
         except Exception as e:
-            logger.error(f"Stats check failed: {e}")
+            logger.error(f"{replica.url} stats check failed: {e}")
             return None
     
     def restart_service(self):
@@ -95,7 +391,7 @@ class RepositoryMonitor:
             else:
                 logger.error(f"Service restart failed: {result.stderr}")
                 return False
-                
+        
         except subprocess.TimeoutExpired:
             logger.error("Service restart timed out")
             return False
@@ -120,7 +416,7 @@ class RepositoryMonitor:
             else:
                 logger.error(f"Supervisor status check failed: {result.stderr}")
                 return False
-                
+        
         except Exception as e:
             logger.error(f"Supervisor status check error: {e}")
             return False
@@ -142,13 +438,13 @@ class RepositoryMonitor:
             else:
                 logger.error(f"Supervisor start failed: {result.stderr}")
                 return False
-                
+        
         except Exception as e:
             logger.error(f"Supervisor start error: {e}")
             return False
     
-    def recover_service(self):
-        """恢复服务"""
+    def recover_service(self, replica):
+        """恢复服务（supervisor 只管理本机的服务）"""
         logger.info(f"Attempting service recovery (attempt {self.recovery_attempts + 1}/{self.max_recovery_attempts})")
         
         # 检查supervisor是否运行
@@ -165,7 +461,7 @@ class RepositoryMonitor:
             time.sleep(10)  # 等待服务启动
             
             # 检查是否恢复
-            if self.check_health():
+            if self.check_health(replica)[0]:
                 logger.info("Service recovered successfully")
                 self.recovery_attempts = 0
                 return True
@@ -176,58 +472,108 @@ class RepositoryMonitor:
             logger.error("Failed to restart service")
             return False
     
-    def send_alert(self, message):
+    def send_alert(self, message, level='warning'):
         """发送告警（可以扩展为邮件、短信等）"""
-        logger.error(f"ALERT: {message}")
+        logger.error(f"ALERT [{level}]: {message}")
         # 这里可以添加邮件、短信、钉钉等告警方式
         # 例如：发送到日志文件、邮件、webhook等
     
+    def raise_alert(self, key, message, level='warning'):
+        """同一问题持续存在时只告警一次"""
+        if key not in self.active_alerts:
+            self.send_alert(message, level)
+        self.active_alerts[key] = message
+    
+    def clear_alert(self, key):
+        if self.active_alerts.pop(key, None) is not None:
+            logger.info(f"Resolved: {key}")
+    
+    def handle_health(self, replica, health_results):
+        """按健康检查结果更新连续失败次数，本机副本达到阈值时尝试恢复；返回False表示需要停止监控"""
+        if any(ok for ok, _ in health_results):
+            replica.consecutive_failures = 0
+            replica.last_healthy = datetime.now()
+            self.clear_alert(f"{replica.url}:down")
+            return True
+        
+        # 服务不健康
+        replica.consecutive_failures += 1
+        logger.warning(f"{replica.url} unhealthy (failure {replica.consecutive_failures}/{self.max_failures})")
+        if replica.consecutive_failures < self.max_failures:
+            return True
+        
+        if not replica.local:
+            self.raise_alert(f"{replica.url}:down", f"{replica.url} failed {replica.consecutive_failures} "
+                             f"consecutive health checks", level='critical')
+            return True
+        
+        # 连续失败达到阈值，尝试恢复
+        if self.recovery_attempts < self.max_recovery_attempts:
+            if self.recover_service(replica):
+                replica.consecutive_failures = 0
+            else:
+                # 恢复失败，发送告警
+                self.send_alert(f"Service recovery failed after {self.recovery_attempts} attempts", level='critical')
+            return True
+        
+        # 达到最大恢复尝试次数
+        self.send_alert(f"Service recovery failed after {self.max_recovery_attempts} attempts. "
+                        f"Manual intervention required.", level='critical')
+        logger.error("Maximum recovery attempts reached, stopping monitor")
+        return False
+    
+    def check_round(self):
+        """执行一轮检查，返回False表示需要停止监控"""
+        results = self.probe_all()
+        keep_running = True
+        
+        for replica in self.replicas:
+            round_results = results[replica.url]
+            summary = self.evaluate_latency(replica, round_results)
+            logger.info(f"{replica.url} latency: " + json.dumps({
+                probe: {name: round(value, 1) for name, value in values.items() if value is not None}
+                for probe, values in summary.items()
+            }))
+            
+            # 下载探测失败可能是探测文件被删除，下一轮重新选择
+            if replica.probe_target and not any(ok for ok, _ in round_results.get('download', [])):
+                replica.probe_target = None
+            
+            if not self.handle_health(replica, round_results['health']):
+                keep_running = False
+            elif replica.consecutive_failures == 0:
+                # 服务健康，检查统计信息
+                self.check_stats(replica)
+        
+        # 重置恢复尝试计数
+        if self.recovery_attempts > 0 and all(r.consecutive_failures == 0 for r in self.replicas if r.local):
+            logger.info("Service is healthy, resetting recovery attempts")
+            self.recovery_attempts = 0
+        
+        worker_samples = self.sample_workers()
+        if worker_samples:
+            self.evaluate_workers(worker_samples)
+            logger.info(f"Workers: {json.dumps(worker_samples)}")
+        
+        return keep_running
+    
     def run(self):
         """运行监控"""
-        logger.info("Starting PyPI repository monitor...")
+        logger.info(f"Starting PyPI repository monitor for {', '.join(r.url for r in self.replicas)}...")
         
         while True:
+            started = time.monotonic()
             try:
-                # 检查健康状态
-                is_healthy = self.check_health()
-                
-                if is_healthy:
-                    # 服务健康，检查统计信息
-                    self.check_stats()
-                    
-                    # 重置恢复尝试计数
-                    if self.recovery_attempts > 0:
-                        logger.info("Service is healthy, resetting recovery attempts")
-                        self.recovery_attempts = 0
-                        
-                else:
-                    # 服务不健康
-                    self.consecutive_failures += 1
-                    logger.warning(f"Service unhealthy (failure {self.consecutive_failures}/{self.max_failures})")
-                    
-                    # 连续失败达到阈值，尝试恢复
-                    if self.consecutive_failures >= self.max_failures:
-                        if self.recovery_attempts < self.max_recovery_attempts:
-                            if self.recover_service():
-                                self.consecutive_failures = 0
-                            else:
-                                # 恢复失败，发送告警
-                                self.send_alert(f"Service recovery failed after {self.recovery_attempts} attempts")
-                        else:
-                            # 达到最大恢复尝试次数
-                            self.send_alert(f"Service recovery failed after {self.max_recovery_attempts} attempts. Manual intervention required.")
-                            logger.error("Maximum recovery attempts reached, stopping monitor")
-                            break
-                
-                # 等待下次检查
-                time.sleep(self.check_interval)
-                
+                if not self.check_round():
+                    break
             except KeyboardInterrupt:
                 logger.info("Monitor stopped by user")
                 break
             except Exception as e:
                 logger.error(f"Monitor error: {e}")
-                time.sleep(self.check_interval)
+            
+            # 等待下次检查
+            time.sleep(max(0, self.check_interval - (time.monotonic() - started)))
 
 def signal_handler(signum, frame):
     """信号处理器"""
@@ -240,7 +586,15 @@ if __name__ == "__main__":
     signal.signal(signal.SIGTERM, signal_handler)
     
     # 创建监控器
-    monitor = RepositoryMonitor()
+    monitor = RepositoryMonitor(
+        replicas=[url.strip() for url in (os.environ.get('MONITOR_REPLICAS') or 'http://localhost:8385').split(',')
+                  if url.strip()],
+        check_interval=int(os.environ.get('MONITOR_INTERVAL') or 60),
+        samples=int(os.environ.get('MONITOR_SAMPLES') or 3),
+        timeout=float(os.environ.get('MONITOR_TIMEOUT') or 5),
+        probe_package=os.environ.get('MONITOR_PROBE_PACKAGE') or None,
+        pidfile=os.environ.get('GUNICORN_PIDFILE') or 'gunicorn.pid',
+    )
     
     # 运行监控
-    monitor.run() 
\ No newline at end of file
+    monitor.run()
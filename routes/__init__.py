@@ -1 +1,18 @@
-# Routes package 
\ No newline at end of file
+# Routes package
+
+from pathlib import Path
+
+from flask import current_app, redirect, request, url_for
+
+
+def get_packages_dir() -> Path:
+    """当前应用配置的包存储目录（PACKAGES_DIR），与 gunicorn.conf.py 中的后台线程使用同一目录"""
+    return Path(current_app.config['PACKAGES_DIR'])
+
+
+def canonical_redirect(package_name: str):
+    """301 重定向到使用仓库中包名（目录名）的同一地址，保留查询参数"""
+    values = dict(request.view_args)
+    values['package_name'] = package_name
+    values.update(request.args.to_dict())
+    return redirect(url_for(request.endpoint, **values), code=301)
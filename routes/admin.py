@@ -5,9 +5,10 @@ Admin Routes - 管理功能路由
 
 import os
 import logging
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from flask import Blueprint, current_app, render_template, request, jsonify, flash, redirect, url_for
 from werkzeug.utils import secure_filename
-from pathlib import Path
+
+from routes import get_packages_dir
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +18,9 @@ admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 # 允许的文件扩展名
 ALLOWED_EXTENSIONS = {'whl', 'tar.gz', 'zip'}
 
+# 批量哈希查询单次最多的文件数
+HASH_LOOKUP_MAX_ITEMS = 1000
+
 
 def allowed_file(filename):
     """检查文件扩展名是否允许"""
@@ -30,7 +34,7 @@ def admin_dashboard():
     """管理仪表板"""
     try:
         from models.repository import RepositoryManager
-        repo_manager = RepositoryManager()
+        repo_manager = RepositoryManager(get_packages_dir())
         packages = repo_manager.get_packages()
         
         # 计算总文件数
@@ -41,11 +45,45 @@ def admin_dashboard():
         return "Internal server error", 500
 
 
+def _find_published(sha256, filename, package_name=None):
+    """仓库中包名、文件名和 sha256 都相同的已发布文件，没有时返回None（包名未提供时由文件名推断）"""
+    from models.repository import RepositoryManager
+    from models.versions import split_filename
+    filename = secure_filename(filename or '')
+    if not package_name:
+        parsed = split_filename(filename)
+        package_name = parsed[0] if parsed else ''
+    if not sha256 or not filename or not package_name:
+        return None
+    for entry in RepositoryManager(get_packages_dir()).catalog.find_by_hash(sha256, package_name):
+        if entry['filename'] == filename:
+            return entry
+    return None
+
+
+def _skipped_upload(entry, sha256):
+    return jsonify({
+        'message': f"仓库中已有相同的文件 {entry['package']}/{entry['filename']}，跳过上传",
+        'exists': True,
+        'package_name': entry['package'],
+        'filename': entry['filename'],
+        'sha256': sha256.lower(),
+    })
+
+
 @admin_bp.route('/upload', methods=['GET', 'POST'])
 def upload_package():
     """包上传页面"""
     if request.method == 'POST':
         try:
+            # 条件上传：请求头声明的文件已经发布时直接返回，不读取请求体
+            declared = request.headers.get('X-Upload-Sha256')
+            if declared:
+                entry = _find_published(declared, request.headers.get('X-Upload-Filename'),
+                                        request.headers.get('X-Upload-Package'))
+                if entry is not None:
+                    return _skipped_upload(entry, declared)
+            
             # 检查是否有文件
             if 'package_file' not in request.files:
                 flash('没有选择文件', 'error')
@@ -77,23 +115,32 @@ def upload_package():
                     parts = name.split('-')
                     package_name = parts[0] if len(parts) >= 2 else name
                 
-                # 创建包目录
-                packages_dir = Path("packages")
-                packages_dir.mkdir(exist_ok=True)
-                package_dir = packages_dir / package_name
-                package_dir.mkdir(exist_ok=True)
+                # 隐藏目录用于仓库内部状态，不能作为包名
+                if package_name.startswith('.') or '/' in package_name:
+                    flash('无效的包名', 'error')
+                    return redirect(request.url)
                 
-                # 保存文件
-                file_path = package_dir / filename
-                file.save(str(file_path))
+                # 文件完整落盘到暂存目录后立即返回，校验、哈希和入库在后台任务中完成
+                from models.jobs import get_job_queue, stage_upload
+                packages_dir = get_packages_dir()
+                staged_path = stage_upload(packages_dir, filename, file.stream)
                 
-                # 清除缓存
-                from models.repository import RepositoryManager
-                repo_manager = RepositoryManager()
-                repo_manager.cache.clear()
-                repo_manager.last_scan = 0
+                job_queue = get_job_queue(packages_dir, current_app.config.get('JOB_WORKERS', 2))
+                job = job_queue.submit('process_upload', {
+                    'packages_dir': str(packages_dir),
+                    'package_name': package_name,
+                    'staged_path': str(staged_path),
+                    'action': 'uploaded',
+                })
                 
-                flash(f'包 {package_name} 上传成功！', 'success')
+                if request.accept_mimetypes.best == 'application/json':
+                    return jsonify({
+                        'message': f'包 {package_name} 已接收，正在处理',
+                        'job_id': job['id'],
+                        'status_url': url_for('admin.job_status', job_id=job['id'])
+                    }), 202
+                
+                flash(f'包 {package_name} 上传成功，正在后台处理（任务 {job["id"][:8]}）', 'success')
                 return redirect(url_for('admin.admin_dashboard'))
             else:
                 flash('不支持的文件类型', 'error')
@@ -111,21 +158,13 @@ def upload_package():
 def delete_package(package_name):
     """删除包"""
     try:
-        import shutil
         from models.repository import RepositoryManager
+        repo_manager = RepositoryManager(get_packages_dir())
         
-        package_dir = Path("packages") / package_name
-        if not package_dir.exists():
+        # 移入回收站后在后台清除，并失效缓存
+        if not repo_manager.remove_package(package_name):
             return jsonify({'error': '包不存在'}), 404
         
-        # 删除包目录
-        shutil.rmtree(package_dir)
-        
-        # 清除缓存
-        repo_manager = RepositoryManager()
-        repo_manager.cache.clear()
-        repo_manager.last_scan = 0
-        
         return jsonify({'message': f'包 {package_name} 删除成功'})
         
     except Exception as e:
@@ -138,21 +177,20 @@ def package_info(package_name):
     """获取包详细信息"""
     try:
         from models.repository import RepositoryManager
-        repo_manager = RepositoryManager()
+        repo_manager = RepositoryManager(get_packages_dir())
         files = repo_manager.get_package_files(package_name)
         
         if not files:
             return jsonify({'error': '包不存在'}), 404
         
-        # 计算文件信息
-        package_dir = Path("packages") / package_name
+        # 计算文件信息（大小取自包的文件记录，不逐个 stat 文件）
         file_info = {}
         total_size = 0
+        sizes = {record['filename']: record['size'] for record in repo_manager.get_file_records(package_name)}
         
         for file_name in files:
-            file_path = package_dir / file_name
-            if file_path.exists():
-                size = file_path.stat().st_size
+            size = sizes.get(file_name)
+            if size is not None:
                 total_size += size
                 file_info[file_name] = {
                     'size': size,
@@ -173,4 +211,337 @@ def package_info(package_name):
         
     except Exception as e:
         logger.error(f"Error getting package info for {package_name}: {e}")
-        return jsonify({'error': '获取包信息失败'}), 500 
\ No newline at end of file
+        return jsonify({'error': '获取包信息失败'}), 500 
+
+
+@admin_bp.route('/packages/<package_name>/files/<filename>/yank', methods=['POST', 'DELETE'])
+def yank_file(package_name, filename):
+    """标记（POST）或取消标记（DELETE）文件为 yanked（PEP 592）"""
+    try:
+        from models.repository import RepositoryManager
+        repo_manager = RepositoryManager(get_packages_dir())
+        
+        if filename not in repo_manager.list_package_dir(package_name):
+            return jsonify({'error': '文件不存在'}), 404
+        
+        reason = None
+        if request.method == 'POST':
+            params = request.get_json(silent=True) or request.form
+            reason = params.get('reason', '')
+        
+        from models.locks import package_lock
+        with package_lock(repo_manager.packages_dir, package_name, exclusive=True):
+            # 旧文件可能还没有记录，先补全
+            repo_manager.catalog.ensure_records(package_name, repo_manager.list_package_dir(package_name))
+            # 对象存储时标记同时写入共享存储，其他节点同步后生效
+            if not repo_manager.storage.is_local:
+                repo_manager.storage.set_yanked(package_name, filename, reason)
+            repo_manager.catalog.set_yanked(package_name, filename, reason)
+        repo_manager.invalidate(package_name, action='updated')
+        
+        return jsonify({'package': package_name, 'filename': filename, 'yanked': reason is not None, 'reason': reason})
+        
+    except Exception as e:
+        logger.error(f"Error yanking {package_name}/{filename}: {e}")
+        return jsonify({'error': '操作失败'}), 500
+
+
+def _retention_engine(repo_manager):
+    """根据应用配置创建保留策略引擎"""
+    from models.retention import RetentionEngine, load_policies
+    
+    config = load_policies(current_app.config.get('RETENTION_CONFIG'))
+    rate = current_app.config.get('RETENTION_MAX_DELETES_PER_SECOND', 20)
+    return RetentionEngine(repo_manager, config, max_deletes_per_second=rate)
+
+
+@admin_bp.route('/retention', methods=['GET'])
+def retention_status():
+    """获取保留策略任务状态和最近一次报告"""
+    try:
+        from models.repository import RepositoryManager
+        from models.retention import retention_runner
+        repo_manager = RepositoryManager(get_packages_dir())
+        return jsonify(retention_runner.get_status(repo_manager.packages_dir))
+        
+    except Exception as e:
+        logger.error(f"Error getting retention status: {e}")
+        return jsonify({'error': '获取清理状态失败'}), 500
+
+
+@admin_bp.route('/retention', methods=['POST'])
+def run_retention():
+    """在后台运行保留策略，默认只生成 dry-run 报告"""
+    try:
+        from models.repository import RepositoryManager
+        from models.retention import retention_runner
+        
+        params = request.get_json(silent=True) or request.form
+        dry_run = str(params.get('dry_run', 'true')).lower() not in ('0', 'false', 'no')
+        package_name = params.get('package') or None
+        
+        repo_manager = RepositoryManager(get_packages_dir())
+        engine = _retention_engine(repo_manager)
+        if not retention_runner.start(engine, dry_run=dry_run, package_name=package_name):
+            return jsonify({'error': '已有清理任务在运行'}), 409
+        
+        return jsonify({
+            'message': '清理任务已启动',
+            'dry_run': dry_run,
+            'package': package_name
+        }), 202
+        
+    except ValueError as e:
+        return jsonify({'error': f'保留策略配置错误: {e}'}), 400
+    except Exception as e:
+        logger.error(f"Error starting retention run: {e}")
+        return jsonify({'error': '启动清理任务失败'}), 500
+
+
+def _upload_store():
+    from models.uploads import UploadSessionStore
+    return UploadSessionStore(
+        get_packages_dir(),
+        max_size=current_app.config.get('UPLOAD_MAX_SIZE'),
+        ttl=current_app.config.get('UPLOAD_SESSION_TTL', 24 * 3600)
+    )
+
+
+def _upload_status(session):
+    received = sum(end - start for start, end in session['received'])
+    return {
+        'id': session['id'],
+        'filename': session['filename'],
+        'package_name': session['package_name'],
+        'size': session['size'],
+        'received': session['received'],
+        'received_bytes': received,
+        'complete': received == session['size'],
+        'upload_url': url_for('admin.upload_chunk', session_id=session['id']),
+        'chunk_size': current_app.config.get('UPLOAD_CHUNK_SIZE'),
+    }
+
+
+@admin_bp.route('/uploads', methods=['POST'])
+def create_upload():
+    """创建分块上传会话"""
+    from models.uploads import UploadError
+    from models.versions import split_filename
+    try:
+        params = request.get_json(silent=True) or {}
+        filename = secure_filename(params.get('filename', ''))
+        if not filename or not allowed_file(filename):
+            return jsonify({'error': '不支持的文件类型'}), 400
+        
+        parsed = split_filename(filename)
+        package_name = (params.get('package_name') or '').strip() or (parsed[0] if parsed else '')
+        if not package_name or package_name.startswith('.') or '/' in package_name:
+            return jsonify({'error': '无效的包名'}), 400
+        
+        try:
+            size = int(params.get('size'))
+        except (TypeError, ValueError):
+            return jsonify({'error': '无效的文件大小'}), 400
+        
+        # skip_existing 时声明的 sha256 已经发布则不创建会话，客户端不需要发送任何分块
+        if params.get('skip_existing') and params.get('sha256'):
+            entry = _find_published(params['sha256'], filename, package_name)
+            if entry is not None:
+                return _skipped_upload(entry, params['sha256'])
+        
+        session = _upload_store().create(filename, size, package_name, params.get('sha256'))
+        return jsonify(_upload_status(session)), 201
+        
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        logger.error(f"Error creating upload session: {e}")
+        return jsonify({'error': '创建上传会话失败'}), 500
+
+
+@admin_bp.route('/uploads/<session_id>', methods=['GET'])
+def upload_status(session_id):
+    """查询已接收的字节区间（断线后据此续传）"""
+    from models.uploads import UploadError
+    try:
+        return jsonify(_upload_status(_upload_store().get(session_id)))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+
+@admin_bp.route('/uploads/<session_id>', methods=['PUT'])
+def upload_chunk(session_id):
+    """写入一个字节区间（Content-Range: bytes <start>-<end>/<total>）"""
+    from models.uploads import UploadError, parse_content_range
+    try:
+        start, end, total = parse_content_range(request.headers.get('Content-Range'))
+        session = _upload_store().write_chunk(session_id, start, end, total, request.stream)
+        return jsonify(_upload_status(session))
+        
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        logger.error(f"Error writing upload chunk for {session_id}: {e}")
+        return jsonify({'error': '写入分块失败'}), 500
+
+
+@admin_bp.route('/uploads/<session_id>/complete', methods=['POST'])
+def complete_upload(session_id):
+    """完成分块上传，交给后台任务校验并发布"""
+    from models.jobs import get_job_queue
+    from models.uploads import UploadError
+    try:
+        session, staged_path, sha256 = _upload_store().complete(session_id)
+        
+        packages_dir = get_packages_dir()
+        job_queue = get_job_queue(packages_dir, current_app.config.get('JOB_WORKERS', 2))
+        job = job_queue.submit('process_upload', {
+            'packages_dir': str(packages_dir),
+            'package_name': session['package_name'],
+            'staged_path': str(staged_path),
+            'sha256': sha256,
+            'expected_sha256': session['sha256'],
+            'action': 'uploaded',
+        })
+        
+        return jsonify({
+            'message': f"包 {session['package_name']} 已接收，正在处理",
+            'job_id': job['id'],
+            'status_url': url_for('admin.job_status', job_id=job['id'])
+        }), 202
+        
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        logger.error(f"Error completing upload {session_id}: {e}")
+        return jsonify({'error': '完成上传失败'}), 500
+
+
+@admin_bp.route('/uploads/<session_id>', methods=['DELETE'])
+def abort_upload(session_id):
+    """放弃上传会话"""
+    from models.uploads import UploadError
+    try:
+        _upload_store().abort(session_id)
+        return jsonify({'message': '上传会话已删除'})
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+
+
+@admin_bp.route('/hashes/<sha256>')
+def lookup_hash(sha256):
+    """仓库中是否已有内容为 sha256 的文件（?name= 限定包名），不存在时返回 404"""
+    try:
+        from models.repository import RepositoryManager
+        files = RepositoryManager(get_packages_dir()).catalog.find_by_hash(sha256, request.args.get('name'))
+        return jsonify({'sha256': sha256.lower(), 'exists': bool(files), 'files': files}), 200 if files else 404
+    
+    except Exception as e:
+        logger.error(f"Error looking up sha256 {sha256}: {e}")
+        return jsonify({'error': '查询失败'}), 500
+
+
+@admin_bp.route('/hashes', methods=['POST'])
+def lookup_hashes():
+    """批量查询：{"files": [{"sha256": ..., "name": 可选}, ...]}，按请求顺序返回每个文件的结果"""
+    params = request.get_json(silent=True) or {}
+    items = params.get('files')
+    if not isinstance(items, list) or not all(isinstance(item, dict) and item.get('sha256') for item in items):
+        return jsonify({'error': 'files 应为包含 sha256 的对象列表'}), 400
+    if len(items) > HASH_LOOKUP_MAX_ITEMS:
+        return jsonify({'error': f'单次最多查询 {HASH_LOOKUP_MAX_ITEMS} 个文件'}), 413
+    
+    try:
+        from models.repository import RepositoryManager
+        catalog = RepositoryManager(get_packages_dir()).catalog
+        results = []
+        for item in items:
+            sha256 = str(item['sha256'])
+            files = catalog.find_by_hash(sha256, item.get('name'))
+            results.append({'sha256': sha256.lower(), 'name': item.get('name'), 'exists': bool(files), 'files': files})
+        return jsonify({'results': results})
+    
+    except Exception as e:
+        logger.error(f"Error looking up hashes: {e}")
+        return jsonify({'error': '查询失败'}), 500
+
+
+@admin_bp.route('/scrub', methods=['GET'])
+def scrub_status():
+    """完整性巡检进度、最近一轮结果和已隔离的损坏文件"""
+    try:
+        from models.repository import RepositoryManager
+        from models.scrubber import scrubber_runner
+        return jsonify(scrubber_runner.get_status(RepositoryManager(get_packages_dir())))
+        
+    except Exception as e:
+        logger.error(f"Error getting scrub status: {e}")
+        return jsonify({'error': '获取巡检状态失败'}), 500
+
+
+@admin_bp.route('/scrub', methods=['POST'])
+def request_scrub():
+    """要求尽快开始新一轮巡检（正在进行的一轮会先完成）"""
+    try:
+        from models.repository import RepositoryManager
+        from models.scrubber import scrubber_runner
+        repo_manager = RepositoryManager(get_packages_dir())
+        if not repo_manager.storage.is_local:
+            return jsonify({'error': '完整性巡检只支持本地存储'}), 409
+        scrubber_runner.request_pass(repo_manager.packages_dir)
+        return jsonify({'message': '巡检已排队'}), 202
+        
+    except Exception as e:
+        logger.error(f"Error requesting scrub: {e}")
+        return jsonify({'error': '启动巡检失败'}), 500
+
+
+@admin_bp.route('/autoscale')
+def autoscale_status():
+    """各工作进程的负载报告、最近的扩缩容决策和工作进程回收记录（最新的在前）"""
+    try:
+        from models.autoscale import read_audit_log
+        from models.workers import read_recycle_events, read_worker_reports
+        limit = min(request.args.get('limit', 50, type=int), 1000)
+        packages_dir = get_packages_dir()
+        workers = read_worker_reports(packages_dir)
+        return jsonify({
+            'workers': workers,
+            'in_flight': sum(report['in_flight'] for report in workers),
+            'threads': sum(report['threads'] for report in workers),
+            'decisions': read_audit_log(packages_dir, limit),
+            'recycles': read_recycle_events(packages_dir, limit),
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting autoscale status: {e}")
+        return jsonify({'error': '获取扩缩容状态失败'}), 500
+
+
+@admin_bp.route('/jobs')
+def list_jobs():
+    """后台任务队列深度和各任务耗时"""
+    try:
+        from models.jobs import get_job_queue
+        job_queue = get_job_queue(get_packages_dir(), current_app.config.get('JOB_WORKERS', 2))
+        return jsonify(job_queue.summary())
+        
+    except Exception as e:
+        logger.error(f"Error listing jobs: {e}")
+        return jsonify({'error': '获取任务列表失败'}), 500
+
+
+@admin_bp.route('/jobs/<job_id>')
+def job_status(job_id):
+    """获取单个后台任务状态"""
+    try:
+        from models.jobs import get_job_queue
+        job_queue = get_job_queue(get_packages_dir(), current_app.config.get('JOB_WORKERS', 2))
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({'error': '任务不存在'}), 404
+        return jsonify(job)
+        
+    except Exception as e:
+        logger.error(f"Error getting job {job_id}: {e}")
+        return jsonify({'error': '获取任务状态失败'}), 500
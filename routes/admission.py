@@ -0,0 +1,117 @@
+"""
+Admission Routes - 下载和上传请求的准入控制
+
+在请求进入视图之前按客户端限速（429）并占用并发传输名额（503），
+索引页、JSON API 和健康检查等请求不受影响，始终有线程可用。
+被拒绝的请求带有 Retry-After，客户端（pip、CI）稍后重试即可。
+声明的文件已经发布的条件上传只查询目录，不计入上传限速。
+"""
+
+import math
+import logging
+from flask import current_app, g, jsonify, request
+
+from models.admission import get_admission_controller
+from models.hot_cache import get_configured_hot_cache
+from models.storage import get_storage
+from routes import get_packages_dir
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_ENDPOINTS = {'api.create_bundle', 'api.package_bundle'}
+DOWNLOAD_ENDPOINTS = {'views.download_file'} | BUNDLE_ENDPOINTS
+UPLOAD_ENDPOINTS = {'admin.create_upload', 'admin.upload_chunk', 'admin.complete_upload'}
+
+
+def _classify():
+    """返回请求类别（download / upload），其他请求返回None"""
+    if request.endpoint in DOWNLOAD_ENDPOINTS:
+        return 'download'
+    if request.endpoint in UPLOAD_ENDPOINTS or (request.endpoint == 'admin.upload_package'
+                                                and request.method == 'POST'):
+        return 'upload'
+    return None
+
+
+def _is_skipped_upload() -> bool:
+    """条件上传声明的文件已经发布：视图直接返回而不接收文件，不计入上传限速也不占用传输名额"""
+    from routes.admin import _find_published
+    if request.endpoint == 'admin.upload_package':
+        declared = request.headers.get('X-Upload-Sha256')
+        return bool(declared) and _find_published(declared, request.headers.get('X-Upload-Filename'),
+                                                  request.headers.get('X-Upload-Package')) is not None
+    if request.endpoint == 'admin.create_upload':
+        params = request.get_json(silent=True)
+        if not isinstance(params, dict) or not params.get('skip_existing') or not params.get('sha256'):
+            return False
+        return _find_published(params['sha256'], params.get('filename'),
+                               (params.get('package_name') or '').strip()) is not None
+    return False
+
+
+def _is_large_download(controller) -> bool:
+    """只有大文件下载占用传输名额；内存缓存中的小文件不访问磁盘"""
+    if request.endpoint in BUNDLE_ENDPOINTS:
+        return True
+    package_name = request.view_args.get('package_name', '')
+    filename = request.view_args.get('filename', '')
+    if get_configured_hot_cache(current_app.config).contains(package_name, filename):
+        return False
+    if '/' in package_name or package_name.startswith('.'):
+        return False
+    info = get_storage(get_packages_dir()).stat(package_name, filename)
+    return info is not None and info.size >= controller.large_file_size
+
+
+def _reject(status_code, message, retry_after):
+    response = jsonify({'error': message})
+    response.status_code = status_code
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def admit_request():
+    if not current_app.config.get('ADMISSION_ENABLED', True):
+        return None
+    
+    kind = _classify()
+    if kind is None:
+        return None
+    if kind == 'upload' and _is_skipped_upload():
+        return None
+    
+    controller = get_admission_controller(get_packages_dir(), current_app.config)
+    wait = controller.check_rate(kind, request.remote_addr or 'unknown')
+    if wait:
+        return _reject(429, 'Too many requests', wait)
+    
+    if kind == 'download' and not _is_large_download(controller):
+        return None
+    
+    slot = controller.acquire(kind)
+    if slot is None:
+        logger.warning(f"Rejected {kind} request from {request.remote_addr}: no transfer slot available")
+        return _reject(503, 'Server is busy', controller.retry_after)
+    g.admission_slot = slot
+    return None
+
+
+def release_on_close(response):
+    # 文件响应在视图返回后才发送，传输名额在响应关闭时释放
+    slot = g.pop('admission_slot', None)
+    if slot is not None:
+        response.call_on_close(slot.release)
+    return response
+
+
+def release_on_error(exc):
+    slot = g.pop('admission_slot', None)
+    if slot is not None:
+        slot.release()
+
+
+def init_app(app):
+    """注册准入控制钩子"""
+    app.before_request(admit_request)
+    app.after_request(release_on_close)
+    app.teardown_request(release_on_error)
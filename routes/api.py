@@ -2,9 +2,23 @@
 API Routes - 处理API相关的路由
 """
 
+import os
+import json
 import logging
-from flask import Blueprint, jsonify, request, send_from_directory
-from pathlib import Path
+import mimetypes
+from flask import Blueprint, Response, current_app, jsonify, request, send_file, send_from_directory, stream_with_context
+
+from models.admission import get_admission_controller
+from models.bundle import FORMATS as BUNDLE_FORMATS, BundleError, get_bundle_cache, plan_bundle
+from models.compression import find_variant
+from models.hot_cache import get_configured_hot_cache
+from models.locks import package_lock
+from models.scrubber import scrubber_runner
+from models.simple_pages import PAGE_FORMATS
+from models.versions import latest_version, version_key
+from models.wheel_contents import ContentsError, get_contents_reader, is_inspectable, read_member
+from models.workers import worker_summary
+from routes import canonical_redirect, get_packages_dir
 
 logger = logging.getLogger(__name__)
 
@@ -37,41 +51,140 @@ def get_stats():
     """获取统计信息"""
     try:
         from models.repository import RepositoryManager
-        repo_manager = RepositoryManager()
+        repo_manager = RepositoryManager(get_packages_dir())
         stats = repo_manager.get_stats()
+        # 当前工作进程的下载缓存命中情况
+        stats['hot_cache'] = get_configured_hot_cache(current_app.config).stats()
+        # 所有进程合计占用的传输名额
+        stats['admission'] = get_admission_controller(get_packages_dir(), current_app.config).stats()
+        stats['bundle_cache'] = _bundle_cache(repo_manager).stats()
+        stats['wheel_contents'] = get_contents_reader().stats()
+        # 存储后端（对象存储时包括本地读缓存的命中率）
+        stats['storage'] = repo_manager.storage.stats()
+        # 各工作进程的内存和按原因统计的回收次数（详情见 /admin/autoscale）
+        stats['workers'] = worker_summary(repo_manager.packages_dir)
+        # 完整性巡检结果（详情见 /admin/scrub）
+        scrub = scrubber_runner.get_status(repo_manager)
+        stats['integrity'] = {
+            **scrub['totals'],
+            'last_pass_finished_at': (scrub['last_pass'] or {}).get('finished_at'),
+            'in_progress': scrub['current_pass'] is not None,
+        }
         return jsonify(stats)
     except Exception as e:
         logger.error(f"Error getting stats: {e}")
         return jsonify({'error': 'Failed to get statistics'}), 500
 
 
-@api_bp.route('/simple/')
-def simple_index():
-    """PyPI Simple Repository API - 仓库索引"""
+@api_bp.route('/events')
+def stream_events():
+    """Server-Sent Events：仓库变更和统计信息推送
+    
+    连接建立时推送一次当前统计信息，之后只在仓库发生变化时推送
+    package 事件和新的 stats 事件，空闲时仅发送保活注释。
+    """
     try:
         from models.repository import RepositoryManager
-        repo_manager = RepositoryManager()
-        packages = repo_manager.get_packages()
-        
-        # 生成Simple Repository格式的HTML
-        html_content = """<!DOCTYPE html>
-<html>
-<head>
-    <title>Simple Package Index</title>
-</head>
-<body>
-    <h1>Simple Package Index</h1>
-    <ul>
-"""
+        from models.events import get_broker, format_sse
+        repo_manager = RepositoryManager(get_packages_dir())
+        broker = get_broker(repo_manager.packages_dir)
+        
+        max_subscribers = current_app.config.get('SSE_MAX_SUBSCRIBERS', 32)
+        if broker.subscriber_count >= max_subscribers:
+            # 仪表板收到503后退回到定时轮询
+            response = jsonify({'error': 'Too many event subscribers'})
+            response.headers['Retry-After'] = '60'
+            return response, 503
         
-        for package_name in sorted(packages.keys()):
-            html_content += f'        <li><a href="{package_name}/">{package_name}</a></li>\n'
+        keepalive = current_app.config.get('SSE_KEEPALIVE_INTERVAL', 15)
+        max_duration = current_app.config.get('SSE_MAX_DURATION', 600)
+        subscription = broker.subscribe()
         
-        html_content += """    </ul>
-</body>
-</html>"""
+        def generate():
+            deadline = time.time() + max_duration
+            try:
+                yield f"retry: {keepalive * 1000}\n\n"
+                while not subscription.closed and time.time() < deadline:
+                    item = subscription.get(timeout=keepalive)
+                    if item is None:
+                        yield ": keepalive\n\n"
+                        continue
+                    event_type, data, event_id = item
+                    yield format_sse(event_type, data, event_id)
+            finally:
+                broker.unsubscribe(subscription)
         
-        return html_content, 200, {'Content-Type': 'text/html'}
+        response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+        
+    except Exception as e:
+        logger.error(f"Error opening event stream: {e}")
+        return jsonify({'error': 'Failed to open event stream'}), 500
+
+
+def _negotiate_page_format():
+    """根据 ?format= 或 Accept 头选择 Simple API 页面格式（PEP 691）"""
+    requested = request.args.get('format')
+    if requested in PAGE_FORMATS:
+        return requested
+    
+    best = request.accept_mimetypes.best_match([
+        'text/html',
+        'application/vnd.pypi.simple.v1+html',
+        'application/vnd.pypi.simple.v1+json',
+    ], default='text/html')
+    return 'json' if best.endswith('+json') else 'html'
+
+
+# 缓存文件在发送前被并发删除时重新获取的次数
+CACHED_FILE_ATTEMPTS = 3
+
+
+def _send_cached_file(get_path, content_type):
+    """发送缓存文件，按 Accept-Encoding 选择预压缩变体；get_path() 返回None时返回None
+
+    缓存文件随时可能被并发的重新生成或失效删除：选中的变体只打开一次，内容和 ETag 都取自同一个
+    文件描述符；打开前已被删除时重新调用 get_path()（缓存缺失时会重新生成）。
+    """
+    for attempt in range(CACHED_FILE_ATTEMPTS):
+        path = get_path()
+        if path is None:
+            return None
+        encoding, variant = find_variant(path, request.headers.get('Accept-Encoding'))
+        try:
+            with open(variant, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                data = f.read()
+            break
+        except FileNotFoundError:
+            if attempt == CACHED_FILE_ATTEMPTS - 1:
+                raise
+    
+    response = Response(data, content_type=content_type)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    response.set_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}-{encoding}")
+    return response.make_conditional(request)
+
+
+def _send_cached_page(get_path, page_format):
+    """发送缓存的 Simple 页面"""
+    _, content_type = PAGE_FORMATS[page_format]
+    return _send_cached_file(get_path, content_type)
+
+
+@api_bp.route('/simple/')
+def simple_index():
+    """PyPI Simple Repository API - 仓库索引"""
+    try:
+        from models.repository import RepositoryManager
+        repo_manager = RepositoryManager(get_packages_dir())
+        page_format = _negotiate_page_format()
+        return _send_cached_page(lambda: repo_manager.page_cache.get_root_page(repo_manager, page_format),
+                                 page_format)
         
     except Exception as e:
         logger.error(f"Error generating simple index: {e}")
@@ -83,53 +196,163 @@ def package_index(package_name):
     """PyPI Simple Repository API - 包索引"""
     try:
         from models.repository import RepositoryManager
-        repo_manager = RepositoryManager()
-        files = repo_manager.get_package_files(package_name)
+        repo_manager = RepositoryManager(get_packages_dir())
+        canonical = repo_manager.resolve_package_name(package_name)
+        if canonical is not None and canonical != package_name:
+            return canonical_redirect(canonical)
+        page_format = _negotiate_page_format()
+        response = _send_cached_page(
+            lambda: repo_manager.page_cache.get_project_page(repo_manager, package_name, page_format),
+            page_format)
         
-        if not files:
+        if response is None:
             return jsonify({'error': 'Package not found'}), 404
         
-        # 生成包索引HTML
-        html_content = f"""<!DOCTYPE html>
-<html>
-<head>
-    <title>Links for {package_name}</title>
-</head>
-<body>
-    <h1>Links for {package_name}</h1>
-"""
+        return response
         
-        for file_name in files:
-            # 确定文件类型
-            if file_name.endswith('.whl'):
-                file_type = 'bdist_wheel'
-            elif file_name.endswith('.tar.gz'):
-                file_type = 'sdist'
-            else:
-                file_type = 'unknown'
-            
-            # 生成下载链接
-            download_url = f"{request.url_root.rstrip('/')}/{package_name}/{file_name}"
-            html_content += f'    <a href="{download_url}#sha256=..." data-requires-python=">=3.6">{file_name}</a><br/>\n'
+    except Exception as e:
+        logger.error(f"Error generating package index for {package_name}: {e}")
+        return jsonify({'error': 'Failed to generate package index'}), 500
+
+
+@api_bp.route('/pypi/<package_name>/json')
+def pypi_project_json(package_name):
+    """PyPI 兼容 JSON API - 项目信息（预计算文档）"""
+    try:
+        from models.repository import RepositoryManager
+        repo_manager = RepositoryManager(get_packages_dir())
+        canonical = repo_manager.resolve_package_name(package_name)
+        if canonical is not None and canonical != package_name:
+            return canonical_redirect(canonical)
+        response = _send_cached_file(
+            lambda: repo_manager.pypi_json.get_project_doc(repo_manager, package_name), 'application/json')
         
-        html_content += """</body>
-</html>"""
+        if response is None:
+            return jsonify({'message': 'Not Found'}), 404
         
-        return html_content, 200, {'Content-Type': 'text/html'}
+        return response
         
     except Exception as e:
-        logger.error(f"Error generating package index for {package_name}: {e}")
-        return jsonify({'error': 'Failed to generate package index'}), 500
+        logger.error(f"Error getting JSON API document for {package_name}: {e}")
+        return jsonify({'error': 'Failed to get package document'}), 500
+
+
+@api_bp.route('/pypi/<package_name>/<version>/json')
+def pypi_version_json(package_name, version):
+    """PyPI 兼容 JSON API - 单个版本信息（预计算文档）"""
+    try:
+        from models.repository import RepositoryManager
+        repo_manager = RepositoryManager(get_packages_dir())
+        canonical = repo_manager.resolve_package_name(package_name)
+        if canonical is not None and canonical != package_name:
+            return canonical_redirect(canonical)
+        response = _send_cached_file(
+            lambda: repo_manager.pypi_json.get_version_doc(repo_manager, package_name, version), 'application/json')
+        
+        if response is None:
+            return jsonify({'message': 'Not Found'}), 404
+        
+        return response
+        
+    except Exception as e:
+        logger.error(f"Error getting JSON API document for {package_name} {version}: {e}")
+        return jsonify({'error': 'Failed to get release document'}), 500
+
+
+# /packages 分页参数
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+PACKAGE_FIELDS = ('files', 'name', 'latest')
+
+
+def _package_entry(repo_manager, package_name, fields):
+    """按字段选择生成单个包的列表项，没有文件时返回None"""
+    if fields == 'latest':
+        latest = repo_manager.get_latest(package_name)
+        if latest is None:
+            return None
+        return {'name': package_name, 'latest': latest['version']}
+    
+    files = repo_manager.list_package_dir(package_name)
+    if not files:
+        return None
+    
+    if fields == 'name':
+        return {'name': package_name}
+    return {'name': package_name, 'files': files}
+
+
+def _iter_package_entries(repo_manager, cursor, fields, limit=None):
+    """逐个生成包列表项，只在内存中保留当前包"""
+    count = 0
+    for package_name in repo_manager.iter_package_names(after=cursor):
+        if limit is not None and count >= limit:
+            break
+        entry = _package_entry(repo_manager, package_name, fields)
+        if entry is None:
+            continue
+        count += 1
+        yield entry
 
 
 @api_bp.route('/packages')
 def list_packages():
-    """获取所有包列表（JSON格式）"""
+    """获取所有包列表（JSON格式）
+    
+    不带参数时返回完整的包名到文件列表映射（兼容旧客户端）。
+    支持的查询参数：
+    - limit / cursor: 基于游标的分页，cursor 为上一页返回的 next_cursor
+    - format=ndjson: 以 NDJSON 流式输出，每行一个包
+    - fields=files|name|latest: 字段选择
+    """
     try:
         from models.repository import RepositoryManager
-        repo_manager = RepositoryManager()
-        packages = repo_manager.get_packages()
-        return jsonify(packages)
+        repo_manager = RepositoryManager(get_packages_dir())
+        
+        output_format = request.args.get('format', 'json')
+        fields = request.args.get('fields', 'files')
+        cursor = request.args.get('cursor') or None
+        limit = request.args.get('limit')
+        
+        if fields not in PACKAGE_FIELDS:
+            return jsonify({'error': f'Invalid fields, expected one of {", ".join(PACKAGE_FIELDS)}'}), 400
+        
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                return jsonify({'error': 'Invalid limit'}), 400
+            if limit < 1:
+                return jsonify({'error': 'Invalid limit'}), 400
+        
+        if output_format == 'ndjson':
+            entries = _iter_package_entries(repo_manager, cursor, fields, limit)
+            
+            def generate():
+                for entry in entries:
+                    yield json.dumps(entry, ensure_ascii=False) + '\n'
+            
+            return Response(stream_with_context(generate()),
+                            mimetype='application/x-ndjson')
+        
+        if output_format != 'json':
+            return jsonify({'error': 'Invalid format, expected json or ndjson'}), 400
+        
+        # 兼容模式：完整映射
+        if limit is None and cursor is None and 'fields' not in request.args:
+            packages = repo_manager.get_packages()
+            return jsonify(packages)
+        
+        page_size = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        # 多取一个用于判断是否还有下一页
+        page = list(_iter_package_entries(repo_manager, cursor, fields, page_size + 1))
+        has_more = len(page) > page_size
+        page = page[:page_size]
+        
+        return jsonify({
+            'packages': page,
+            'next_cursor': page[-1]['name'] if has_more else None
+        })
     except Exception as e:
         logger.error(f"Error listing packages: {e}")
         return jsonify({'error': 'Failed to list packages'}), 500
@@ -140,7 +363,10 @@ def get_package_info(package_name):
     """获取特定包的详细信息"""
     try:
         from models.repository import RepositoryManager
-        repo_manager = RepositoryManager()
+        repo_manager = RepositoryManager(get_packages_dir())
+        canonical = repo_manager.resolve_package_name(package_name)
+        if canonical is not None and canonical != package_name:
+            return canonical_redirect(canonical)
         files = repo_manager.get_package_files(package_name)
         
         if not files:
@@ -167,5 +393,382 @@ def get_package_info(package_name):
         return jsonify({'error': 'Failed to get package info'}), 500
 
 
+@api_bp.route('/packages/<package_name>/latest')
+def get_latest_version(package_name):
+    """获取包的最新版本（从预先生成的版本摘要读取，不扫描包目录）"""
+    try:
+        from models.repository import RepositoryManager
+        repo_manager = RepositoryManager(get_packages_dir())
+        canonical = repo_manager.resolve_package_name(package_name)
+        if canonical is not None and canonical != package_name:
+            return canonical_redirect(canonical)
+        latest = repo_manager.get_latest(package_name)
+        
+        if latest is None:
+            return jsonify({'error': 'Package not found'}), 404
+        
+        base_url = request.url_root.rstrip('/')
+        return jsonify({
+            'name': package_name,
+            'version': latest['version'],
+            'versions_count': latest['versions_count'],
+            'files': [
+                {
+                    'filename': record['filename'],
+                    'url': f"{base_url}/{package_name}/{record['filename']}",
+                    'sha256': record['sha256'],
+                    'size': record['size'],
+                    'packagetype': record['packagetype'],
+                    'build': record.get('build'),
+                    'tags': record.get('tags'),
+                }
+                for record in latest['files']
+            ]
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting latest version for {package_name}: {e}")
+        return jsonify({'error': 'Failed to get latest version'}), 500
+
+
+def _package_metadata(repo_manager, package_name, base_url):
+    """由文件记录生成单个包的元数据（文件、大小、哈希和版本），没有文件时返回None"""
+    records = repo_manager.get_file_records(package_name)
+    if not records:
+        return None
+    versions = sorted({r['version'] for r in records if r.get('version')}, key=version_key)
+    return {
+        'name': package_name,
+        'versions': versions,
+        'latest': latest_version(versions),
+        'total_size': sum(r['size'] for r in records),
+        'files': [
+            {
+                'filename': r['filename'],
+                'url': f"{base_url}/{package_name}/{r['filename']}",
+                'version': r.get('version'),
+                'size': r['size'],
+                'sha256': r['sha256'],
+                'packagetype': r['packagetype'],
+                'requires_python': r.get('requires_python'),
+                'upload_time': r.get('upload_time'),
+                'yanked': r.get('yanked'),
+            }
+            for r in records
+        ],
+    }
+
+
+@api_bp.route('/packages/batch', methods=['POST'])
+def get_packages_batch():
+    """一次返回多个包的元数据，代替逐个请求 /packages/<name>
+
+    请求体（JSON）二选一：
+    - names: 包名列表（按 PEP 503 规范化匹配），最多 MAX_PAGE_SIZE 个
+    - since: 仓库序列号，返回此后有变更的包；变更历史不完整时返回全部包（full 为 true）
+
+    返回当前仓库序列号 serial（下次以它作为 since）、packages 和不存在的包名 missing
+    （since 模式下为已经删除的包）。
+    """
+    from models.events import ChangeJournal
+    from models.repository import RepositoryManager
+    
+    params = request.get_json(silent=True)
+    if not isinstance(params, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    names = params.get('names')
+    since = params.get('since')
+    if (names is None) == (since is None):
+        return jsonify({'error': 'Expected exactly one of names or since'}), 400
+    if names is not None and (not isinstance(names, list) or not all(isinstance(n, str) for n in names)):
+        return jsonify({'error': 'names must be a list of strings'}), 400
+    if names is not None and len(names) > MAX_PAGE_SIZE:
+        return jsonify({'error': f'At most {MAX_PAGE_SIZE} names per request'}), 413
+    if since is not None and (not isinstance(since, int) or isinstance(since, bool) or since < 0):
+        return jsonify({'error': 'since must be a non-negative serial'}), 400
+    
+    try:
+        repo_manager = RepositoryManager(get_packages_dir())
+        # 先读取序列号：读取期间发生的变更会在下一次增量请求中再次返回
+        serial = ChangeJournal(repo_manager.packages_dir).current_serial()
+        full = False
+        if since is not None:
+            names = ChangeJournal(repo_manager.packages_dir).changed_since(since)
+            if names is None:
+                full = True
+                names = list(repo_manager.iter_package_names())
+        
+        base_url = request.url_root.rstrip('/')
+        packages, missing = [], []
+        for name in names:
+            canonical = repo_manager.resolve_package_name(name)
+            metadata = _package_metadata(repo_manager, canonical, base_url) if canonical else None
+            if metadata is None:
+                missing.append(name)
+            else:
+                packages.append(metadata)
+        
+        response = {'serial': serial, 'packages': packages, 'missing': missing}
+        if since is not None:
+            response['full'] = full
+        return jsonify(response)
+    
+    except Exception as e:
+        logger.error(f"Error getting package metadata batch: {e}")
+        return jsonify({'error': 'Failed to get package metadata'}), 500
+
+
+def _open_inspectable(repo_manager, package_name, filename):
+    """在读锁内打开 zip 格式的包文件，返回 (文件记录, 文件对象)"""
+    if not is_inspectable(filename):
+        raise ContentsError('Only wheel and zip files can be inspected')
+    files = repo_manager.list_package_dir(package_name)
+    if filename not in files:
+        raise ContentsError('File not found', 404)
+    with package_lock(repo_manager.packages_dir, package_name):
+        record = repo_manager.catalog.ensure_records(package_name, files)[filename]
+        # 对象存储中未缓存的文件按需发送 Range 请求，只读取中央目录和所需成员
+        handle = repo_manager.storage.open(package_name, filename)
+    return record, handle
+
+
+@api_bp.route('/packages/<package_name>/<filename>/contents')
+def list_wheel_contents(package_name, filename):
+    """列出 wheel 中的文件（只读取 zip 中央目录），pattern 参数按通配符过滤，如 *.so"""
+    try:
+        from models.repository import RepositoryManager
+        repo_manager = RepositoryManager(get_packages_dir())
+        canonical = repo_manager.resolve_package_name(package_name)
+        if canonical is not None and canonical != package_name:
+            return canonical_redirect(canonical)
+        
+        record, handle = _open_inspectable(repo_manager, package_name, filename)
+        with handle:
+            directory = get_contents_reader().directory(handle, record['sha256'])
+        
+        return jsonify({
+            'name': package_name,
+            'filename': filename,
+            'sha256': record['sha256'],
+            'size': record['size'],
+            'summary': directory.summary(),
+            'files': directory.list(request.args.get('pattern')),
+        })
+    except ContentsError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        logger.error(f"Error listing contents of {package_name}/{filename}: {e}")
+        return jsonify({'error': 'Failed to read file contents'}), 500
+
+
+@api_bp.route('/packages/<package_name>/<filename>/contents/<path:member>')
+def get_wheel_member(package_name, filename, member):
+    """读取 wheel 中的单个文件；RECORD、METADATA 等可以省略 .dist-info 目录"""
+    try:
+        from models.repository import RepositoryManager
+        repo_manager = RepositoryManager(get_packages_dir())
+        canonical = repo_manager.resolve_package_name(package_name)
+        if canonical is not None and canonical != package_name:
+            return canonical_redirect(canonical)
+        
+        record, handle = _open_inspectable(repo_manager, package_name, filename)
+        try:
+            directory = get_contents_reader().directory(handle, record['sha256'])
+            entry = directory.find(member)
+            if entry is None:
+                raise ContentsError(f'{member} not found in {filename}', 404)
+            max_size = current_app.config.get('INSPECT_MAX_MEMBER_SIZE', 64 * 1024 * 1024)
+            if entry.size > max_size:
+                raise ContentsError(f'{entry.name} is larger than {max_size} bytes, download the file instead', 413)
+            # 先读取第一块，本地文件头损坏或不支持的压缩方式可以返回错误而不是中断的响应
+            chunks = read_member(handle, entry)
+            first = next(chunks, b'')
+        except Exception:
+            handle.close()
+            raise
+        
+        def generate():
+            yield first
+            yield from chunks
+        
+        in_dist_info = entry.name.startswith(f"{directory.dist_info}/")
+        mimetype = mimetypes.guess_type(entry.name)[0] or ('text/plain' if in_dist_info else 'application/octet-stream')
+        response = Response(generate(), mimetype=mimetype, direct_passthrough=True)
+        response.content_length = entry.size
+        response.set_etag(f"{record['sha256'][:16]}-{entry.crc:08x}")
+        response.call_on_close(handle.close)
+        return response.make_conditional(request)
+    except ContentsError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        logger.error(f"Error reading {member} from {package_name}/{filename}: {e}")
+        return jsonify({'error': 'Failed to read file contents'}), 500
+
+
+@api_bp.route('/resolve', methods=['POST'])
+def resolve_requirements():
+    """在服务端解析一组需求的依赖闭包，返回所有需要下载的文件
+
+    请求体（JSON）：
+    - requirements: PEP 508 需求列表
+    - python_version: 目标 Python 版本，如 "3.11"
+    - platforms: 目标平台标签列表，如 ["manylinux_2_17_x86_64"]
+    - implementation / abis / environment: 可选，默认 CPython 及按平台推导的环境标记
+    - prereleases / allow_sdist: 可选，是否允许预发布版本（默认否）和 sdist（默认是）
+    """
+    from models.repository import RepositoryManager
+    from models.resolver import ResolutionError
+    
+    params = request.get_json(silent=True)
+    if not isinstance(params, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    
+    try:
+        result = _resolve(RepositoryManager(get_packages_dir()), params)
+    except ResolutionError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        logger.error(f"Error resolving {params.get('requirements')}: {e}")
+        return jsonify({'error': 'Failed to resolve requirements'}), 500
+    
+    base_url = request.url_root.rstrip('/')
+    response = dict(result, files=[
+        dict(entry, url=f"{base_url}/{entry['name']}/{entry['filename']}#sha256={entry['sha256']}")
+        for entry in result['files']
+    ])
+    return jsonify(response)
+
+
+def _resolve(repo_manager, params):
+    """按 /resolve 的请求字段解析依赖闭包，参数无效时抛出 ResolutionError(400)"""
+    from models.resolver import ResolutionError, Target, get_dependency_graph
+    
+    requirements = params.get('requirements')
+    if not isinstance(requirements, list) or not requirements or not all(isinstance(r, str) for r in requirements):
+        raise ResolutionError('requirements must be a non-empty list of strings', 400)
+    platforms = params.get('platforms')
+    if not isinstance(platforms, list) or not all(isinstance(p, str) for p in platforms):
+        raise ResolutionError('platforms must be a list of platform tags', 400)
+    
+    target = Target(
+        str(params.get('python_version', '')),
+        platforms,
+        implementation=params.get('implementation') or 'cp',
+        abis=params.get('abis'),
+        environment=params.get('environment'),
+    )
+    return get_dependency_graph(repo_manager).resolve(
+        requirements, target,
+        prereleases=bool(params.get('prereleases', False)),
+        allow_sdist=bool(params.get('allow_sdist', True)),
+    )
+
+
+def _bundle_cache(repo_manager):
+    return get_bundle_cache(repo_manager.packages_dir,
+                            current_app.config.get('BUNDLE_CACHE_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+
+
+def _plan_bundle(repo_manager, params):
+    """根据文件列表或需求生成归档清单"""
+    fmt = params.get('format') or 'tar'
+    max_files = current_app.config.get('BUNDLE_MAX_FILES', 1000)
+    files = params.get('files')
+    if files is not None:
+        if (not isinstance(files, list) or not files
+                or not all(isinstance(f, dict) and isinstance(f.get('name'), str)
+                           and isinstance(f.get('filename'), str) for f in files)):
+            raise BundleError('files must be a non-empty list of {"name", "filename"} objects')
+        return plan_bundle(repo_manager, files, fmt, max_files=max_files)
+    
+    result = _resolve(repo_manager, params)
+    return plan_bundle(repo_manager, result['files'], fmt, requirements=params['requirements'],
+                       missing=result['missing'], max_files=max_files)
+
+
+def _send_bundle(repo_manager, plan):
+    """发送归档：缓存命中时直接发送缓存文件，否则边打包边发送"""
+    cache = _bundle_cache(repo_manager)
+    cached = cache.lookup(plan)
+    if cached is not None:
+        return send_file(cached, mimetype=BUNDLE_FORMATS[plan.format], as_attachment=True,
+                         download_name=plan.filename, etag=plan.key)
+    
+    if request.method == 'GET' and plan.key in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(plan.key)
+        return response
+    
+    bundle = plan.open()
+    size = bundle.content_length()
+    chunks = bundle.iter_chunks()
+    if cache.should_store(plan, size):
+        chunks = cache.tee(plan, chunks)
+    
+    response = Response(chunks, mimetype=BUNDLE_FORMATS[plan.format], direct_passthrough=True)
+    if size is not None:
+        response.content_length = size
+    response.headers['Content-Disposition'] = f'attachment; filename={plan.filename}'
+    response.set_etag(plan.key)
+    response.call_on_close(bundle.close)
+    return response
+
+
+@api_bp.route('/bundle', methods=['POST'])
+def create_bundle():
+    """把一组文件或一组需求的依赖闭包打成 tar/zip 归档，用于离线安装
+
+    请求体（JSON）：
+    - files: [{"name", "filename"}]，直接指定文件；或者
+    - requirements 等 /resolve 的字段：打包解析得到的依赖闭包
+    - format: tar（默认）或 zip
+    """
+    from models.repository import RepositoryManager
+    from models.resolver import ResolutionError
+    
+    params = request.get_json(silent=True)
+    if not isinstance(params, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    
+    try:
+        repo_manager = RepositoryManager(get_packages_dir())
+        return _send_bundle(repo_manager, _plan_bundle(repo_manager, params))
+    except (ResolutionError, BundleError) as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        logger.error(f"Error creating bundle: {e}")
+        return jsonify({'error': 'Failed to create bundle'}), 500
+
+
+@api_bp.route('/packages/<package_name>/bundle')
+def package_bundle(package_name):
+    """打包一个包（可指定版本）及其依赖闭包
+
+    查询参数：version、python_version、platform（可重复）、prereleases、allow_sdist、format
+    """
+    from models.repository import RepositoryManager
+    from models.resolver import ResolutionError
+    
+    version = request.args.get('version')
+    params = {
+        'requirements': [f"{package_name}=={version}" if version else package_name],
+        'python_version': request.args.get('python_version', ''),
+        'platforms': request.args.getlist('platform'),
+        'prereleases': request.args.get('prereleases', '').lower() in ['true', 'on', '1'],
+        'allow_sdist': request.args.get('allow_sdist', 'true').lower() in ['true', 'on', '1'],
+        'format': request.args.get('format'),
+    }
+    try:
+        repo_manager = RepositoryManager(get_packages_dir())
+        if repo_manager.resolve_package_name(package_name) is None:
+            return jsonify({'error': 'Package not found'}), 404
+        return _send_bundle(repo_manager, _plan_bundle(repo_manager, params))
+    except (ResolutionError, BundleError) as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except Exception as e:
+        logger.error(f"Error creating bundle for {package_name}: {e}")
+        return jsonify({'error': 'Failed to create bundle'}), 500
+
+
 # 导入time模块
 import time 
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""
+Load Routes - 统计工作进程正在处理的请求数和请求延迟
+
+计数写入 models.workers.worker_load，由负载报告线程定期写出，供自动扩缩容使用。
+文件响应在视图返回后才发送，请求在响应关闭时才算结束；/events 长连接不计入。
+"""
+
+import time
+from flask import g, request
+
+from models.workers import worker_load
+
+# 长连接只占用线程，不代表负载
+UNTRACKED_ENDPOINTS = {'api.stream_events'}
+
+
+def begin_request():
+    if request.endpoint in UNTRACKED_ENDPOINTS:
+        return None
+    worker_load.begin()
+    g.load_started = time.monotonic()
+    return None
+
+
+def end_on_close(response):
+    started = g.pop('load_started', None)
+    if started is not None:
+        failed = response.status_code >= 500
+        response.call_on_close(lambda: worker_load.end(time.monotonic() - started, failed))
+    return response
+
+
+def end_on_error(exc):
+    started = g.pop('load_started', None)
+    if started is not None:
+        worker_load.end(time.monotonic() - started, True)
+
+
+def init_app(app):
+    """注册请求计数钩子（在准入控制之前，被拒绝的请求同样计入）"""
+    app.before_request(begin_request)
+    app.after_request(end_on_close)
+    app.teardown_request(end_on_error)
@@ -3,8 +3,14 @@ View Routes - 处理页面渲染和文件服务
 """
 
 import logging
-from flask import Blueprint, render_template, send_from_directory, abort, request
-from pathlib import Path
+import mimetypes
+from flask import Blueprint, Response, current_app, render_template, send_from_directory, abort, request
+from werkzeug.exceptions import HTTPException
+
+from models.hot_cache import get_configured_hot_cache
+from models.locks import package_lock
+from models.storage import get_storage
+from routes import canonical_redirect, get_packages_dir
 
 logger = logging.getLogger(__name__)
 
@@ -17,7 +23,7 @@ def dashboard():
     """管理仪表板主页"""
     try:
         from models.repository import RepositoryManager
-        repo_manager = RepositoryManager()
+        repo_manager = RepositoryManager(get_packages_dir())
         packages = repo_manager.get_packages()
         stats = repo_manager.get_stats()
         stats['uptime_hours'] = round(stats['uptime'] / 3600, 1)
@@ -35,7 +41,10 @@ def package_page(package_name):
     """包详情页面"""
     try:
         from models.repository import RepositoryManager
-        repo_manager = RepositoryManager()
+        repo_manager = RepositoryManager(get_packages_dir())
+        canonical = repo_manager.resolve_package_name(package_name)
+        if canonical is not None and canonical != package_name:
+            return canonical_redirect(canonical)
         files = repo_manager.get_package_files(package_name)
         
         if not files:
@@ -55,21 +64,46 @@ def package_page(package_name):
         return "Internal server error", 500
 
 
+def _send_hot_object(obj, filename):
+    """从内存发送文件，支持条件请求和 Range"""
+    response = Response(obj.data, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    response.last_modified = obj.mtime
+    response.set_etag(f"{obj.generation[1]:x}-{obj.generation[2]:x}")
+    response.cache_control.public = True
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(obj.data))
+
+
 @views_bp.route('/<package_name>/<filename>')
 def download_file(package_name, filename):
     """下载包文件"""
     try:
+        # 热点小文件直接从内存发送，不访问包目录
+        hot_cache = get_configured_hot_cache(current_app.config)
+        obj = hot_cache.get(get_storage(get_packages_dir()), package_name, filename)
+        if obj is not None:
+            return _send_hot_object(obj, filename)
+        
         from models.repository import RepositoryManager
-        repo_manager = RepositoryManager()
-        files = repo_manager.get_package_files(package_name)
+        repo_manager = RepositoryManager(get_packages_dir())
+        canonical = repo_manager.resolve_package_name(package_name)
+        if canonical is not None and canonical != package_name:
+            return canonical_redirect(canonical)
+        files = repo_manager.list_package_dir(package_name)
         
         if filename not in files:
             abort(404)
         
-        # 发送文件
-        package_dir = Path(repo_manager.packages_dir) / package_name
-        return send_from_directory(package_dir, filename)
+        # 发送文件：读锁内打开文件，之后的删除（移入回收站）不影响正在进行的下载；
+        # 对象存储中的文件先下载到本地缓存，再从缓存发送
+        with package_lock(repo_manager.packages_dir, package_name):
+            obj = hot_cache.admit(repo_manager.storage, package_name, filename)
+            if obj is not None:
+                return _send_hot_object(obj, filename)
+            path = repo_manager.storage.local_path(package_name, filename)
+            return send_from_directory(path.parent.resolve(), path.name)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error downloading file {package_name}/{filename}: {e}")
         return "Internal server error", 500
@@ -86,7 +120,7 @@ def manage_page():
     """包管理页面"""
     try:
         from models.repository import RepositoryManager
-        repo_manager = RepositoryManager()
+        repo_manager = RepositoryManager(get_packages_dir())
         packages = repo_manager.get_packages()
         
         return render_template('manage.html', packages=packages)
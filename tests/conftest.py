@@ -0,0 +1,17 @@
+"""
+测试公共配置：把项目根目录加入导入路径，并提供临时的包目录
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+@pytest.fixture
+def packages_dir(tmp_path):
+    path = tmp_path / 'packages'
+    path.mkdir()
+    return path
@@ -0,0 +1,67 @@
+"""
+准入控制（routes/admission.py）的测试：已发布文件的条件上传不计入上传限速
+"""
+
+import hashlib
+import io
+import zipfile
+
+import pytest
+
+from models.repository import RepositoryManager
+
+FILENAME = 'demo-1.0-py3-none-any.whl'
+
+
+def wheel_bytes():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('demo/__init__.py', 'VERSION = "1.0"\n')
+        archive.writestr('demo-1.0.dist-info/METADATA', 'Metadata-Version: 2.1\nName: demo\nVersion: 1.0\n')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def published(tmp_path):
+    data = wheel_bytes()
+    source = tmp_path / FILENAME
+    source.write_bytes(data)
+    assert RepositoryManager(str(tmp_path / 'packages')).add_package('demo', str(source))
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from app import create_app
+    app = create_app()
+    app.config.update(RATE_LIMIT_UPLOAD_RATE=0.001, RATE_LIMIT_UPLOAD_BURST=1, ADMISSION_MAX_UPLOADS=1)
+    return app.test_client()
+
+
+def create_upload(client, sha256, skip_existing=True):
+    return client.post('/admin/uploads', json={'filename': FILENAME, 'size': 100, 'sha256': sha256,
+                                               'skip_existing': skip_existing})
+
+
+def test_skipped_chunked_uploads_are_not_rate_limited(published, client):
+    for _ in range(3):
+        response = create_upload(client, published)
+        assert response.status_code == 200
+        assert response.get_json()['exists'] is True
+    
+    # 需要传输的上传仍然受限速
+    assert create_upload(client, published, skip_existing=False).status_code == 201
+    assert create_upload(client, published, skip_existing=False).status_code == 429
+
+
+def test_skipped_form_uploads_are_not_rate_limited(published, client):
+    headers = {'X-Upload-Sha256': published, 'X-Upload-Filename': FILENAME}
+    for _ in range(3):
+        response = client.post('/admin/upload', headers=headers)
+        assert response.status_code == 200
+        assert response.get_json()['exists'] is True
+    
+    # 声明的文件未发布时照常计入
+    assert create_upload(client, '0' * 64).status_code == 201
+    assert create_upload(client, '0' * 64).status_code == 429
@@ -0,0 +1,61 @@
+"""
+缓存页面发送（routes/api.py 的 _send_cached_file）的测试：缓存文件被并发删除时不返回 500
+"""
+
+import gzip
+import json
+
+import pytest
+
+import routes.api
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    package_dir = tmp_path / 'packages' / 'demo'
+    package_dir.mkdir(parents=True)
+    (package_dir / 'demo-1.0.tar.gz').write_bytes(b'sdist')
+    
+    from app import create_app
+    return create_app().test_client()
+
+
+@pytest.fixture
+def racing_invalidate(monkeypatch):
+    """选择变体后、打开文件前删除缓存（模拟并发的上传失效缓存），只发生一次"""
+    from models.repository import RepositoryManager
+    original = routes.api.find_variant
+    calls = []
+    
+    def find_variant(path, header):
+        result = original(path, header)
+        if not calls:
+            RepositoryManager().invalidate('demo')
+        calls.append(path)
+        return result
+    
+    monkeypatch.setattr(routes.api, 'find_variant', find_variant)
+    return calls
+
+
+@pytest.mark.parametrize('url', ['/simple/', '/simple/demo/', '/pypi/demo/json', '/pypi/demo/1.0/json'])
+def test_page_removed_while_sending_is_regenerated(client, racing_invalidate, url):
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert len(racing_invalidate) == 2
+    body = response.get_data()
+    if response.headers.get('Content-Encoding') == 'gzip':
+        body = gzip.decompress(body)
+    assert b'demo' in body
+
+
+def test_etag_matches_sent_variant(client):
+    response = client.get('/simple/demo/', headers={'Accept': 'application/vnd.pypi.simple.v1+json'})
+    assert response.status_code == 200
+    assert json.loads(response.get_data())['files'][0]['filename'] == 'demo-1.0.tar.gz'
+    
+    etag = response.headers['ETag']
+    cached = client.get('/simple/demo/', headers={'Accept': 'application/vnd.pypi.simple.v1+json',
+                                                  'If-None-Match': etag})
+    assert cached.status_code == 304
@@ -0,0 +1,35 @@
+"""
+请求处理使用配置的包目录（PACKAGES_DIR），而不是工作目录下的 packages
+"""
+
+import pytest
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    packages_dir = tmp_path / 'data' / 'repo'
+    (packages_dir / 'demo').mkdir(parents=True)
+    (packages_dir / 'demo' / 'demo-1.0.tar.gz').write_bytes(b'sdist')
+    
+    from app import create_app
+    app = create_app()
+    app.config['PACKAGES_DIR'] = str(packages_dir)
+    return app.test_client()
+
+
+def test_index_and_download_use_configured_directory(client, tmp_path):
+    response = client.get('/simple/demo/')
+    assert response.status_code == 200
+    assert b'demo-1.0.tar.gz' in response.get_data()
+    
+    response = client.get('/demo/demo-1.0.tar.gz')
+    assert response.status_code == 200
+    assert response.get_data() == b'sdist'
+    assert not (tmp_path / 'packages').exists()
+
+
+def test_admin_jobs_use_configured_directory(client, tmp_path):
+    assert client.get('/admin/jobs').status_code == 200
+    assert (tmp_path / 'data' / 'repo' / '.repo').exists()
+    assert not (tmp_path / 'packages').exists()
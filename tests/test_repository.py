@@ -0,0 +1,44 @@
+"""
+仓库管理器（models/repository.py）添加包文件的测试
+"""
+
+import io
+import zipfile
+
+import pytest
+
+from models.jobs import DONE, FAILED, get_job_queue
+from models.repository import RepositoryManager
+
+
+@pytest.fixture
+def repo(packages_dir):
+    return RepositoryManager(str(packages_dir))
+
+
+def write_wheel(path):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('demo/__init__.py', 'VERSION = "1.0"\n')
+        archive.writestr('demo-1.0.dist-info/METADATA', 'Metadata-Version: 2.1\nName: demo\nVersion: 1.0\n')
+    path.write_bytes(buffer.getvalue())
+    return path
+
+
+def test_add_package_runs_upload_job(repo, tmp_path):
+    source = write_wheel(tmp_path / 'demo-1.0-py3-none-any.whl')
+    assert repo.add_package('demo', str(source))
+    assert repo.get_package_files('demo') == ['demo-1.0-py3-none-any.whl']
+    
+    jobs = get_job_queue(repo.packages_dir).list_jobs()
+    assert [(job['type'], job['status']) for job in jobs] == [('process_upload', DONE)]
+
+
+def test_add_package_rejects_invalid_archive(repo, tmp_path):
+    source = tmp_path / 'demo-1.0-py3-none-any.whl'
+    source.write_bytes(b'not a zip file')
+    assert not repo.add_package('demo', str(source))
+    assert not (repo.packages_dir / 'demo').exists()
+    
+    jobs = get_job_queue(repo.packages_dir).list_jobs()
+    assert [job['status'] for job in jobs] == [FAILED]
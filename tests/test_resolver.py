@@ -0,0 +1,197 @@
+"""
+依赖解析（models/resolver.py 的回溯求解）的测试，使用内存中的合成文件记录
+"""
+
+import pytest
+
+import models.resolver as resolver
+from models.resolver import Project, ResolutionError, Target, _Resolution
+from models.versions import normalize_name
+
+LINUX = Target('3.11', ['manylinux_2_17_x86_64'])
+WINDOWS = Target('3.11', ['win_amd64'])
+
+
+def wheel(name, version, requires=(), requires_python=None, yanked=None, platform='any', abi='none', python='py3'):
+    return {
+        'filename': f"{name}-{version}-{python}-{abi}-{platform}.whl",
+        'version': version,
+        'packagetype': 'bdist_wheel',
+        'tags': {'python': python, 'abi': abi, 'platform': platform},
+        'sha256': f"{name}-{version}-{platform}".encode().hex(),
+        'size': 100,
+        'requires_dist': list(requires),
+        'requires_python': requires_python,
+        'yanked': yanked,
+    }
+
+
+def sdist(name, version, requires=()):
+    return {
+        'filename': f"{name}-{version}.tar.gz",
+        'version': version,
+        'packagetype': 'sdist',
+        'sha256': f"{name}-{version}".encode().hex(),
+        'size': 100,
+        'requires_dist': list(requires),
+        'requires_python': None,
+        'yanked': None,
+    }
+
+
+class FakeGraph:
+    """只提供 get_project() 的依赖图"""
+    
+    def __init__(self, *records):
+        self.projects = {}
+        for record in records:
+            name = normalize_name(record['filename'].split('-')[0])
+            self.projects.setdefault(name, []).append(record)
+    
+    def get_project(self, name):
+        records = self.projects.get(name)
+        return Project(name, records) if records else None
+
+
+def resolve(graph, requirements, target=LINUX, prereleases=False, allow_sdist=True):
+    return _Resolution(graph, target, prereleases, allow_sdist).run(requirements)
+
+
+def pinned(result):
+    return {item['name']: item['version'] for item in result['files']}
+
+
+def test_selects_highest_versions_of_transitive_dependencies():
+    graph = FakeGraph(
+        wheel('app', '1.0', ['lib>=1.0']),
+        wheel('lib', '1.0'), wheel('lib', '1.5'), wheel('lib', '2.0', ['util']),
+        wheel('util', '0.1'),
+    )
+    assert pinned(resolve(graph, ['app'])) == {'app': '1.0', 'lib': '2.0', 'util': '0.1'}
+
+
+def test_backtracks_when_dependency_has_no_candidate():
+    graph = FakeGraph(
+        wheel('app', '2.0', ['lib<1.0']),
+        wheel('app', '1.0', ['lib>=1.0']),
+        wheel('lib', '1.0'), wheel('lib', '2.0'),
+    )
+    assert pinned(resolve(graph, ['app'])) == {'app': '1.0', 'lib': '2.0'}
+
+
+def test_backtracks_over_earlier_pin_on_later_conflict():
+    graph = FakeGraph(
+        wheel('a', '2.0', ['b==2.0']), wheel('a', '1.0', ['b']),
+        wheel('b', '1.0'), wheel('b', '2.0'),
+        wheel('c', '1.0', ['b<2']),
+    )
+    # a 2.0 需要 b 2.0，与 c 冲突；回退到 a 1.0 后 b 先选 2.0 再回退到 1.0
+    assert pinned(resolve(graph, ['a', 'c'])) == {'a': '1.0', 'b': '1.0', 'c': '1.0'}
+
+
+def test_extras_pull_in_optional_dependencies():
+    graph = FakeGraph(
+        wheel('app', '1.0', ['speedups; extra == "fast"', 'docs-theme; extra == "docs"']),
+        wheel('speedups', '1.0'), wheel('docs-theme', '1.0'),
+    )
+    assert pinned(resolve(graph, ['app'])) == {'app': '1.0'}
+    
+    result = resolve(graph, ['app[fast]'])
+    assert pinned(result) == {'app': '1.0', 'speedups': '1.0'}
+    assert result['files'][0]['extras'] == ['fast']
+
+
+def test_extras_requested_later_add_dependencies_to_existing_pin():
+    graph = FakeGraph(
+        wheel('app', '1.0', ['speedups; extra == "fast"']),
+        wheel('plugin', '1.0', ['app[fast]']),
+        wheel('speedups', '1.0'),
+    )
+    result = resolve(graph, ['app', 'plugin'])
+    assert pinned(result) == {'app': '1.0', 'plugin': '1.0', 'speedups': '1.0'}
+    assert next(item for item in result['files'] if item['name'] == 'app')['extras'] == ['fast']
+
+
+def test_markers_are_evaluated_for_target_environment():
+    graph = FakeGraph(
+        wheel('app', '1.0', ['winutil; sys_platform == "win32"', 'backport; python_version < "3.8"']),
+        wheel('winutil', '1.0'), wheel('backport', '1.0'),
+    )
+    assert pinned(resolve(graph, ['app'])) == {'app': '1.0'}
+    assert pinned(resolve(graph, ['app'], target=WINDOWS)) == {'app': '1.0', 'winutil': '1.0'}
+    # 顶层需求的标记同样生效
+    assert pinned(resolve(graph, ['app', 'backport; python_version < "3.8"'])) == {'app': '1.0'}
+
+
+def test_yanked_version_only_used_when_pinned():
+    graph = FakeGraph(wheel('lib', '1.0'), wheel('lib', '2.0', yanked='broken'))
+    assert pinned(resolve(graph, ['lib'])) == {'lib': '1.0'}
+    assert pinned(resolve(graph, ['lib==2.0'])) == {'lib': '2.0'}
+
+
+def test_yanked_only_candidate_is_not_selected():
+    graph = FakeGraph(wheel('lib', '1.0'), wheel('lib', '2.0', yanked='broken'))
+    with pytest.raises(ResolutionError) as error:
+        resolve(graph, ['lib>=1.5'])
+    assert error.value.status_code == 409
+    assert 'No version of lib satisfies lib>=1.5' in str(error.value)
+
+
+def test_wheel_tags_and_requires_python_filter_files():
+    graph = FakeGraph(
+        wheel('native', '2.0', platform='win_amd64', abi='cp311', python='cp311'),
+        wheel('native', '1.5', requires_python='<3.10'),
+        wheel('native', '1.0', platform='manylinux_2_17_x86_64', abi='cp311', python='cp311'),
+        sdist('native', '1.0'),
+    )
+    result = resolve(graph, ['native'])
+    assert result['files'][0]['filename'] == 'native-1.0-cp311-cp311-manylinux_2_17_x86_64.whl'
+    assert pinned(resolve(graph, ['native'], target=WINDOWS)) == {'native': '2.0'}
+
+
+def test_sdist_only_when_allowed():
+    graph = FakeGraph(sdist('pure', '1.0'))
+    assert resolve(graph, ['pure'])['files'][0]['packagetype'] == 'sdist'
+    with pytest.raises(ResolutionError):
+        resolve(graph, ['pure'], allow_sdist=False)
+
+
+def test_missing_packages_are_reported_not_resolved():
+    graph = FakeGraph(wheel('app', '1.0', ['requests>=2', 'lib']), wheel('lib', '1.0'))
+    result = resolve(graph, ['app'])
+    assert pinned(result) == {'app': '1.0', 'lib': '1.0'}
+    assert result['missing'] == ['requests>=2']
+
+
+def test_conflict_names_the_requiring_package():
+    graph = FakeGraph(wheel('lib', '1.0'), wheel('lib', '2.0'), wheel('app', '1.0', ['lib>=2']))
+    with pytest.raises(ResolutionError) as error:
+        resolve(graph, ['lib==1.0', 'app'])
+    assert error.value.status_code == 409
+    assert str(error.value) == 'lib 1.0 was selected, but lib>=2 (required by app 1.0) conflicts with it'
+
+
+def test_invalid_requirement_is_client_error():
+    with pytest.raises(ResolutionError) as error:
+        resolve(FakeGraph(), ['not a requirement!'])
+    assert error.value.status_code == 400
+
+
+def test_prereleases_only_when_requested():
+    graph = FakeGraph(wheel('lib', '1.0'), wheel('lib', '2.0b1'))
+    assert pinned(resolve(graph, ['lib'])) == {'lib': '1.0'}
+    assert pinned(resolve(graph, ['lib'], prereleases=True)) == {'lib': '2.0b1'}
+
+
+def test_resolution_rounds_are_bounded(monkeypatch):
+    monkeypatch.setattr(resolver, 'MAX_RESOLUTION_ROUNDS', 10)
+    # 每个版本都依赖不存在的 lib 版本，所有候选都会被尝试
+    graph = FakeGraph(*[wheel('app', f'1.{minor}', ['lib>=9']) for minor in range(20)], wheel('lib', '1.0'))
+    with pytest.raises(ResolutionError) as error:
+        resolve(graph, ['app'])
+    assert 'too complex' in str(error.value)
+    
+    monkeypatch.setattr(resolver, 'MAX_RESOLUTION_ROUNDS', 100)
+    with pytest.raises(ResolutionError) as error:
+        resolve(graph, ['app'])
+    assert 'No version of lib satisfies lib>=9' in str(error.value)
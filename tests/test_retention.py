@@ -0,0 +1,79 @@
+"""
+保留策略（models/retention.py）的测试
+"""
+
+import json
+import os
+import time
+
+import pytest
+from packaging.version import Version
+
+from models.repository import RepositoryManager
+from models.retention import RetentionEngine, RetentionPolicy, load_policies
+
+DAY = 86400
+
+
+@pytest.fixture
+def repo(packages_dir):
+    return RepositoryManager(str(packages_dir))
+
+
+def add_files(repo, package_name, *files):
+    """创建文件，files 为 (文件名, 距今天数)"""
+    package_dir = repo.packages_dir / package_name
+    package_dir.mkdir(exist_ok=True)
+    for filename, age_days in files:
+        path = package_dir / filename
+        path.write_bytes(b'x' * 10)
+        mtime = time.time() - age_days * DAY
+        os.utime(path, (mtime, mtime))
+
+
+def expired_versions(report, package_name):
+    entry = report['packages'].get(package_name)
+    return [version['version'] for version in entry['versions']] if entry else []
+
+
+def test_pinned_versions_match_equivalent_spellings(repo):
+    add_files(repo, 'demo', ('demo-1.0-py3-none-any.whl', 30), ('demo-1.1.tar.gz', 20),
+              ('demo-2.0.tar.gz', 10), ('demo-3.0.tar.gz', 1))
+    engine = RetentionEngine(repo, {'default': {}, 'packages': {'demo': {'keep_latest': 1, 'pinned': ['1.0.0']}}})
+    assert expired_versions(engine.plan('demo'), 'demo') == ['2.0', '1.1']
+
+
+def test_equivalent_versions_count_as_one_release(repo):
+    add_files(repo, 'demo', ('demo-1.0-py3-none-any.whl', 30), ('demo-1.0.0.tar.gz', 30),
+              ('demo-0.9.tar.gz', 40))
+    engine = RetentionEngine(repo, {'default': {}, 'packages': {'demo': {'keep_latest': 1}}})
+    report = engine.plan('demo')
+    assert expired_versions(report, 'demo') == ['0.9']
+    assert report['files_count'] == 1
+
+
+def test_keep_days_and_unparseable_versions(repo):
+    add_files(repo, 'demo', ('demo-1.0.tar.gz', 30), ('demo-2.0.tar.gz', 2), ('demo-latest.tar.gz', 90))
+    engine = RetentionEngine(repo, {'default': {'keep_days': 7}, 'packages': {}})
+    assert expired_versions(engine.plan('demo'), 'demo') == ['1.0']
+    
+    result = engine.apply(engine.plan('demo'))
+    assert result['packages'] == {'demo': ['demo-1.0.tar.gz']}
+    assert sorted(os.listdir(repo.packages_dir / 'demo')) == ['demo-2.0.tar.gz', 'demo-latest.tar.gz']
+
+
+def test_select_expired_orders_by_pep440():
+    versions = {Version('1.10'): 0, Version('1.9'): 0, Version('1.2rc1'): 0, Version('1.2'): 0}
+    policy = RetentionPolicy(keep_latest=2, pinned=['1.2'])
+    assert policy.select_expired(versions, time.time()) == [Version('1.2rc1')]
+    assert policy.to_dict()['pinned'] == ['1.2']
+
+
+def test_invalid_pins_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        RetentionPolicy(keep_latest=1, pinned=['not a version'])
+    
+    config_path = tmp_path / 'retention.json'
+    config_path.write_text(json.dumps({'packages': {'demo': {'keep_latest': 1, 'pinned': ['1.0', 'latest']}}}))
+    with pytest.raises(ValueError):
+        load_policies(str(config_path))
@@ -0,0 +1,153 @@
+"""
+对象存储后端（models/storage.py 的 RemoteStorage）的测试，使用 moto 模拟的 S3
+
+两个节点共享同一个存储桶，各自有独立的包目录（本地索引和读缓存）。
+"""
+
+import io
+import os
+import zipfile
+
+import pytest
+
+boto3 = pytest.importorskip('boto3')
+moto = pytest.importorskip('moto')
+
+from models.storage import MIN_PART_SIZE, RemoteStorage, S3ObjectStore
+
+BUCKET = 'pypi-artifacts'
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    with moto.mock_aws():
+        boto3.client('s3').create_bucket(Bucket=BUCKET)
+        yield
+
+
+def make_node(path, cache_max_bytes=1024 * 1024 * 1024):
+    path.mkdir(exist_ok=True)
+    store = S3ObjectStore(BUCKET, prefix='packages', part_size=MIN_PART_SIZE)
+    return RemoteStorage(path, store, cache_max_bytes)
+
+
+@pytest.fixture
+def nodes(s3, tmp_path):
+    return make_node(tmp_path / 'node1'), make_node(tmp_path / 'node2')
+
+
+def stage(tmp_path, filename, data):
+    staging = tmp_path / 'staging'
+    staging.mkdir(exist_ok=True)
+    path = staging / filename
+    path.write_bytes(data)
+    return path
+
+
+def wheel_bytes():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('demo/__init__.py', 'VERSION = "1.0"\n')
+        archive.writestr('demo-1.0.dist-info/METADATA', 'Metadata-Version: 2.1\nName: demo\nVersion: 1.0\n')
+    return buffer.getvalue()
+
+
+def test_publish_is_visible_to_other_node_after_sync(nodes, tmp_path):
+    node1, node2 = nodes
+    info = node1.publish('demo', stage(tmp_path, 'demo-1.0.tar.gz', b'sdist'))
+    assert info.size == 5
+    assert node1.list_files('demo') == ['demo-1.0.tar.gz']
+    
+    assert node2.sync() == ['demo']
+    assert node2.list_packages() == ['demo']
+    synced = node2.stat('demo', 'demo-1.0.tar.gz')
+    assert (synced.size, synced.mtime_ns, synced.etag) == (info.size, info.mtime_ns, info.etag)
+    assert node2.sync() == []
+
+
+def test_large_file_uses_multipart_upload(nodes, tmp_path):
+    node1, node2 = nodes
+    data = os.urandom(MIN_PART_SIZE * 2 + 1024)
+    node1.publish('big', stage(tmp_path, 'big-1.0.tar.gz', data))
+    
+    node2.sync()
+    assert node2.local_path('big', 'big-1.0.tar.gz').read_bytes() == data
+    # 分块上传的对象 ETag 带有分块数
+    assert node2.stat('big', 'big-1.0.tar.gz').etag.endswith('-3')
+
+
+def test_read_through_cache(nodes, tmp_path):
+    node1, node2 = nodes
+    node1.publish('demo', stage(tmp_path, 'demo-1.0.tar.gz', b'x' * 1000))
+    node2.sync()
+    
+    path = node2.local_path('demo', 'demo-1.0.tar.gz')
+    assert path.read_bytes() == b'x' * 1000
+    assert node2.local_path('demo', 'demo-1.0.tar.gz') == path
+    cache = node2.stats()['cache']
+    assert (cache['misses'], cache['hits'], cache['files']) == (1, 1, 1)
+
+
+def test_open_uses_range_reads_without_caching(nodes, tmp_path):
+    node1, node2 = nodes
+    node1.publish('demo', stage(tmp_path, 'demo-1.0-py3-none-any.whl', wheel_bytes()))
+    node2.sync()
+    
+    with node2.open('demo', 'demo-1.0-py3-none-any.whl') as f:
+        with zipfile.ZipFile(f) as archive:
+            assert archive.read('demo/__init__.py') == b'VERSION = "1.0"\n'
+    assert not node2._cache_path('demo', 'demo-1.0-py3-none-any.whl').exists()
+
+
+def test_cache_evicts_least_recently_used(s3, tmp_path):
+    node1 = make_node(tmp_path / 'node1')
+    node2 = make_node(tmp_path / 'node2', cache_max_bytes=2500)
+    for version in ('1.0', '2.0', '3.0'):
+        node1.publish('demo', stage(tmp_path, f'demo-{version}.tar.gz', b'x' * 1000))
+    node2.sync()
+    
+    for version in ('1.0', '2.0', '3.0'):
+        node2.local_path('demo', f'demo-{version}.tar.gz')
+    cached = sorted(path.name for path in (node2.cache_dir / 'demo').iterdir())
+    assert len(cached) == 2
+    assert 'demo-3.0.tar.gz' in cached
+    # 淘汰后仍可重新下载
+    assert node2.local_path('demo', 'demo-1.0.tar.gz').read_bytes() == b'x' * 1000
+
+
+def test_delete_is_synced(nodes, tmp_path):
+    node1, node2 = nodes
+    node1.publish('demo', stage(tmp_path, 'demo-1.0.tar.gz', b'one'))
+    node1.publish('demo', stage(tmp_path, 'demo-2.0.tar.gz', b'two'))
+    node2.sync()
+    node2.local_path('demo', 'demo-1.0.tar.gz')
+    
+    assert node1.delete('demo', 'demo-1.0.tar.gz')
+    assert node2.sync() == ['demo']
+    assert node2.list_files('demo') == ['demo-2.0.tar.gz']
+    
+    assert node1.delete_package('demo')
+    assert node2.sync() == ['demo']
+    assert not node2.exists('demo')
+    assert not (node2.cache_dir / 'demo').exists()
+
+
+def test_yanked_state_is_shared(nodes, tmp_path):
+    node1, node2 = nodes
+    node1.publish('demo', stage(tmp_path, 'demo-1.0.tar.gz', b'sdist'))
+    node2.sync()
+    
+    node1.set_yanked('demo', 'demo-1.0.tar.gz', 'broken build')
+    assert node1.yanked('demo') == {'demo-1.0.tar.gz': 'broken build'}
+    assert node2.sync() == ['demo']
+    assert node2.yanked('demo') == {'demo-1.0.tar.gz': 'broken build'}
+    # 标记对象不是包
+    assert node2.list_packages() == ['demo']
+    
+    node2.set_yanked('demo', 'demo-1.0.tar.gz', None)
+    assert node1.sync() == ['demo']
+    assert node1.yanked('demo') == {}
+    assert node1.sync() == []
@@ -0,0 +1,185 @@
+"""
+分块上传（models/uploads.py）的单元测试
+"""
+
+import io
+import os
+import hashlib
+
+import pytest
+
+from models.uploads import UploadError, UploadSessionStore, merge_ranges, parse_content_range
+
+CONTENT = os.urandom(300 * 1024 + 17)
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+@pytest.fixture
+def store(packages_dir):
+    UploadSessionStore._hashes.clear()
+    return UploadSessionStore(packages_dir, max_size=10 * 1024 * 1024)
+
+
+def put(store, session_id, start, end, body=None):
+    """写入 CONTENT 的 [start, end) 区间（body 可替换为不完整的请求体）"""
+    data = CONTENT[start:end] if body is None else body
+    return store.write_chunk(session_id, start, end, len(CONTENT), io.BytesIO(data))
+
+
+def in_process_offset(session_id):
+    return UploadSessionStore._hashes[session_id].offset
+
+
+def chunks(size):
+    return [(start, min(start + size, len(CONTENT))) for start in range(0, len(CONTENT), size)]
+
+
+# merge_ranges
+
+def test_merge_ranges_keeps_disjoint_ranges_sorted():
+    assert merge_ranges([[10, 20]], 0, 5) == [[0, 5], [10, 20]]
+
+
+def test_merge_ranges_joins_adjacent_and_overlapping():
+    assert merge_ranges([[0, 5], [10, 20]], 5, 10) == [[0, 20]]
+    assert merge_ranges([[0, 10]], 5, 15) == [[0, 15]]
+    assert merge_ranges([[0, 10], [20, 30]], 8, 22) == [[0, 30]]
+
+
+def test_merge_ranges_ignores_repeated_range():
+    assert merge_ranges([[0, 10]], 2, 8) == [[0, 10]]
+    assert merge_ranges([[0, 10]], 0, 10) == [[0, 10]]
+
+
+# parse_content_range
+
+def test_parse_content_range_returns_exclusive_end():
+    assert parse_content_range('bytes 0-99/1000') == (0, 100, 1000)
+    assert parse_content_range('bytes 100-100/*') == (100, 101, None)
+
+
+@pytest.mark.parametrize('header', [
+    None, '', '0-99/1000', 'bytes 0-99', 'bytes a-b/10', 'bytes 10-5/100', 'bytes -5-10/100', 'items 0-1/2',
+])
+def test_parse_content_range_rejects_invalid_headers(header):
+    with pytest.raises(UploadError) as error:
+        parse_content_range(header)
+    assert error.value.status_code == 400
+
+
+# write_chunk / _catch_up / complete
+
+def test_in_order_chunks_are_hashed_while_writing(store):
+    session = store.create('demo-1.0.tar.gz', len(CONTENT), 'demo')
+    for start, end in chunks(64 * 1024):
+        put(store, session['id'], start, end)
+        assert in_process_offset(session['id']) == end
+    
+    meta, staged_path, sha256 = store.complete(session['id'])
+    assert sha256 == SHA256
+    assert staged_path.read_bytes() == CONTENT
+    assert meta['received'] == [[0, len(CONTENT)]]
+
+
+def test_out_of_order_chunks_are_caught_up(store):
+    session = store.create('demo-1.0.tar.gz', len(CONTENT), 'demo')
+    parts = chunks(50 * 1024)
+    for start, end in reversed(parts[1:]):
+        put(store, session['id'], start, end)
+        # 前缀不连续时不计算哈希
+        assert in_process_offset(session['id']) == 0
+    
+    meta = put(store, session['id'], *parts[0])
+    # 第一个分块到达后，已接收的后续分块在 _catch_up 中补算
+    assert meta['received'] == [[0, len(CONTENT)]]
+    assert in_process_offset(session['id']) == len(CONTENT)
+    assert store.complete(session['id'])[2] == SHA256
+
+
+def test_partially_received_prefix_stops_at_gap(store):
+    session = store.create('demo-1.0.tar.gz', len(CONTENT), 'demo')
+    put(store, session['id'], 0, 1000)
+    put(store, session['id'], 2000, 3000)
+    assert in_process_offset(session['id']) == 1000
+    
+    meta = put(store, session['id'], 1000, 2000)
+    assert meta['received'] == [[0, 3000]]
+    assert in_process_offset(session['id']) == 3000
+
+
+def test_retried_partial_chunk(store):
+    session = store.create('demo-1.0.tar.gz', len(CONTENT), 'demo')
+    put(store, session['id'], 0, 100 * 1024)
+    
+    # 请求体被截断：不记录为已接收，之后重试完整的区间
+    with pytest.raises(UploadError):
+        put(store, session['id'], 100 * 1024, 200 * 1024, body=CONTENT[100 * 1024:150 * 1024])
+    assert store.get(session['id'])['received'] == [[0, 100 * 1024]]
+    
+    put(store, session['id'], 100 * 1024, 200 * 1024)
+    put(store, session['id'], 200 * 1024, len(CONTENT))
+    assert store.complete(session['id'])[2] == SHA256
+
+
+def test_repeated_chunk_does_not_change_hash(store):
+    session = store.create('demo-1.0.tar.gz', len(CONTENT), 'demo')
+    put(store, session['id'], 0, 100 * 1024)
+    put(store, session['id'], 0, 100 * 1024)
+    put(store, session['id'], 50 * 1024, len(CONTENT))
+    assert store.complete(session['id'])[2] == SHA256
+
+
+def test_completion_in_another_process(store, packages_dir):
+    session = store.create('demo-1.0.tar.gz', len(CONTENT), 'demo')
+    for start, end in chunks(100 * 1024):
+        put(store, session['id'], start, end)
+    
+    # 另一个进程没有增量哈希状态，完成时从暂存文件补算
+    UploadSessionStore._hashes.clear()
+    other = UploadSessionStore(packages_dir, max_size=10 * 1024 * 1024)
+    meta, staged_path, sha256 = other.complete(session['id'])
+    assert sha256 == SHA256
+    assert staged_path.read_bytes() == CONTENT
+
+
+def test_chunks_split_across_processes(store, packages_dir):
+    session = store.create('demo-1.0.tar.gz', len(CONTENT), 'demo')
+    put(store, session['id'], 0, 100 * 1024)
+    
+    # 后续分块由另一个进程接收：它的哈希状态从 0 开始，先补算已接收的前缀
+    UploadSessionStore._hashes.clear()
+    other = UploadSessionStore(packages_dir, max_size=10 * 1024 * 1024)
+    other.write_chunk(session['id'], 100 * 1024, len(CONTENT), len(CONTENT),
+                      io.BytesIO(CONTENT[100 * 1024:]))
+    assert other.complete(session['id'])[2] == SHA256
+
+
+def test_incomplete_upload_cannot_be_completed(store):
+    session = store.create('demo-1.0.tar.gz', len(CONTENT), 'demo')
+    put(store, session['id'], 0, 1000)
+    with pytest.raises(UploadError) as error:
+        store.complete(session['id'])
+    assert error.value.status_code == 409
+
+
+def test_declared_sha256_mismatch_aborts_session(store):
+    session = store.create('demo-1.0.tar.gz', len(CONTENT), 'demo', sha256='0' * 64)
+    put(store, session['id'], 0, len(CONTENT))
+    with pytest.raises(UploadError) as error:
+        store.complete(session['id'])
+    assert error.value.status_code == 422
+    with pytest.raises(UploadError):
+        store.get(session['id'])
+
+
+def test_chunk_validation(store):
+    session = store.create('demo-1.0.tar.gz', len(CONTENT), 'demo')
+    with pytest.raises(UploadError) as error:
+        store.write_chunk(session['id'], 0, 10, len(CONTENT) + 1, io.BytesIO(CONTENT[:10]))
+    assert error.value.status_code == 400
+    with pytest.raises(UploadError) as error:
+        store.write_chunk(session['id'], len(CONTENT) - 5, len(CONTENT) + 5, None, io.BytesIO(b'x' * 10))
+    assert error.value.status_code == 416
+    with pytest.raises(UploadError) as error:
+        store.get('../' + session['id'][3:])
+    assert error.value.status_code == 404
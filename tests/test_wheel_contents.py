@@ -0,0 +1,51 @@
+"""
+wheel 成员读取（models/wheel_contents.py 的 read_member）的测试
+"""
+
+import io
+import os
+import zipfile
+
+import pytest
+
+from models.wheel_contents import ContentsError, Member, read_member
+
+
+def build_archive(members, compression=zipfile.ZIP_DEFLATED):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def read(data, name):
+    handle = io.BytesIO(data)
+    with zipfile.ZipFile(handle) as archive:
+        member = Member(archive.getinfo(name))
+    return b''.join(read_member(handle, member))
+
+
+@pytest.mark.parametrize('size', [0, 1, 2 * 1024 * 1024 + 1, 8 * 1024 * 1024])
+def test_highly_compressible_member_is_read_completely(size):
+    # 压缩比很高时，读完输入后 zlib 内部仍有未输出的数据
+    data = build_archive({'demo/zeros.bin': b'\0' * size})
+    assert read(data, 'demo/zeros.bin') == b'\0' * size
+
+
+def test_deflated_and_stored_members():
+    payload = os.urandom(300 * 1024) + b'a' * 300 * 1024
+    for compression in (zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED):
+        data = build_archive({'demo/__init__.py': b'VERSION = 1\n', 'demo/data.bin': payload}, compression)
+        assert read(data, 'demo/data.bin') == payload
+        assert read(data, 'demo/__init__.py') == b'VERSION = 1\n'
+
+
+def test_corrupted_member_fails_crc_check():
+    payload = os.urandom(64 * 1024)
+    data = bytearray(build_archive({'demo/data.bin': payload}, zipfile.ZIP_STORED))
+    offset = bytes(data).index(payload[:32])
+    data[offset + 1000] ^= 0xff
+    with pytest.raises(ContentsError) as error:
+        read(bytes(data), 'demo/data.bin')
+    assert error.value.status_code == 422
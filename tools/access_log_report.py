@@ -0,0 +1,422 @@
+"""
+Access Log Report - 分析 gunicorn 访问日志
+
+按 gunicorn.conf.py 中的 access_log_format 解析 access.log（包括轮转后的文件和 .gz 压缩文件），
+单次流式读取，内存占用与日志大小无关：
+
+- 按路由、按包统计请求数、p50/p95/p99 延迟、状态码分布和发送字节数
+- 下载最多的包和文件
+- 按时间段统计请求数、平均并发请求数（各请求耗时之和 / 时间段长度）和不同客户端数
+
+延迟分位数使用对数分桶直方图（相对误差约 1%），文件排行和客户端计数为近似值，
+因此多个日志文件可以在多个进程中并行分析后合并。输出 JSON 或 CSV，
+可以比较缓存等改动前后的尾延迟，或作为容量规划的依据。
+"""
+
+import io
+import re
+import sys
+import csv
+import gzip
+import json
+import math
+import hashlib
+import argparse
+import logging
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models.versions import normalize_name
+
+logger = logging.getLogger(__name__)
+
+# '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(D)s'
+LINE_PATTERN = re.compile(
+    r'(?P<client>\S+) \S+ \S+ \[(?P<time>[^\]]+)\] "(?P<request>[^"]*)" '
+    r'(?P<status>\d{3}) (?P<bytes>\d+|-) "[^"]*" "[^"]*" (?P<duration>\d+)'
+)
+
+# 直方图相对精度
+HISTOGRAM_GAMMA = 1.02
+
+# 文件排行跟踪的文件数量
+TOP_FILES_CAPACITY = 2000
+
+# 不同客户端计数（HyperLogLog）的寄存器数量
+CLIENT_REGISTERS = 256
+
+# 应用自身的一级路径，其余一级路径都是包名
+RESERVED_ROUTES = {'health', 'stats', 'events', 'upload', 'manage', 'resolve', 'bundle'}
+
+
+def classify(path: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """把请求路径归类为路由模板，返回 (路由, 包名, 文件名)"""
+    parts = [unquote(part) for part in path.split('/') if part]
+    if not parts:
+        return '/', None, None
+    
+    head = parts[0]
+    if head in RESERVED_ROUTES and len(parts) == 1:
+        return f'/{head}', None, None
+    if head == 'static':
+        return '/static/*', None, None
+    if head == 'simple':
+        if len(parts) == 1:
+            return '/simple/', None, None
+        return '/simple/<package>/', parts[1], None
+    if head == 'pypi' and len(parts) in (3, 4) and parts[-1] == 'json':
+        return ('/pypi/<package>/json' if len(parts) == 3 else '/pypi/<package>/<version>/json'), parts[1], None
+    if head == 'packages':
+        if len(parts) == 1:
+            return '/packages', None, None
+        if parts[1:] == ['batch']:
+            return '/packages/batch', None, None
+        if len(parts) == 2:
+            return '/packages/<package>', parts[1], None
+        if len(parts) >= 4 and parts[3] == 'contents':
+            route = '/packages/<package>/<filename>/contents' + ('/<member>' if len(parts) > 4 else '')
+            return route, parts[1], None
+        return f'/packages/<package>/{parts[2]}', parts[1], None
+    if head == 'admin':
+        if len(parts) >= 3 and parts[1] == 'packages':
+            rest = parts[3:]
+            if rest[:1] == ['files'] and len(rest) >= 2:
+                rest = ['files', '<filename>'] + rest[2:]
+            return '/admin/packages/<package>' + ''.join(f'/{part}' for part in rest), parts[2], None
+        if len(parts) >= 3 and parts[1] in ('uploads', 'jobs'):
+            return f'/admin/{parts[1]}/<id>' + ''.join(f'/{part}' for part in parts[3:]), None, None
+        return '/' + '/'.join(parts[:2]), None, None
+    if len(parts) == 1:
+        return '/<package>/', head, None
+    if len(parts) == 2:
+        return '/<package>/<filename>', head, parts[1]
+    return 'other', None, None
+
+
+class LatencyHistogram:
+    """对数分桶的延迟直方图（微秒），可合并"""
+    
+    def __init__(self):
+        self.buckets: Counter = Counter()
+        self.count = 0
+        self.max = 0
+    
+    def add(self, value: int) -> None:
+        self.buckets[math.ceil(math.log(max(value, 1)) / math.log(HISTOGRAM_GAMMA))] += 1
+        self.count += 1
+        self.max = max(self.max, value)
+    
+    def merge(self, other: 'LatencyHistogram') -> None:
+        self.buckets.update(other.buckets)
+        self.count += other.count
+        self.max = max(self.max, other.max)
+    
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                # 桶 (gamma^(i-1), gamma^i] 的中点
+                return min(2 * HISTOGRAM_GAMMA ** index / (HISTOGRAM_GAMMA + 1), self.max)
+        return self.max
+
+
+class RouteStats:
+    """一个路由或包的统计"""
+    
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.status: Counter = Counter()
+        self.bytes = 0
+    
+    def add(self, status: int, size: int, duration: int) -> None:
+        self.latency.add(duration)
+        self.status[f'{status // 100}xx'] += 1
+        self.bytes += size
+    
+    def merge(self, other: 'RouteStats') -> None:
+        self.latency.merge(other.latency)
+        self.status.update(other.status)
+        self.bytes += other.bytes
+    
+    def to_dict(self) -> Dict[str, Any]:
+        def ms(value):
+            return round(value / 1000, 2) if value is not None else None
+        
+        return {
+            'requests': self.latency.count,
+            'p50_ms': ms(self.latency.quantile(0.50)),
+            'p95_ms': ms(self.latency.quantile(0.95)),
+            'p99_ms': ms(self.latency.quantile(0.99)),
+            'max_ms': ms(self.latency.max),
+            'status': dict(sorted(self.status.items())),
+            'bytes': self.bytes,
+        }
+
+
+class TopCounter:
+    """只跟踪计数最高的一部分键的近似计数器"""
+    
+    def __init__(self, capacity: int = TOP_FILES_CAPACITY):
+        self.capacity = capacity
+        self.counts: Counter = Counter()
+    
+    def add(self, key: str, count: int = 1) -> None:
+        self.counts[key] += count
+        if len(self.counts) > 2 * self.capacity:
+            self._prune()
+    
+    def merge(self, other: 'TopCounter') -> None:
+        self.counts.update(other.counts)
+        self._prune()
+    
+    def _prune(self) -> None:
+        self.counts = Counter(dict(self.counts.most_common(self.capacity)))
+    
+    def most_common(self, n: int) -> List[Tuple[str, int]]:
+        return self.counts.most_common(n)
+
+
+class ClientCounter:
+    """不同客户端数量的近似计数（HyperLogLog）"""
+    
+    def __init__(self):
+        self.registers = bytearray(CLIENT_REGISTERS)
+    
+    def add(self, client: str) -> None:
+        value = int.from_bytes(hashlib.blake2b(client.encode('utf-8'), digest_size=8).digest(), 'big')
+        index = value % CLIENT_REGISTERS
+        rest = value // CLIENT_REGISTERS
+        rank = 1
+        while rest & 1 == 0 and rank < 56:
+            rest >>= 1
+            rank += 1
+        self.registers[index] = max(self.registers[index], rank)
+    
+    def merge(self, other: 'ClientCounter') -> None:
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+    
+    def estimate(self) -> int:
+        m = CLIENT_REGISTERS
+        raw = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+
+class TimeBucket:
+    """一个时间段的流量"""
+    
+    def __init__(self):
+        self.requests = 0
+        self.busy_us = 0
+        self.clients = ClientCounter()
+    
+    def merge(self, other: 'TimeBucket') -> None:
+        self.requests += other.requests
+        self.busy_us += other.busy_us
+        self.clients.merge(other.clients)
+
+
+class LogReport:
+    """访问日志的聚合结果"""
+    
+    def __init__(self, bucket_seconds: int = 60):
+        self.bucket_seconds = bucket_seconds
+        self.lines = 0
+        self.unparsed = 0
+        self.total = RouteStats()
+        self.routes: Dict[str, RouteStats] = {}
+        self.packages: Dict[str, RouteStats] = {}
+        self.downloads: Counter = Counter()
+        self.files = TopCounter()
+        self.timeline: Dict[int, TimeBucket] = {}
+        self._time_cache: Tuple[Optional[str], int] = (None, 0)
+    
+    def _timestamp(self, value: str) -> int:
+        # 同一秒内的日志行时间戳相同，只解析一次
+        if value != self._time_cache[0]:
+            self._time_cache = (value, int(datetime.strptime(value, '%d/%b/%Y:%H:%M:%S %z').timestamp()))
+        return self._time_cache[1]
+    
+    def add_line(self, line: str) -> None:
+        self.lines += 1
+        match = LINE_PATTERN.match(line)
+        if not match:
+            self.unparsed += 1
+            return
+        
+        request_parts = match.group('request').split(' ')
+        if len(request_parts) < 2:
+            self.unparsed += 1
+            return
+        try:
+            timestamp = self._timestamp(match.group('time'))
+        except ValueError:
+            self.unparsed += 1
+            return
+        
+        path = request_parts[1].split('?', 1)[0]
+        status = int(match.group('status'))
+        size = int(match.group('bytes')) if match.group('bytes') != '-' else 0
+        duration = int(match.group('duration'))
+        route, package_name, filename = classify(path)
+        
+        self.total.add(status, size, duration)
+        self.routes.setdefault(route, RouteStats()).add(status, size, duration)
+        if package_name:
+            package_name = normalize_name(package_name)
+            self.packages.setdefault(package_name, RouteStats()).add(status, size, duration)
+            if filename and status < 400:
+                self.downloads[package_name] += 1
+                self.files.add(f'{package_name}/{filename}')
+        
+        # gunicorn 在请求结束时记录时间，请求耗时计入结束时所在的时间段
+        bucket = self.timeline.get(timestamp - timestamp % self.bucket_seconds)
+        if bucket is None:
+            bucket = self.timeline[timestamp - timestamp % self.bucket_seconds] = TimeBucket()
+        bucket.requests += 1
+        bucket.busy_us += duration
+        bucket.clients.add(match.group('client'))
+    
+    def merge(self, other: 'LogReport') -> None:
+        self.lines += other.lines
+        self.unparsed += other.unparsed
+        self.total.merge(other.total)
+        for target, source in ((self.routes, other.routes), (self.packages, other.packages)):
+            for key, stats in source.items():
+                target.setdefault(key, RouteStats()).merge(stats)
+        self.downloads.update(other.downloads)
+        self.files.merge(other.files)
+        for start, bucket in other.timeline.items():
+            self.timeline.setdefault(start, TimeBucket()).merge(bucket)
+    
+    def to_dict(self, top: int = 20) -> Dict[str, Any]:
+        timeline = sorted(self.timeline.items())
+        return {
+            'lines': self.lines,
+            'unparsed': self.unparsed,
+            'period': {
+                'start': _isoformat(timeline[0][0]) if timeline else None,
+                'end': _isoformat(timeline[-1][0] + self.bucket_seconds) if timeline else None,
+            },
+            'total': self.total.to_dict(),
+            'routes': {
+                route: stats.to_dict()
+                for route, stats in sorted(self.routes.items(), key=lambda item: -item[1].latency.count)
+            },
+            'packages': {
+                name: stats.to_dict()
+                for name, stats in sorted(self.packages.items(), key=lambda item: -item[1].latency.count)
+            },
+            'top_packages': [{'package': name, 'downloads': count} for name, count in self.downloads.most_common(top)],
+            'top_files': [{'file': name, 'downloads': count} for name, count in self.files.most_common(top)],
+            'timeline': [
+                {
+                    'time': _isoformat(start),
+                    'requests': bucket.requests,
+                    'avg_concurrency': round(bucket.busy_us / 1e6 / self.bucket_seconds, 3),
+                    'clients': bucket.clients.estimate(),
+                }
+                for start, bucket in timeline
+            ],
+        }
+
+
+def _isoformat(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+def open_log(path: str):
+    """按文本方式打开日志，.gz 文件边读边解压"""
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, 'rb'), encoding='utf-8', errors='replace')
+    return open(path, 'r', encoding='utf-8', errors='replace')
+
+
+def analyze_file(path: str, bucket_seconds: int = 60) -> LogReport:
+    """分析单个日志文件（在子进程中执行）"""
+    report = LogReport(bucket_seconds)
+    with open_log(path) as f:
+        for line in f:
+            report.add_line(line)
+    logger.info(f"Analyzed {path}: {report.lines} lines")
+    return report
+
+
+def analyze(paths: List[str], bucket_seconds: int = 60, workers: Optional[int] = None) -> LogReport:
+    """并行分析多个日志文件并合并结果"""
+    report = LogReport(bucket_seconds)
+    if len(paths) == 1 or workers == 1:
+        for path in paths:
+            report.merge(analyze_file(path, bucket_seconds))
+        return report
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for file_report in executor.map(analyze_file, paths, [bucket_seconds] * len(paths)):
+            report.merge(file_report)
+    return report
+
+
+CSV_FIELDS = ['group', 'key', 'requests', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms',
+              '2xx', '3xx', '4xx', '5xx', 'bytes']
+
+
+def write_csv(data: Dict[str, Any], output) -> None:
+    """路由和包的统计输出为 CSV（每行一个路由或包）"""
+    writer = csv.DictWriter(output, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    rows = [('total', '*', data['total'])]
+    rows += [('route', route, stats) for route, stats in data['routes'].items()]
+    rows += [('package', name, stats) for name, stats in data['packages'].items()]
+    for group, key, stats in rows:
+        row = {field: stats.get(field) for field in CSV_FIELDS[2:8]}
+        row.update({status: stats['status'].get(status, 0) for status in ('2xx', '3xx', '4xx', '5xx')})
+        row.update({'group': group, 'key': key, 'bytes': stats['bytes']})
+        writer.writerow(row)
+
+
+def main():
+    """命令行入口"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
+    parser = argparse.ArgumentParser(description='Analyze gunicorn access logs')
+    parser.add_argument('logs', nargs='+', help='访问日志文件（支持轮转文件和 .gz）')
+    parser.add_argument('--format', '-f', choices=['json', 'csv'], default='json', help='输出格式')
+    parser.add_argument('--output', '-o', help='输出文件（默认标准输出）')
+    parser.add_argument('--workers', '-w', type=int, default=None, help='并行进程数（默认CPU核数）')
+    parser.add_argument('--bucket', type=int, default=60, help='时间线的时间段长度（秒）')
+    parser.add_argument('--top', type=int, default=20, help='下载排行的条目数')
+    
+    args = parser.parse_args()
+    
+    data = analyze(args.logs, args.bucket, args.workers).to_dict(args.top)
+    
+    output = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        if args.format == 'csv':
+            write_csv(data, output)
+        else:
+            json.dump(data, output, indent=2, ensure_ascii=False)
+            output.write('\n')
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Merge Duplicates - 合并仅包名规范化形式不同的包目录
+
+历史上不同的上传方式对包名的处理不一致，仓库中可能同时存在
+Foo_Bar/、foo-bar/、foo.bar/ 这样实际上是同一个包（PEP 503）的目录。
+本工具把它们合并到规范化名称的目录中：
+
+- 同名且内容相同（sha256 一致）的文件只保留一份
+- 同名但内容不同的文件视为冲突，保留在原目录中并在报告中列出，需要人工处理
+- 合并后为空的目录被删除
+
+默认只输出报告，使用 --apply 实际执行。
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import logging
+from pathlib import Path
+from typing import Any, Dict, List
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models.catalog import hash_file
+from models.locks import package_lock
+from models.repository import RepositoryManager
+from models.versions import normalize_name
+
+logger = logging.getLogger(__name__)
+
+
+def find_duplicates(repo_manager: RepositoryManager, include_renames: bool = False) -> Dict[str, List[str]]:
+    """返回 {规范化名称: [目录名, ...]}
+
+    默认只包含有多个目录的组；include_renames=True 时也包含名称尚未规范化的单个目录。
+    """
+    groups: Dict[str, List[str]] = {}
+    for name in repo_manager.iter_package_names():
+        groups.setdefault(normalize_name(name), []).append(name)
+    
+    return {
+        normalized: names for normalized, names in groups.items()
+        if len(names) > 1 or (include_renames and names[0] != normalized)
+    }
+
+
+def plan_merge(repo_manager: RepositoryManager, normalized: str, names: List[str]) -> Dict[str, Any]:
+    """生成单个组的合并计划"""
+    target_dir = repo_manager.packages_dir / normalized
+    # 目标目录中已有（或将要移入）的文件
+    claimed = {name: target_dir / name for name in repo_manager.list_package_dir(normalized)}
+    moves, duplicates, conflicts = [], [], []
+    
+    for name in names:
+        if name == normalized:
+            continue
+        for filename in repo_manager.list_package_dir(name):
+            source = repo_manager.packages_dir / name / filename
+            existing = claimed.get(filename)
+            if existing is None:
+                claimed[filename] = source
+                moves.append({'from': name, 'filename': filename})
+            elif hash_file(existing) == hash_file(source):
+                duplicates.append({'from': name, 'filename': filename})
+            else:
+                conflicts.append({'from': name, 'filename': filename})
+    
+    return {
+        'target': normalized,
+        'sources': [name for name in names if name != normalized],
+        'moves': moves,
+        'duplicates': duplicates,
+        'conflicts': conflicts,
+    }
+
+
+def apply_merge(repo_manager: RepositoryManager, plan: Dict[str, Any]) -> None:
+    """按计划移动文件并删除重复文件和空目录"""
+    target = plan['target']
+    target_dir = repo_manager.packages_dir / target
+    
+    # 组内目录的规范化名称相同，共用同一把包锁
+    with package_lock(repo_manager.packages_dir, target, exclusive=True):
+        target_dir.mkdir(exist_ok=True)
+        for move in plan['moves']:
+            os.replace(repo_manager.packages_dir / move['from'] / move['filename'], target_dir / move['filename'])
+        for duplicate in plan['duplicates']:
+            (repo_manager.packages_dir / duplicate['from'] / duplicate['filename']).unlink()
+        for source in plan['sources']:
+            source_dir = repo_manager.packages_dir / source
+            if not repo_manager.list_package_dir(source):
+                shutil.rmtree(source_dir, ignore_errors=True)
+    
+    for source in plan['sources']:
+        source_dir = repo_manager.packages_dir / source
+        repo_manager.invalidate(source, action='deleted' if not source_dir.exists() else 'updated')
+    
+    repo_manager.invalidate(target, action='updated')
+    logger.info(f"Merged {', '.join(plan['sources'])} into {target}")
+
+
+def main():
+    """命令行入口"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
+    parser = argparse.ArgumentParser(description='Merge package directories that differ only in name normalization')
+    parser.add_argument('--packages-dir', '-d', default='packages', help='包存储目录')
+    parser.add_argument('--rename', action='store_true', help='同时把名称未规范化的单个目录改为规范化名称')
+    parser.add_argument('--apply', action='store_true', help='实际执行合并，默认只输出报告')
+    
+    args = parser.parse_args()
+    
+    repo_manager = RepositoryManager(args.packages_dir)
+    if not repo_manager.storage.is_local:
+        # 对象存储的上传路径总是规范化的包名，不会产生重复目录
+        print('merge_duplicates only supports STORAGE_BACKEND=local', file=sys.stderr)
+        sys.exit(1)
+    plans = [
+        plan_merge(repo_manager, normalized, names)
+        for normalized, names in sorted(find_duplicates(repo_manager, args.rename).items())
+    ]
+    
+    if args.apply:
+        for plan in plans:
+            apply_merge(repo_manager, plan)
+    
+    print(json.dumps({'applied': args.apply, 'groups': plans}, indent=2, ensure_ascii=False))
+    if any(plan['conflicts'] for plan in plans):
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
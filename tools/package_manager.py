@@ -5,16 +5,26 @@ Package Manager - 包管理工具
 
 import os
 import sys
+import fcntl
 import shutil
 import argparse
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 # 添加项目根目录到路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from models.bundle import BundleError, plan_bundle
+from models.events import get_state_dir
+from models.jobs import DONE, JobQueue, stage_upload
+from models.locks import package_lock
+from models.metadata import read_core_metadata
 from models.repository import RepositoryManager
+from models.resolver import ResolutionError, Target, get_dependency_graph
+from models.retention import RetentionEngine, load_policies
+from models.scrubber import IntegrityScrubber
 
 # 配置日志
 logging.basicConfig(
@@ -31,6 +41,7 @@ class PackageManager:
         self.repo_manager = RepositoryManager(packages_dir)
         self.packages_dir = Path(packages_dir)
         self.packages_dir.mkdir(exist_ok=True)
+        self.job_queue = JobQueue(self.packages_dir)
     
     def upload_package(self, file_path: str, package_name: Optional[str] = None) -> bool:
         """上传包文件"""
@@ -53,17 +64,9 @@ class PackageManager:
                 logger.error(f"无法从文件名推断包名: {file_path.name}")
                 return False
             
-            # 创建包目录
-            package_dir = self.packages_dir / package_name
-            package_dir.mkdir(exist_ok=True)
-            
-            # 复制文件
-            dest_path = package_dir / file_path.name
-            shutil.copy2(file_path, dest_path)
-            
-            # 清除缓存
-            self.repo_manager.cache.clear()
-            self.repo_manager.last_scan = 0
+            # 经过与服务端上传相同的后处理流程（校验、哈希、入库、生成索引）
+            if not self._ingest(file_path, package_name, action='uploaded'):
+                return False
             
             logger.info(f"包上传成功: {package_name}/{file_path.name}")
             return True
@@ -81,18 +84,13 @@ class PackageManager:
                 return False
             
             # 检查包是否存在
-            package_dir = self.packages_dir / package_name
-            if not package_dir.exists():
+            if not self.repo_manager.storage.exists(package_name):
                 logger.error(f"包不存在: {package_name}")
                 return False
             
-            # 复制文件（覆盖）
-            dest_path = package_dir / file_path.name
-            shutil.copy2(file_path, dest_path)
-            
-            # 清除缓存
-            self.repo_manager.cache.clear()
-            self.repo_manager.last_scan = 0
+            # 覆盖同名文件
+            if not self._ingest(file_path, package_name, action='updated'):
+                return False
             
             logger.info(f"包更新成功: {package_name}/{file_path.name}")
             return True
@@ -104,18 +102,11 @@ class PackageManager:
     def remove_package(self, package_name: str) -> bool:
         """删除包"""
         try:
-            package_dir = self.packages_dir / package_name
-            if not package_dir.exists():
+            # 移入回收站后在后台清除，并失效缓存
+            if not self.repo_manager.remove_package(package_name):
                 logger.error(f"包不存在: {package_name}")
                 return False
             
-            # 删除包目录
-            shutil.rmtree(package_dir)
-            
-            # 清除缓存
-            self.repo_manager.cache.clear()
-            self.repo_manager.last_scan = 0
-            
             logger.info(f"包删除成功: {package_name}")
             return True
             
@@ -134,15 +125,13 @@ class PackageManager:
             if not files:
                 return None
             
-            package_dir = self.packages_dir / package_name
-            
             # 计算文件大小
             total_size = 0
             file_info = {}
             for file_name in files:
-                file_path = package_dir / file_name
-                if file_path.exists():
-                    size = file_path.stat().st_size
+                stat = self.repo_manager.storage.stat(package_name, file_name)
+                if stat is not None:
+                    size = stat.size
                     total_size += size
                     file_info[file_name] = {
                         'size': size,
@@ -164,6 +153,104 @@ class PackageManager:
             logger.error(f"获取包信息失败: {e}")
             return None
     
+    def prune_packages(self, config_path: str, package_name: Optional[str] = None,
+                       dry_run: bool = True, max_deletes_per_second: float = 20.0) -> Optional[dict]:
+        """按保留策略清理旧版本，返回清理报告"""
+        try:
+            engine = RetentionEngine(self.repo_manager, load_policies(config_path),
+                                     max_deletes_per_second=max_deletes_per_second)
+            report = engine.plan(package_name)
+            if not dry_run:
+                report['result'] = engine.apply(report)
+            return report
+            
+        except Exception as e:
+            logger.error(f"清理旧版本失败: {e}")
+            return None
+    
+    def backfill_metadata(self, workers: Optional[int] = None, force: bool = False) -> Dict[str, int]:
+        """为已有文件补充 Requires-Python / Requires-Dist 记录（多进程并行读取），返回每个包更新的文件数"""
+        pending = []
+        for package_name in self.repo_manager.iter_package_names():
+            files = self.repo_manager.list_package_dir(package_name)
+            if not files:
+                continue
+            records = self.repo_manager.catalog.ensure_records(package_name, files)
+            for filename, record in records.items():
+                if force or 'requires_python' not in record or 'requires_dist' not in record:
+                    pending.append((package_name, filename))
+        
+        if not pending:
+            return {}
+        
+        # 对象存储中的文件先下载到本地缓存
+        paths = [str(self.repo_manager.storage.local_path(name, filename)) for name, filename in pending]
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+            values = list(executor.map(read_core_metadata, paths, chunksize=16))
+        
+        updates: Dict[str, Dict[str, dict]] = {}
+        for (package_name, filename), value in zip(pending, values):
+            updates.setdefault(package_name, {})[filename] = value
+        
+        result = {}
+        for package_name, package_updates in updates.items():
+            with package_lock(self.packages_dir, package_name, exclusive=True):
+                result[package_name] = self.repo_manager.catalog.update_records(package_name, package_updates)
+            # 记录变化后重新生成该包的索引页
+            self.repo_manager.invalidate(package_name, action='updated')
+        return result
+    
+    def scrub(self, bytes_per_second: float = 0) -> Optional[dict]:
+        """在前台执行（或从断点继续）一轮完整性巡检；已有巡检在运行时返回None"""
+        with open(get_state_dir(self.packages_dir) / 'scrub.lock', 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            try:
+                return IntegrityScrubber(self.repo_manager, bytes_per_second).run_pass()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def bundle(self, requirements: List[str], python_version: str, platforms: List[str],
+               output: str, fmt: str = 'tar', prereleases: bool = False) -> dict:
+        """解析需求的依赖闭包并写入离线安装归档（output 为 - 时写入标准输出），返回归档清单"""
+        result = get_dependency_graph(self.repo_manager).resolve(
+            requirements, Target(python_version, platforms), prereleases=prereleases)
+        plan = plan_bundle(self.repo_manager, result['files'], fmt,
+                           requirements=requirements, missing=result['missing'])
+        bundle = plan.open()
+        try:
+            if output == '-':
+                sys.stdout.flush()
+                bundle.write_to(sys.stdout.fileno())
+            else:
+                fd = os.open(output, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                try:
+                    bundle.write_to(fd)
+                finally:
+                    os.close(fd)
+        finally:
+            bundle.close()
+        return plan.manifest
+    
+    def _ingest(self, file_path: Path, package_name: str, action: str) -> bool:
+        """暂存文件并同步执行上传后处理任务"""
+        with open(file_path, 'rb') as f:
+            staged_path = stage_upload(self.packages_dir, file_path.name, f)
+        
+        job = self.job_queue.create('process_upload', {
+            'packages_dir': str(self.packages_dir),
+            'package_name': package_name,
+            'staged_path': str(staged_path),
+            'action': action,
+        })
+        job = self.job_queue.run(job['id'])
+        if job is None or job['status'] != DONE:
+            logger.error(f"包处理失败: {job['error'] if job else '任务被占用'}")
+            return False
+        return True
+    
     def _is_valid_package_file(self, filename: str) -> bool:
         """检查是否为有效的包文件"""
         valid_extensions = {'.whl', '.tar.gz', '.zip'}
@@ -201,12 +288,37 @@ class PackageManager:
 def main():
     """命令行入口"""
     parser = argparse.ArgumentParser(description='PyPI Repository Package Manager')
-    parser.add_argument('action', choices=['upload', 'update', 'remove', 'list', 'info'],
+    parser.add_argument('action', choices=['upload', 'update', 'remove', 'list', 'info', 'prune',
+                                           'backfill-metadata', 'scrub', 'bundle'],
                        help='操作类型')
     parser.add_argument('--file', '-f', help='包文件路径')
     parser.add_argument('--package', '-p', help='包名')
     parser.add_argument('--packages-dir', '-d', default='packages',
                        help='包存储目录')
+    parser.add_argument('--retention-config', default='retention.json',
+                       help='保留策略配置文件 (prune)')
+    parser.add_argument('--apply', action='store_true',
+                       help='实际删除过期版本，默认只输出 dry-run 报告 (prune)')
+    parser.add_argument('--rate', type=float, default=20.0,
+                       help='每秒最多删除的文件数 (prune)')
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                       help='并行进程数，默认CPU核数 (backfill-metadata)')
+    parser.add_argument('--force', action='store_true',
+                       help='重新读取所有文件，而不只是缺少记录的文件 (backfill-metadata)')
+    parser.add_argument('--bytes-per-second', type=int, default=0,
+                       help='每秒最多读取的字节数，默认不限速 (scrub)')
+    parser.add_argument('--requirement', '-r', action='append', default=[],
+                       help='需求，可重复指定 (bundle)')
+    parser.add_argument('--requirements-file', help='需求文件，每行一个需求 (bundle)')
+    parser.add_argument('--python-version', default='.'.join(map(str, sys.version_info[:2])),
+                       help='目标 Python 版本，默认当前解释器 (bundle)')
+    parser.add_argument('--platform', action='append', default=[],
+                       help='目标平台标签，可重复指定，如 manylinux_2_17_x86_64 (bundle)')
+    parser.add_argument('--format', choices=['tar', 'zip'], default='tar',
+                       help='归档格式 (bundle)')
+    parser.add_argument('--output', '-o', help='归档输出路径，- 表示标准输出 (bundle)')
+    parser.add_argument('--pre', action='store_true',
+                       help='允许预发布版本 (bundle)')
     
     args = parser.parse_args()
     
@@ -261,6 +373,68 @@ def main():
         else:
             print(f"包不存在: {args.package}")
             sys.exit(1)
+    
+    elif args.action == 'prune':
+        report = manager.prune_packages(args.retention_config, args.package,
+                                        dry_run=not args.apply,
+                                        max_deletes_per_second=args.rate)
+        if report is None:
+            sys.exit(1)
+        
+        print("清理报告" + ("" if args.apply else " (dry-run)") + ":")
+        for name, entry in report['packages'].items():
+            print(f"  {name}: {entry['files_count']} 个文件, {round(entry['total_bytes'] / (1024 * 1024), 2)} MB")
+            for version_entry in entry['versions']:
+                print(f"    - {version_entry['version']}: {', '.join(f['filename'] for f in version_entry['files'])}")
+        print(f"  合计: {report['files_count']} 个文件, {round(report['total_bytes'] / (1024 * 1024), 2)} MB")
+    
+    elif args.action == 'backfill-metadata':
+        result = manager.backfill_metadata(args.workers, args.force)
+        for name, count in result.items():
+            print(f"  {name}: {count} 个文件")
+        print(f"已更新 {sum(result.values())} 个文件的元数据")
+    
+    elif args.action == 'scrub':
+        if not manager.repo_manager.storage.is_local:
+            print("完整性巡检只支持本地存储 (STORAGE_BACKEND=local)")
+            sys.exit(1)
+        state = manager.scrub(args.bytes_per_second)
+        if state is None:
+            print("已有巡检在运行")
+            sys.exit(1)
+        last_pass = state['last_pass']
+        print(f"已检查 {last_pass['files']} 个文件, {round(last_pass['bytes'] / (1024 * 1024), 2)} MB, "
+              f"跳过 {last_pass['skipped']} 个")
+        for entry in state['corrupt']:
+            if entry['detected_at'] >= last_pass['started_at']:
+                print(f"  损坏: {entry['package']}/{entry['filename']} ({entry['reason']}) -> {entry['quarantined_to']}")
+        sys.exit(2 if last_pass['corrupt'] else 0)
+    
+    elif args.action == 'bundle':
+        requirements = list(args.requirement)
+        if args.package:
+            requirements.append(args.package)
+        if args.requirements_file:
+            with open(args.requirements_file, encoding='utf-8') as f:
+                for line in f:
+                    line = line.split('#', 1)[0].strip()
+                    if line and not line.startswith('-'):
+                        requirements.append(line)
+        if not requirements or not args.platform or not args.output:
+            print("错误: 打包需要指定需求 (--requirement/--requirements-file/--package)、平台 (--platform) 和输出路径 (--output)")
+            sys.exit(1)
+        try:
+            manifest = manager.bundle(requirements, args.python_version, args.platform, args.output,
+                                      args.format, args.pre)
+        except (ResolutionError, BundleError) as e:
+            print(f"错误: {e}", file=sys.stderr)
+            sys.exit(1)
+        # 归档写入标准输出时，报告输出到标准错误
+        report = sys.stderr if args.output == '-' else sys.stdout
+        total = sum(entry['size'] for entry in manifest['files'])
+        print(f"已打包 {len(manifest['files'])} 个文件, {round(total / (1024 * 1024), 2)} MB", file=report)
+        for requirement in manifest['missing']:
+            print(f"  仓库中不存在: {requirement}", file=report)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,221 @@
+"""
+Static Export - 导出可由 nginx 直接提供的 Simple Repository 静态目录
+
+导出结构::
+
+    <output>/simple/index.html, index.json             仓库索引（PEP 503 / PEP 691）
+    <output>/simple/<package>/index.html, index.json   包索引（含 sha256）
+
+每个页面都带有 .gz（以及安装 brotli 时的 .br）预压缩变体，文件原子替换写入。
+包文件本身仍由 nginx 直接从 packages/ 目录提供，页面中的链接为相对路径 ../../<package>/<file>。
+
+只有内容签名变化的包才会重新生成；首次全量导出使用进程池并行处理。
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models.compression import atomic_write, write_with_variants
+from models.events import ChangeJournal
+from models.locks import package_lock
+from models.repository import RepositoryManager
+from models.simple_pages import (
+    render_project_html, render_project_json, render_root_html, render_root_json
+)
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = '.export-manifest.json'
+
+
+def package_signature(repo_manager, package_name: str) -> Optional[str]:
+    """包内容签名：文件名、大小和修改时间，覆盖同名文件也能检测到
+
+    页面中还包含文件记录里的 yanked 和 requires_python，这两项变化时文件本身不变，也要计入签名。
+    """
+    records = repo_manager.catalog.get(package_name)['files']
+    items = []
+    for filename in repo_manager.storage.list_files(package_name):
+        info = repo_manager.storage.stat(package_name, filename)
+        if info is not None:
+            record = records.get(filename, {})
+            items.append((filename, info.size, info.mtime_ns,
+                          record.get('yanked'), record.get('requires_python')))
+    
+    if not items:
+        return None
+    return hashlib.sha1(repr(sorted(items)).encode('utf-8')).hexdigest()
+
+
+def export_package(packages_dir: str, output_dir: str, package_name: str) -> Optional[str]:
+    """导出单个包的页面，返回导出时的签名；包已不存在时删除导出目录并返回None
+
+    作为进程池任务使用，因此是模块级函数。
+    """
+    repo_manager = RepositoryManager(packages_dir)
+    target_dir = Path(output_dir) / 'simple' / package_name
+    
+    with package_lock(packages_dir, package_name):
+        files = repo_manager.list_package_dir(package_name)
+        if not files:
+            shutil.rmtree(target_dir, ignore_errors=True)
+            return None
+        
+        # 补全记录后再计算签名，新文件的 requires_python 等字段也计入签名
+        records = repo_manager.catalog.ensure_records(package_name, files)
+        signature = package_signature(repo_manager, package_name)
+        if signature is None:
+            shutil.rmtree(target_dir, ignore_errors=True)
+            return None
+    ordered = [records[name] for name in files if name in records]
+    write_with_variants(target_dir / 'index.html',
+                        render_project_html(package_name, ordered).encode('utf-8'))
+    write_with_variants(target_dir / 'index.json',
+                        render_project_json(package_name, ordered).encode('utf-8'))
+    return signature
+
+
+class StaticExporter:
+    """增量静态导出"""
+    
+    def __init__(self, packages_dir: str = "packages", output_dir: str = "static",
+                 workers: Optional[int] = None):
+        self.repo_manager = RepositoryManager(packages_dir)
+        self.packages_dir = str(packages_dir)
+        self.output_dir = Path(output_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.manifest_path = self.output_dir / MANIFEST_NAME
+    
+    def load_manifest(self) -> Dict:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {'packages': {}, 'serial': 0}
+    
+    def save_manifest(self, manifest: Dict) -> None:
+        manifest['exported_at'] = time.time()
+        atomic_write(self.manifest_path, json.dumps(manifest, sort_keys=True).encode('utf-8'))
+    
+    def export(self, full: bool = False, package_names: Optional[Iterable[str]] = None) -> Dict:
+        """导出变化的包（full=True 时全部重新生成），返回导出统计"""
+        started = time.time()
+        manifest = {'packages': {}, 'serial': 0} if full else self.load_manifest()
+        exported = manifest['packages']
+        serial = ChangeJournal(self.repo_manager.packages_dir).current_serial()
+        
+        current = list(self.repo_manager.iter_package_names())
+        if package_names is None:
+            candidates = current
+        else:
+            requested = set(package_names)
+            candidates = [name for name in current if name in requested]
+        
+        # 只处理签名与上次导出不同的包
+        changed = [
+            name for name in candidates
+            if full or package_signature(self.repo_manager, name) != exported.get(name)
+        ]
+        removed = [name for name in exported if name not in current]
+        
+        results = self._export_packages(changed + removed)
+        for name, signature in results.items():
+            if signature is None:
+                exported.pop(name, None)
+            else:
+                exported[name] = signature
+        
+        # 包集合变化时重新生成仓库索引
+        index_path = self.output_dir / 'simple' / 'index.html'
+        if changed or removed or not index_path.exists():
+            names = sorted(exported)
+            write_with_variants(index_path, render_root_html(names).encode('utf-8'))
+            write_with_variants(self.output_dir / 'simple' / 'index.json',
+                                render_root_json(names).encode('utf-8'))
+        
+        manifest['serial'] = serial
+        self.save_manifest(manifest)
+        
+        stats = {
+            'exported': len([s for s in results.values() if s is not None]),
+            'removed': len([s for s in results.values() if s is None]),
+            'unchanged': len(candidates) - len(changed),
+            'serial': serial,
+            'duration': round(time.time() - started, 3),
+        }
+        logger.info(f"Static export finished: {stats}")
+        return stats
+    
+    def _export_packages(self, names: List[str]) -> Dict[str, Optional[str]]:
+        if not names:
+            return {}
+        
+        # 少量包（增量导出）直接在当前进程处理，避免进程池启动开销
+        if len(names) < 4 or self.workers <= 1:
+            return {name: export_package(self.packages_dir, str(self.output_dir), name) for name in names}
+        
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            signatures = executor.map(
+                export_package,
+                [self.packages_dir] * len(names),
+                [str(self.output_dir)] * len(names),
+                names,
+                chunksize=16,
+            )
+            return dict(zip(names, signatures))
+    
+    def watch(self, interval: float = 2.0) -> None:
+        """跟随仓库变更日志，持续导出发生变化的包"""
+        journal = ChangeJournal(self.repo_manager.packages_dir)
+        offset = journal.size()
+        self.export()
+        
+        while True:
+            time.sleep(interval)
+            events, offset = journal.read_from(offset)
+            if events:
+                self.export(package_names={event.get('package') for event in events})
+
+
+def main():
+    """命令行入口"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
+    parser = argparse.ArgumentParser(description='Export the Simple repository as static files')
+    parser.add_argument('--packages-dir', '-d', default='packages', help='包存储目录')
+    parser.add_argument('--output', '-o', default='static', help='导出目录')
+    parser.add_argument('--workers', '-w', type=int, default=None, help='并行进程数（默认CPU核数）')
+    parser.add_argument('--full', action='store_true', help='忽略上次导出记录，全部重新生成')
+    parser.add_argument('--watch', action='store_true', help='持续跟随仓库变更进行增量导出')
+    parser.add_argument('--interval', type=float, default=2.0, help='--watch 模式的检查间隔（秒）')
+    
+    args = parser.parse_args()
+    
+    exporter = StaticExporter(args.packages_dir, args.output, args.workers)
+    if args.watch:
+        try:
+            exporter.watch(args.interval)
+        except KeyboardInterrupt:
+            pass
+    else:
+        stats = exporter.export(full=args.full)
+        print(json.dumps(stats, indent=2))
+
+
+if __name__ == '__main__':
+    main()